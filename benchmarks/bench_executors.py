@@ -0,0 +1,323 @@
+"""
+Overhead of the executors and of Sequence.run, results are stored as JSON
+to compare them between versions::
+
+    python benchmarks/bench_executors.py -o before.json
+    python benchmarks/bench_executors.py -o after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from dataexec import __about__
+from dataexec.assets import TextAsset
+from dataexec.executors import AsyncLocal, IExecutor, LocalDev, LocalProcess, MPConfig
+from dataexec.metrics import percentile
+from dataexec.steps import Step
+from dataexec.workflows import AsyncSequence, Sequence
+
+MB = 1024**2
+
+
+class Result:
+    def __init__(self, bench: str, executor: str, value: float, unit: str, **params):
+        self.bench = bench
+        self.executor = executor
+        self.value = value
+        self.unit = unit
+        self.params = params
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.bench}/{self.executor}/{params}"
+
+    @property
+    def higher_is_better(self) -> bool:
+        return self.unit.endswith("/s")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "bench": self.bench,
+            "executor": self.executor,
+            "params": self.params,
+            "value": self.value,
+            "unit": self.unit,
+            "higher_is_better": self.higher_is_better,
+        }
+
+
+def noop():
+    return None
+
+
+async def aio_noop():
+    return None
+
+
+def payload_size(asset: TextAsset) -> int:
+    return len(asset.raw)
+
+
+async def aio_payload_size(asset: TextAsset) -> int:
+    return len(asset.raw)
+
+
+def first_asset(location: str) -> TextAsset:
+    return TextAsset.from_location(location)
+
+
+def same_asset(asset: TextAsset) -> TextAsset:
+    return asset
+
+
+def executors(shm_min_size: int) -> Dict[str, Callable[[], IExecutor]]:
+    return {
+        "LocalDev": LocalDev,
+        "LocalProcess": lambda: LocalProcess(MPConfig(pool_size=2, timeout=None)),
+        "LocalProcess[shm]": lambda: LocalProcess(
+            MPConfig(
+                pool_size=2,
+                timeout=None,
+                shared_memory=True,
+                shm_min_size=shm_min_size,
+            )
+        ),
+    }
+
+
+def bench_latency(name: str, executor: IExecutor, n: int) -> List[Result]:
+    """Submit a no-op task and wait for its result, one at a time"""
+    executor.submit(noop).result()  # warm up the pool
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter_ns()
+        executor.submit(noop).result()
+        samples.append((time.perf_counter_ns() - started) / 1e3)
+    return [
+        Result("latency", name, percentile(samples, q), "us", quantile=q)
+        for q in (0.5, 0.95, 0.99)
+    ]
+
+
+def bench_throughput(name: str, executor: IExecutor, n: int) -> Result:
+    """Submit all the no-op tasks and then wait for them"""
+    started = time.perf_counter()
+    tasks = [executor.submit(noop) for _ in range(n)]
+    for task in tasks:
+        task.result()
+    return Result("throughput", name, n / (time.perf_counter() - started), "tasks/s")
+
+
+def bench_payload(
+    name: str, executor: IExecutor, asset: TextAsset, size: int, n: int
+) -> Result:
+    """Send a loaded asset to the worker, which reads its payload"""
+    started = time.perf_counter()
+    tasks = [executor.submit(payload_size, asset) for _ in range(n)]
+    for task in tasks:
+        task.result()
+    elapsed = time.perf_counter() - started
+    return Result("payload", name, n * size / MB / elapsed, "MB/s", size_mb=size // MB)
+
+
+def bench_sequence(
+    name: str, executor: IExecutor, location: str, steps: int, repeat: int
+) -> Result:
+    """Time of Sequence.run per step, for steps that don't do anything"""
+    w = Sequence(
+        steps=[Step(first_asset, "s0", params={"location": location})]
+        + [Step(same_asset, f"s{i}") for i in range(1, steps)],
+        executor=executor,
+        disable_tqdm=True,
+    )
+    w.run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        w.run()
+        samples.append((time.perf_counter_ns() - started) / 1e3 / steps)
+    return Result("sequence", name, percentile(samples, 0.5), "us/step", steps=steps)
+
+
+async def bench_async(
+    args: argparse.Namespace, assets: Dict[int, TextAsset], location: str
+) -> List[Result]:
+    name = "AsyncLocal"
+    executor = AsyncLocal()
+    results = []
+
+    samples = []
+    for _ in range(args.tasks):
+        started = time.perf_counter_ns()
+        await (await executor.submit(aio_noop)).result()
+        samples.append((time.perf_counter_ns() - started) / 1e3)
+    for q in (0.5, 0.95, 0.99):
+        value = percentile(samples, q)
+        results.append(Result("latency", name, value, "us", quantile=q))
+
+    started = time.perf_counter()
+    tasks = [await executor.submit(aio_noop) for _ in range(args.tasks)]
+    for task in tasks:
+        await task.result()
+    elapsed = time.perf_counter() - started
+    results.append(Result("throughput", name, args.tasks / elapsed, "tasks/s"))
+
+    for size, asset in assets.items():
+        started = time.perf_counter()
+        tasks = [
+            await executor.submit(aio_payload_size, asset)
+            for _ in range(args.payload_tasks)
+        ]
+        for task in tasks:
+            await task.result()
+        elapsed = time.perf_counter() - started
+        value = args.payload_tasks * size / MB / elapsed
+        results.append(Result("payload", name, value, "MB/s", size_mb=size // MB))
+
+    for steps in args.steps:
+        w = AsyncSequence(
+            steps=[Step(first_asset, "s0", params={"location": location})]
+            + [Step(same_asset, f"s{i}") for i in range(1, steps)],
+            executor=executor,
+        )
+        await w.run()
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter_ns()
+            await w.run()
+            samples.append((time.perf_counter_ns() - started) / 1e3 / steps)
+        value = percentile(samples, 0.5)
+        results.append(Result("sequence", name, value, "us/step", steps=steps))
+    return results
+
+
+def make_assets(tmpdir: str, sizes: List[int]) -> Dict[int, TextAsset]:
+    assets = {}
+    for size in sizes:
+        location = os.path.join(tmpdir, f"payload_{size}.txt")
+        with open(location, "w") as f:
+            f.write("x" * size)
+        asset = TextAsset.from_location(location)
+        # the payload is modified so it has to be sent, not read from the file
+        asset.raw = asset.raw[:-1] + "y"
+        assets[size] = asset
+    return assets
+
+
+def run(args: argparse.Namespace) -> List[Result]:
+    results: List[Result] = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        location = os.path.join(tmpdir, "asset.txt")
+        with open(location, "w") as f:
+            f.write("asset")
+        assets = make_assets(tmpdir, [int(s * MB) for s in args.sizes])
+        for name, factory in executors(args.shm_min_size).items():
+            if args.executors and name not in args.executors:
+                continue
+            print(f"running {name}", file=sys.stderr)
+            with factory() as executor:
+                results.extend(bench_latency(name, executor, args.tasks))
+                results.append(bench_throughput(name, executor, args.tasks))
+                for size, asset in assets.items():
+                    results.append(
+                        bench_payload(name, executor, asset, size, args.payload_tasks)
+                    )
+                for steps in args.steps:
+                    results.append(
+                        bench_sequence(name, executor, location, steps, args.repeat)
+                    )
+        if not args.executors or "AsyncLocal" in args.executors:
+            print("running AsyncLocal", file=sys.stderr)
+            results.extend(asyncio.run(bench_async(args, assets, location)))
+    return results
+
+
+def compare(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float
+) -> int:
+    """
+    Print the change of each result against the baseline.
+
+    :return: the number of results worse than the baseline by more
+    than ``threshold`` (a fraction).
+    """
+    before = {r["key"]: r for r in baseline}
+    regressions = 0
+    for r in results:
+        old = before.get(r["key"])
+        if old is None or not old["value"]:
+            continue
+        change = r["value"] / old["value"] - 1
+        worse = -change if r["higher_is_better"] else change
+        flag = ""
+        if worse > threshold:
+            regressions += 1
+            flag = " REGRESSION"
+        print(
+            f"{r['key']:<55} {old['value']:>12.2f} -> {r['value']:>12.2f} "
+            f"{r['unit']:<8} {change:+.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-o", "--output", default="bench_executors.json")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--payload-tasks", type=int, default=10)
+    parser.add_argument(
+        "--sizes", type=float, nargs="+", default=[1, 100], help="payloads in MB"
+    )
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 10, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--executors", nargs="+", help="only these executors")
+    parser.add_argument("--shm-min-size", type=int, default=64 * 1024)
+    parser.add_argument("--compare", help="JSON of a previous run")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="regression threshold"
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="fewer iterations and small payloads"
+    )
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.tasks, args.payload_tasks, args.repeat = 100, 3, 2
+        args.sizes, args.steps = [1], [1, 10, 100]
+
+    results = [r.to_dict() for r in run(args)]
+    report = {
+        "meta": {
+            "version": __about__.__version__,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "created_at": datetime.utcnow().isoformat(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        return 1 if compare(results, baseline, args.threshold) else 0
+    for r in results:
+        print(f"{r['key']:<55} {r['value']:>12.2f} {r['unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
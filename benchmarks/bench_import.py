@@ -0,0 +1,90 @@
+"""
+Import time of the modules of dataexec, each one in a new interpreter,
+compared with a budget::
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --repeat 20 -o import.json
+
+The time is the median of the runs, measured inside the interpreter so
+its startup is not counted. It exits with 1 when a module is over
+its budget or loads a dependency that should be lazy.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# ms, most of it is pydantic (~80ms) and, for the workflows, asyncio
+BUDGETS: Dict[str, float] = {
+    "dataexec": 10,
+    "dataexec.sqlite_registry": 150,
+    "dataexec.workflows": 250,
+}
+
+# they must be imported on first use, not by the modules above
+LAZY = ("tqdm", "multiprocessing", "docker")
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+{stmt}
+elapsed = time.perf_counter() - started
+print(elapsed, ",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def measure(module: str, repeat: int) -> Dict[str, object]:
+    samples: List[float] = []
+    loaded = ""
+    for _ in range(repeat):
+        code = _PROBE.format(stmt=f"import {module}" if module else "", lazy=LAZY)
+        out = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True
+        ).stdout.split()
+        samples.append(float(out[0]) * 1000)
+        loaded = out[1] if len(out) > 1 else ""
+    return {
+        "module": module,
+        "ms": statistics.median(samples),
+        "lazy_loaded": loaded.split(",") if loaded else [],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("modules", nargs="*", help="defaults to the budgeted ones")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="multiply the budgets, for slow CIs"
+    )
+    args = parser.parse_args(argv)
+
+    failures = 0
+    results = []
+    for module in args.modules or list(BUDGETS):
+        r = measure(module, args.repeat)
+        budget = BUDGETS.get(module)
+        r["budget_ms"] = budget * args.scale if budget else None
+        flags = []
+        if r["budget_ms"] and r["ms"] > r["budget_ms"]:
+            flags.append("OVER BUDGET")
+        if r["lazy_loaded"]:
+            flags.append(f"loaded {','.join(r['lazy_loaded'])}")
+        failures += bool(flags)
+        budget_txt = f"{r['budget_ms']:.0f}" if r["budget_ms"] else "-"
+        print(
+            f"{module:<30} {r['ms']:>8.1f} ms  budget {budget_txt:>5} ms  "
+            + " ".join(flags)
+        )
+        results.append(r)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,89 @@
 # SPDX-FileCopyrightText: 2023-present nuxion <nuxion@gmail.com>
 #
 # SPDX-License-Identifier: MIT
+"""
+The public classes are loaded on first access (PEP 562), so
+``import dataexec`` doesn't pay for pydantic, asyncio or the executors
+until they are used.
+"""
+import importlib
+
+# typing itself is not cheap to import, type checkers know this constant
+TYPE_CHECKING = False
+if TYPE_CHECKING:  # no cov
+    from dataexec.assets import TextAsset, copy_asset
+    from dataexec.base import RegistryInMemory
+    from dataexec.execlog import JSONLStore, RingBufferStore
+    from dataexec.executors import (
+        AsyncLocal,
+        LocalDev,
+        LocalProcess,
+        LocalThreads,
+        MPConfig,
+        ThreadsConfig,
+    )
+    from dataexec.ext.docker import DockerCommand, DockerExecutor
+    from dataexec.sqlite_registry import RegistrySQLite
+    from dataexec.steps import Step
+    from dataexec.workflows import AsyncParallel, AsyncSequence, Parallel, Sequence
+
+_LAZY = {
+    "TextAsset": "dataexec.assets",
+    "copy_asset": "dataexec.assets",
+    "RegistryInMemory": "dataexec.base",
+    "JSONLStore": "dataexec.execlog",
+    "RingBufferStore": "dataexec.execlog",
+    "AsyncLocal": "dataexec.executors",
+    "LocalDev": "dataexec.executors",
+    "LocalProcess": "dataexec.executors",
+    "LocalThreads": "dataexec.executors",
+    "MPConfig": "dataexec.executors",
+    "ThreadsConfig": "dataexec.executors",
+    # needs the docker extra
+    "DockerCommand": "dataexec.ext.docker",
+    "DockerExecutor": "dataexec.ext.docker",
+    "RegistrySQLite": "dataexec.sqlite_registry",
+    "Step": "dataexec.steps",
+    "AsyncParallel": "dataexec.workflows",
+    "AsyncSequence": "dataexec.workflows",
+    "Parallel": "dataexec.workflows",
+    "Sequence": "dataexec.workflows",
+}
+
+_SUBMODULES = {
+    "assets",
+    "base",
+    "cache",
+    "defaults",
+    "errors",
+    "execlog",
+    "executors",
+    "ext",
+    "lineage",
+    "metrics",
+    "shm",
+    "sqlite_registry",
+    "steps",
+    "tracing",
+    "types",
+    "utils",
+    "workflows",
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # the next access doesn't go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | _SUBMODULES)
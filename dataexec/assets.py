@@ -1,8 +1,18 @@
+import io
+from contextlib import contextmanager
 from pathlib import Path
-import shutil
-from typing import Optional
+from typing import IO, Iterator, Optional
+from dataexec import defaults, tracing
 from dataexec.types import AssetChange, AssetMetadata, Asset
-from dataexec.utils import basic_hash, basic_random
+from dataexec.utils import (
+    HashMemo,
+    atomic_open,
+    basic_hash,
+    copy_file,
+    file_hash,
+    hash_memo,
+    ulid,
+)
 
 
 def build_metadata(
@@ -15,7 +25,7 @@ def build_metadata(
 ) -> AssetMetadata:
     msg = description or "first commit"
     if not id_:
-        id_ = basic_random()
+        id_ = ulid()
     init_change = AssetChange(commit=basic_hash(""), msg=msg)
     meta = AssetMetadata(
         id=id_,
@@ -37,40 +47,120 @@ class TextAsset(Asset[str]):
 
     @classmethod
     def from_location(
-        cls, location, id_=None, author=None, derived_from=None
+        cls, location, id_=None, author=None, derived_from=None, lazy=False
     ) -> "TextAsset":
-        raw = cls.open(location)
+        raw = None if lazy else cls.open(location)
         meta = build_metadata(
             location, id_=id_, kind=cls.kind, author=author, derived_from=derived_from
         )
         obj = cls(raw=raw, meta=meta)
+        obj._synced = raw
         return obj
 
     @staticmethod
+    @tracing.traced("TextAsset.open")
     def open(location: str) -> str:
         with open(location, "r", encoding="utf-8") as f:
             txt = f.read()
         return txt
 
-    def copy(self, location: str, new_id=None) -> str:
-        id_ = new_id or basic_random()
-        shutil.copy(self.location, location)
-        return new_id
+    def copy(
+        self, location: str, new_id=None, strategy: str = defaults.COPY_STRATEGY
+    ) -> str:
+        """
+        :param strategy: see :func:`dataexec.utils.copy_file`
+        :return: the id for the new asset
+        """
+        id_ = new_id or ulid()
+        copy_file(self.location, location, strategy=strategy)
+        return id_
 
+    def iter_chunks(self, size: int = defaults.CHUNK_SIZE) -> Iterator[str]:
+        """Iterate over the text in chunks of ``size`` characters"""
+        raw = self._raw
+        if raw is not None:
+            for i in range(0, len(raw), size):
+                yield raw[i : i + size]
+            return
+        with open(self.location, "r", encoding="utf-8") as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def iter_lines(self) -> Iterator[str]:
+        """Iterate over the lines of the text, line endings are kept"""
+        raw = self._raw
+        if raw is not None:
+            # split like a file opened in text mode, only on line endings
+            yield from io.StringIO(raw, newline=None)
+            return
+        with open(self.location, "r", encoding="utf-8") as f:
+            yield from f
+
+    @contextmanager
+    def writer(self) -> Iterator[IO[str]]:
+        """
+        Write the asset incrementally, the payload in memory is dropped
+        and it will be read again from the new content on demand.
+
+        >>> with asset.writer() as f:
+        ...     for line in lines:
+        ...         f.write(line)
+        """
+        self.unload()
+        with atomic_open(self.location, "w", encoding="utf-8") as f:
+            yield f
+
+    @tracing.traced()
     def write(self) -> bool:
-        with open(self.location, "w", encoding="utf-8") as f:
-            f.write(self.raw)
+        if not self.is_loaded:
+            # nothing changed in memory, the file is the source of truth
+            return True
+        with atomic_open(self.location, "w", encoding="utf-8") as f:
+            f.write(self._raw)
+        self._synced = self._raw
 
         return True
 
+    @tracing.traced()
     def get_hash(self) -> str:
-        return basic_hash(self.raw)
+        """
+        Hash of the text encoded as utf-8, the same for the file and for
+        an equal payload in memory. The file is hashed in chunks and
+        memoized while it doesn't change, a payload modified in memory and
+        not written yet is hashed directly.
+        """
+        if self.is_synced and self.it_exist():
+            return file_hash(self.location, self.hash_algorithm, text=True)
+        return basic_hash(self.raw, self.hash_algorithm)
 
     def it_exist(self) -> bool:
         return Path(self.meta.location).exists()
 
 
-def copy_asset(asset: Asset, new_location) -> Asset:
-    id_ = asset.copy(new_location)
-    new_asset = asset.from_location(new_location, id_)
+def copy_asset(
+    asset: Asset, new_location, strategy: str = defaults.COPY_STRATEGY
+) -> Asset:
+    """
+    The new asset reuses the payload already loaded by the original asset
+    and its hash if it was computed, so the copy is not read back.
+    """
+    id_ = asset.copy(new_location, strategy=strategy)
+    meta = build_metadata(
+        new_location,
+        id_=id_,
+        kind=asset.kind,
+        author=asset.meta.author,
+        derived_from=asset.id,
+    )
+    raw = asset._raw if asset.is_synced else None
+    new_asset = type(asset)(raw=raw, meta=meta)
+    new_asset._synced = raw
+
+    text = isinstance(asset, TextAsset)
+    digest = hash_memo.get(HashMemo.key(asset.location, asset.hash_algorithm, text))
+    if digest is not None:
+        hash_memo.set(HashMemo.key(new_location, asset.hash_algorithm, text), digest)
     return new_asset
@@ -1,21 +1,30 @@
 import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from importlib import import_module
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Type, Union
 
-from dataexec import types, defaults
+from dataexec import defaults, tracing, types, utils
+from dataexec.lineage import LineageIndex
 from dataexec.types import Asset, AssetChange, AssetMetadata
 
 
-def _init_asset_class(fullclass_path, meta: AssetMetadata) -> Asset:
+@lru_cache(maxsize=None)
+def _get_asset_class(fullclass_path) -> Type[Asset]:
     """get a class or object from a module. The fullclass_path should be passed as:
     package.my_module.MyClass
     """
     module, class_ = fullclass_path.rsplit(".", maxsplit=1)
     mod = import_module(module)
-    cls: Asset = getattr(mod, class_)
-    obj = cls.from_meta(meta)
+    cls: Type[Asset] = getattr(mod, class_)
+    return cls
+
+
+def _init_asset_class(fullclass_path, meta: AssetMetadata, lazy=False) -> Asset:
+    cls = _get_asset_class(fullclass_path)
+    obj = cls.from_meta(meta, lazy=lazy)
     return obj
 
 
@@ -73,7 +82,13 @@ class RegistrySpec(ABC):
         pass
 
     @abstractmethod
-    def list_assets(self) -> List[AssetMetadata]:
+    def list_assets(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[AssetMetadata]:
+        """
+        :param since: only assets created from then (included).
+        :param until: only assets created before then.
+        """
         pass
 
     @abstractmethod
@@ -88,49 +103,125 @@ class RegistrySpec(ABC):
     def register_task(self, task_id: str):
         pass
 
+    @abstractmethod
+    def ancestors(self, id_: str, depth: Optional[int] = None) -> List[AssetMetadata]:
+        """Assets from which the asset was derived, the nearest first"""
+        pass
+
+    @abstractmethod
+    def descendants(self, id_: str, depth: Optional[int] = None) -> List[AssetMetadata]:
+        """Assets derived from the asset, ordered by distance"""
+        pass
+
+    @abstractmethod
+    def produced_by(self, task_id: str) -> List[AssetMetadata]:
+        pass
+
 
 class RegistryInMemory(RegistrySpec):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, cache_size: int = defaults.REGISTRY_CACHE_SIZE, **kwargs):
+        """
+        :param cache_size: max number of asset objects kept by :meth:`get_asset`,
+        the least recently used are dropped first.
+        """
         super().__init__(*args, **kwargs)
         self.assets: Dict[str, AssetMetadata] = {}
-        self.changes: Dict[str, List[AssetChange]]
+        self.changes: Dict[str, List[AssetChange]] = {}
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[str, Asset]" = OrderedDict()
+        self._lineage = LineageIndex()
 
+    @tracing.traced()
     def get_asset(self, id_: str) -> Asset:
+        """
+        Assets are returned lazily, the payload is read on the first access
+        to ``raw``. Each call returns a new object, but the payload is read
+        once and shared through the cached asset until it is commited
+        or deleted.
+        """
+        asset = self._cache.get(id_)
+        if asset is not None:
+            self._cache.move_to_end(id_)
+            return asset.detached()
         meta = self.assets[id_]
-        asset = _init_asset_class(self.kind_mapper[meta.kind], meta)
+        asset = _init_asset_class(self.kind_mapper[meta.kind], meta, lazy=True)
+        if self._cache_size > 0:
+            self._cache[id_] = asset
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
 
-        return asset
+        return asset.detached()
 
+    def _invalidate(self, id_: str):
+        asset = self._cache.pop(id_, None)
+        if asset is not None:
+            # copies not loaded yet read the new content
+            asset.unload()
+
+    @tracing.traced()
     def create_asset(self, asset: Asset, msg: str, write: bool = True):
         if write:
             asset.write()
         change = AssetChange(commit=asset.get_hash(), msg=msg)
+        self._invalidate(asset.id)
         self.assets[asset.id] = asset.meta
         self.changes[asset.id] = [change]
+        self._lineage.add(asset.meta)
 
+    @tracing.traced()
     def commit_asset(self, asset: Asset, msg: str, write: bool = True):
         if write:
             asset.write()
         change = AssetChange(commit=asset.get_hash(), msg=msg)
+        self._invalidate(asset.id)
         self.assets.update({asset.id: asset.meta})
         self.changes[asset.id].append(change)
+        self._lineage.add(asset.meta)
 
+    @tracing.traced()
     def delete_asset(self, id: str) -> bool:
+        self._invalidate(id)
+        self._lineage.remove(id)
         del self.assets[id]
         return True
 
-    def list_assets(self) -> List[AssetMetadata]:
-        return list(self.assets.values())
-
+    @tracing.traced()
+    def list_assets(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[AssetMetadata]:
+        if since is None and until is None:
+            return list(self.assets.values())
+        since = utils.naive_utc(since) if since else datetime.min
+        until = utils.naive_utc(until) if until else datetime.max
+        return [m for m in self.assets.values() if since <= m.created_at < until]
+
+    @tracing.traced()
     def list_changes(self, asset_id: str) -> List[AssetChange]:
         return self.changes[asset_id]
 
+    @tracing.traced()
     def create_task(self, task_id: str):
         raise NotImplementedError()
 
+    @tracing.traced()
     def register_task(self, task_id: str):
         raise NotImplementedError()
 
+    def _metas(self, ids: List[str]) -> List[AssetMetadata]:
+        return [self.assets[i] for i in ids if i in self.assets]
+
+    @tracing.traced()
+    def ancestors(self, id_: str, depth: Optional[int] = None) -> List[AssetMetadata]:
+        return self._metas(self._lineage.ancestors(id_, depth))
+
+    @tracing.traced()
+    def descendants(self, id_: str, depth: Optional[int] = None) -> List[AssetMetadata]:
+        return self._metas(self._lineage.descendants(id_, depth))
+
+    @tracing.traced()
+    def produced_by(self, task_id: str) -> List[AssetMetadata]:
+        return self._metas(self._lineage.produced_by(task_id))
+
 
 class TaskFutureSpec:
     def __init__(self, execid: str, created_at=datetime.utcnow()):
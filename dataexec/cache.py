@@ -0,0 +1,207 @@
+import functools
+import hashlib
+import os
+import pickle
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dataexec import defaults, types
+
+
+def _code_identity(code: CodeType) -> str:
+    """Bytecode, constants (nested functions included) and global names"""
+    consts = [
+        _code_identity(c) if isinstance(c, CodeType) else repr(c)
+        for c in code.co_consts
+    ]
+    data = "|".join([code.co_code.hex(), repr(consts), repr(code.co_names)])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def _cell_identity(cell) -> str:
+    try:
+        value = cell.cell_contents
+    except ValueError:
+        # the variable is not assigned yet
+        return "<empty>"
+    code = getattr(value, "__code__", None)
+    if isinstance(code, CodeType):
+        return _code_identity(code)
+    return _value_identity(value)
+
+
+def _func_identity(func: Callable) -> str:
+    if isinstance(func, functools.partial):
+        bound = _value_identity([list(func.args), func.keywords])
+        return f"{_func_identity(func.func)}:{bound}"
+    code = getattr(func, "__code__", None)
+    parts = []
+    if isinstance(code, CodeType):
+        parts = [
+            _code_identity(code),
+            _value_identity(getattr(func, "__defaults__", None)),
+            _value_identity(getattr(func, "__kwdefaults__", None)),
+            ",".join(
+                _cell_identity(c) for c in getattr(func, "__closure__", None) or ()
+            ),
+        ]
+    code_hash = hashlib.sha256("|".join(parts).encode()).hexdigest() if parts else ""
+    name = getattr(func, "__qualname__", repr(func))
+    return f"{getattr(func, '__module__', '')}.{name}:{code_hash}"
+
+
+def _value_identity(value: Any) -> str:
+    if isinstance(value, types.Asset):
+        return f"{value.kind}:{value.get_hash()}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_value_identity(v) for v in value) + "]"
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda kv: str(kv[0]))
+        return "{" + ",".join(f"{k}={_value_identity(v)}" for k, v in items) + "}"
+    return repr(value)
+
+
+def cache_key(func: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    """
+    Key of a call based on the identity of the function (module, name,
+    bytecode, constants, global names, defaults and closure values),
+    the params and the hash of the assets given as input.
+    """
+    parts = [_func_identity(func), _value_identity(list(args)), _value_identity(kwargs)]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+class StepCache(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[types.Output]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, output: types.Output):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class DiskCache(StepCache):
+    """
+    Outputs are pickled in a directory, one file per key.
+    Entries older than ``max_age`` seconds are ignored and removed,
+    when the size of the directory is above ``max_size`` bytes the least
+    recently used entries are removed. The size is kept up to date with
+    the writes of this instance, the directory is only scanned again when
+    it goes above ``max_size`` or, with ``max_age``, every ``max_age``
+    seconds to remove the expired entries.
+    """
+
+    def __init__(
+        self,
+        path: str = defaults.CACHE_PATH,
+        max_size: Optional[int] = defaults.CACHE_MAX_SIZE,
+        max_age: Optional[int] = defaults.CACHE_MAX_AGE,
+    ):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.path.mkdir(parents=True, exist_ok=True)
+        # size of the entries, None until the directory is scanned
+        self._size: Optional[int] = None
+        self._last_evict = time.monotonic()
+
+    def _entry(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.pkl"
+
+    def _expired(self, mtime: float) -> bool:
+        return self.max_age is not None and time.time() - mtime > self.max_age
+
+    def get(self, key: str) -> Optional[types.Output]:
+        entry = self._entry(key)
+        try:
+            if self._expired(entry.stat().st_mtime):
+                entry.unlink()
+                return None
+            with open(entry, "rb") as f:
+                output = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # mtime is used as the last access time for the eviction
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            # evicted by another process in the meantime
+            return None
+        return output
+
+    def set(self, key: str, output: types.Output):
+        entry = self._entry(key)
+        entry.parent.mkdir(exist_ok=True)
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._size is None:
+            self._size = sum(e[1] for e in self._entries())
+        self._size += tmp.stat().st_size - self._file_size(entry)
+        os.replace(tmp, entry)
+        over_size = self.max_size is not None and self._size > self.max_size
+        elapsed = time.monotonic() - self._last_evict
+        if over_size or (self.max_age is not None and elapsed > self.max_age):
+            self.evict()
+
+    @staticmethod
+    def _file_size(entry: Path) -> int:
+        try:
+            return entry.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def delete(self, key: str) -> bool:
+        entry = self._entry(key)
+        size = self._file_size(entry)
+        try:
+            entry.unlink()
+        except FileNotFoundError:
+            return False
+        if self._size is not None:
+            self._size = max(0, self._size - size)
+        return True
+
+    def clear(self):
+        for entry in self.path.glob("*/*.pkl"):
+            entry.unlink()
+        self._size = 0
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for entry in self.path.glob("*/*.pkl"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        return entries
+
+    def evict(self):
+        """Remove expired entries and the oldest ones until max_size is reached"""
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(e[1] for e in entries)
+        for mtime, size, entry in entries:
+            if not self._expired(mtime) and (
+                self.max_size is None or total <= self.max_size
+            ):
+                continue
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+        self._last_evict = time.monotonic()
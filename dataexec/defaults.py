@@ -1 +1,28 @@
 KIND_MAPPER = {"textfile": "dataexec.assets.TextAsset"}
+CACHE_PATH = ".dataexec/cache"
+# 1 GB
+CACHE_MAX_SIZE = 1024**3
+CACHE_MAX_AGE = None
+# 1 MB
+CHUNK_SIZE = 1024**2
+REGISTRY_CACHE_SIZE = 1024
+# md5 is used to detect changes, not for security, and it stays the default
+# so the hashes stored by existing registries and exec logs keep matching
+HASH_ALGORITHM = "md5"
+HASH_MEMO_SIZE = 4096
+COPY_STRATEGY = "auto"
+SQLITE_REGISTRY_PATH = ".dataexec/registry.db"
+STREAM_QUEUE_SIZE = 16
+RUN_CONCURRENCY = 4
+EXEC_LOG_CAPACITY = 10_000
+EXEC_LOG_PATH = ".dataexec/execlog"
+EXEC_LOG_SEGMENT_SIZE = 64 * 1024**2
+EXEC_LOG_FLUSH_SIZE = 100
+EXEC_LOG_FLUSH_INTERVAL = 1.0
+WF_EXECUTIONS_SIZE = 1000
+ULID_ENTROPY_BUFFER = 256
+DOCKER_LOG_TAIL = 1000
+# longer lines of the logs of a container are split
+DOCKER_LOG_LINE_SIZE = 64 * 1024
+# seconds to wait for the reader of the logs once the container stopped
+DOCKER_LOG_JOIN_TIMEOUT = 10.0
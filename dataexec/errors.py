@@ -16,3 +16,18 @@ class CancelledError(Exception):
 class TaskTimeoutError(Exception):
     def __init__(self, name):
         super().__init__(f"Task {name} time outed")
+
+
+class StepInputMismatch(Exception):
+    def __init__(self, name, reason):
+        super().__init__(f"Step {name} inputs mismatch: {reason}")
+
+
+class ContainerExecError(Exception):
+    def __init__(self, container, exit_code, output=""):
+        self.exit_code = exit_code
+        self.output = output
+        super().__init__(
+            f"Call in container {container} failed with exit code {exit_code}: "
+            f"{output}"
+        )
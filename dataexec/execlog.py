@@ -0,0 +1,293 @@
+import json
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from dataexec import defaults, types, utils
+
+
+def _matches(
+    log: types.ExecLog,
+    wf_exec_id: Optional[str],
+    step_name: Optional[str],
+    status: Optional[str],
+) -> bool:
+    return (
+        (wf_exec_id is None or log.wf_exec_id == wf_exec_id)
+        and (step_name is None or log.step_name == step_name)
+        and (status is None or log.status == status)
+    )
+
+
+def _in_range(id_: Optional[str], bounds: Optional[Tuple[str, str]]) -> bool:
+    return bounds is None or (id_ is not None and bounds[0] <= id_ < bounds[1])
+
+
+class ExecLogStore(ABC):
+    """
+    Where the workflows write the record of each step execution
+    (:class:`types.ExecLog`) and of each run (:class:`types.WorkflowExecLog`).
+    It can be iterated and indexed like the list it replaces.
+    """
+
+    @abstractmethod
+    def append(self, log: types.ExecLog):
+        pass
+
+    @abstractmethod
+    def append_workflow(self, log: types.WorkflowExecLog):
+        pass
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[types.ExecLog]:
+        pass
+
+    @abstractmethod
+    def workflows(self) -> Iterator[types.WorkflowExecLog]:
+        pass
+
+    def _scan(self, kind: str, since_id: Optional[str]) -> Iterator[Any]:
+        """
+        Records of a kind ("step" or "workflow"), the stores can skip
+        the ones with ids lower than ``since_id``.
+        """
+        return iter(self) if kind == "step" else self.workflows()
+
+    def query(
+        self,
+        wf_exec_id: Optional[str] = None,
+        step_name: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[types.ExecLog]:
+        """
+        Step executions matching all the filters given, oldest first.
+
+        :param limit: only the last ``limit`` records.
+        :param since: only executions started from then, taken from the
+        time of their ULIDs.
+        :param until: only executions started before then.
+        """
+        bounds = utils.ulid_range(since, until) if since or until else None
+        found = [
+            log
+            for log in self._scan("step", bounds and bounds[0])
+            if _in_range(log.step_execid, bounds)
+            and _matches(log, wf_exec_id, step_name, status)
+        ]
+        return found[-limit:] if limit else found
+
+    def query_workflows(
+        self,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[types.WorkflowExecLog]:
+        bounds = utils.ulid_range(since, until) if since or until else None
+        found = [
+            w
+            for w in self._scan("workflow", bounds and bounds[0])
+            if _in_range(w.wf_exec_id, bounds)
+            and (status is None or w.status == status)
+        ]
+        return found[-limit:] if limit else found
+
+    def flush(self):
+        """Write the records buffered, if the store buffers them"""
+
+    def close(self):
+        self.flush()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __getitem__(self, index: Union[int, slice]):
+        return list(self)[index]
+
+
+class RingBufferStore(ExecLogStore):
+    """Keeps only the last ``capacity`` records of each kind in memory"""
+
+    def __init__(self, capacity: int = defaults.EXEC_LOG_CAPACITY):
+        self.capacity = capacity
+        self._logs: Deque[types.ExecLog] = deque(maxlen=capacity)
+        self._workflows: Deque[types.WorkflowExecLog] = deque(maxlen=capacity)
+
+    def append(self, log: types.ExecLog):
+        self._logs.append(log)
+
+    def append_workflow(self, log: types.WorkflowExecLog):
+        self._workflows.append(log)
+
+    def __iter__(self) -> Iterator[types.ExecLog]:
+        # a copy, the deque could change while it's iterated
+        return iter(list(self._logs))
+
+    def workflows(self) -> Iterator[types.WorkflowExecLog]:
+        return iter(list(self._workflows))
+
+    def __len__(self) -> int:
+        return len(self._logs)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return list(self._logs)[index]
+        return self._logs[index]
+
+
+def _to_line(kind: str, log: Union[types.ExecLog, types.WorkflowExecLog]) -> str:
+    data = log.dict(exclude={"error"})
+    data["type"] = kind
+    data["error"] = repr(log.error) if log.error is not None else None
+    return json.dumps(data, default=str) + "\n"
+
+
+def _from_record(data: Dict[str, Any]):
+    kind = data.pop("type")
+    if data.get("error") is not None:
+        data["error"] = Exception(data["error"])
+    if kind == "workflow":
+        return types.WorkflowExecLog.parse_obj(data)
+    return types.ExecLog.parse_obj(data)
+
+
+class _SegmentWriter:
+    """
+    Buffer and segment files of a :class:`JSONLStore`, apart from it so the
+    finalizer of the store can write the buffer without keeping it alive.
+    """
+
+    def __init__(self, path: Path, segment_size: int, max_segments: Optional[int]):
+        self.path = path
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.buffer: List[str] = []
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        segments = self.segments()
+        self.segment = segments[-1] if segments else self._segment_path()
+
+    def _segment_path(self) -> Path:
+        return self.path / f"segment-{utils.ulid()}.jsonl"
+
+    def segments(self) -> List[Path]:
+        return sorted(self.path.glob("segment-*.jsonl"))
+
+    def _rotate(self):
+        self.segment = self._segment_path()
+        if self.max_segments:
+            # the new segment doesn't exist yet
+            segments = self.segments()
+            for old in segments[: len(segments) - self.max_segments + 1]:
+                old.unlink()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        data = "".join(self.buffer)
+        self.buffer.clear()
+        if self.segment.exists() and self.segment.stat().st_size >= self.segment_size:
+            self._rotate()
+        with open(self.segment, "a", encoding="utf-8") as f:
+            f.write(data)
+        self.last_flush = time.monotonic()
+
+    def write(self, line: str, flush_size: int, flush_interval: float):
+        with self.lock:
+            self.buffer.append(line)
+            elapsed = time.monotonic() - self.last_flush
+            if len(self.buffer) >= flush_size or elapsed >= flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+
+class JSONLStore(ExecLogStore):
+    """
+    Append-only store in segments of JSON lines inside ``path``.
+    Records are buffered and written in batches, when ``flush_size``
+    records are waiting or ``flush_interval`` seconds passed since the last
+    write, before a query, on :meth:`close`, when the store is garbage
+    collected and when the interpreter exits (workflows flush the store at
+    the end of each run). A new segment is started when the current one
+    reaches ``segment_size`` bytes and, with ``max_segments``, the oldest
+    segments are removed. Segments are named by a ULID taken when they are
+    started, so queries by time skip the segments finished before the range.
+    """
+
+    def __init__(
+        self,
+        path: str = defaults.EXEC_LOG_PATH,
+        segment_size: int = defaults.EXEC_LOG_SEGMENT_SIZE,
+        max_segments: Optional[int] = None,
+        flush_size: int = defaults.EXEC_LOG_FLUSH_SIZE,
+        flush_interval: float = defaults.EXEC_LOG_FLUSH_INTERVAL,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._writer = _SegmentWriter(self.path, segment_size, max_segments)
+        # the finalizer only references the writer, records still buffered
+        # are written when the store is collected or at exit
+        self._finalizer = weakref.finalize(self, self._writer.flush)
+
+    @property
+    def segment_size(self) -> int:
+        return self._writer.segment_size
+
+    @property
+    def max_segments(self) -> Optional[int]:
+        return self._writer.max_segments
+
+    def segments(self) -> List[Path]:
+        return self._writer.segments()
+
+    def _write(self, line: str):
+        self._writer.write(line, self.flush_size, self.flush_interval)
+
+    def append(self, log: types.ExecLog):
+        self._write(_to_line("step", log))
+
+    def append_workflow(self, log: types.WorkflowExecLog):
+        self._write(_to_line("workflow", log))
+
+    def flush(self):
+        self._writer.flush()
+
+    def _read(self, kind: str, since_id: Optional[str] = None) -> Iterator[Any]:
+        self.flush()
+        segments = self.segments()
+        for segment, following in zip(segments, segments[1:] + [None]):
+            # records of a segment were created before the next one started
+            if since_id and following and following.stem[8:] <= since_id:
+                continue
+            try:
+                f = open(segment, encoding="utf-8")
+            except FileNotFoundError:
+                # removed by the retention
+                continue
+            with f:
+                for line in f:
+                    data = json.loads(line)
+                    if data["type"] == kind:
+                        yield _from_record(data)
+
+    def _scan(self, kind: str, since_id: Optional[str]) -> Iterator[Any]:
+        return self._read(kind, since_id)
+
+    def __iter__(self) -> Iterator[types.ExecLog]:
+        return self._read("step")
+
+    def workflows(self) -> Iterator[types.WorkflowExecLog]:
+        return self._read("workflow")
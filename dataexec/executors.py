@@ -1,31 +1,62 @@
 import asyncio
 import contextlib
+import itertools
+import threading
 import time
+import weakref
 from abc import ABC, abstractmethod, ABCMeta
-from multiprocessing import get_context
-from concurrent.futures import ProcessPoolExecutor, CancelledError, TimeoutError
-from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar, Optional, Coroutine
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ThreadPoolExecutor,
+    CancelledError,
+    TimeoutError,
+    as_completed,
+    wait,
+)
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+    Optional,
+    Coroutine,
+    Union,
+    cast,
+)
 from concurrent.futures._base import Future
 
 from pydantic import BaseModel
 
-from dataexec import errors, types, utils
+from dataexec import errors, tracing, types, utils
 
 ExecT = TypeVar("ExecT", bound=BaseModel)
 ExecResult = TypeVar("ExecResult")
 Exec2T = TypeVar("Exec2T")
 
 
-def _process_wrapper(fn, ctx, *args, **kwargs):
-    with ProcessPoolExecutor(mp_context=ctx) as pool:
-        future = pool.submit(fn, *args, **kwargs)
-        yield future
-
-
 class MPConfig(BaseModel):
     pool_size: int = 2
     method: str = "fork"
-    timeoput: int = 60
+    # seconds to wait for a result, None waits until it's done
+    timeout: Optional[int] = None
+    # send payloads of assets to the workers using shared memory
+    shared_memory: bool = False
+    # payloads smaller than this are pickled
+    shm_min_size: int = 64 * 1024
+
+
+class ThreadsConfig(BaseModel):
+    pool_size: int = 8
+    max_in_flight: Optional[int] = None
+    timeout: Optional[int] = None
 
 
 class IGenericFuture(Generic[ExecResult], ABC):
@@ -141,17 +172,36 @@ class IExecutor(metaclass=ABCMeta):
     def submit(self, fn: Callable, *args, **kwargs) -> TaskBase:
         raise NotImplementedError()
 
-    # @abstractmethod
-    # def map(self, fn: Callable, *iterables) -> List[IFuture]:
-    #     raise NotImplementedError()
+    def map(
+        self, fn: Callable, *iterables, chunksize: int = 1, ordered=False
+    ) -> Iterator[TaskBase]:
+        """
+        Submit ``fn`` for each group of items of the iterables
+        and yield the tasks when their results are ready.
+
+        :param chunksize: items sent together to a worker, it's only used
+        by executors where a call has a fixed overhead.
+        :param ordered: yield the tasks in the order of the items instead
+        of the order in which they finish.
+        """
+        tasks = [self.submit(fn, *args) for args in zip(*iterables)]
+        if ordered:
+            yield from tasks
+            return
+        pending = list(tasks)
+        while pending:
+            for task in wait_first(pending):
+                pending.remove(task)
+                yield task
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """Release the resources of the executor, by default it's a no-op"""
 
-    # @abstractmethod
-    # def startmap(self, funcs: List[Callable],  *iterables) -> List[IFuture]:
-    #     raise NotImplementedError()
+    def __enter__(self):
+        return self
 
-    # @abstractmethod
-    # def shutdown(wait=True, *, cancel_futures=False):
-    #     raise NotImplementedError()
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
 
 
 class AIOExecutor(ABC):
@@ -159,8 +209,43 @@ class AIOExecutor(ABC):
     async def submit(self, fn: Callable, *args, **kwargs) -> AIOTaskBase:
         raise NotImplementedError()
 
+    async def map(
+        self, fn: Callable, *iterables, chunksize: int = 1, ordered=False
+    ) -> AsyncIterator[AIOTaskBase]:
+        """
+        Async version of :meth:`IExecutor.map`, ``fn`` should return an
+        awaitable and chunksize is ignored.
+
+        >>> async for task in executor.map(fn, items):
+        ...     result = await task.result()
+        """
+        tasks = [await self.submit(fn, *args) for args in zip(*iterables)]
+        if ordered:
+            for task in tasks:
+                yield task
+            return
+        pending = {task.obj: task for task in tasks}
+        while pending:
+            done, _ = await asyncio.wait(
+                list(pending), return_when=asyncio.FIRST_COMPLETED
+            )
+            for obj in done:
+                yield pending.pop(obj)
+
 
 class LocalTask(TaskBase[Coroutine]):
+    def __init__(self, taskid: str, awaitable: Coroutine, result: Any = None):
+        super().__init__(taskid, awaitable, result)
+        self._status = types.ExecStatus.waiting
+
+    @classmethod
+    def from_result(cls, result: Any) -> "LocalTask":
+        """A task already done with the result given"""
+        # the task is done, there is nothing to resume
+        task = cls(utils.ulid(), cast(Coroutine, None), result)
+        task._status = types.ExecStatus.done
+        return task
+
     def cancel(self) -> bool:
         return False
 
@@ -168,63 +253,73 @@ class LocalTask(TaskBase[Coroutine]):
         return False
 
     def running(self) -> bool:
-        return bool(self._result)
+        return False
 
     def done(self) -> bool:
-        return bool(self._result)
+        return self._status == types.ExecStatus.done
 
     def result(self, timeout=None) -> Any:
-        if not self._result:
-            self._result = next(self.obj)
-            try:
-                next(self.obj)
-            except StopIteration:
-                pass
+        if self._status != types.ExecStatus.done:
+            with tracing.span("LocalTask.result", task=self.id):
+                self._result = next(self.obj)
+                self._status = types.ExecStatus.done
+                try:
+                    next(self.obj)
+                except StopIteration:
+                    pass
         return self._result
 
 
 class FutureTask(TaskBase[Future]):
-    def __init__(self, taskid: str, awaitable: Future, coro: Coroutine):
+    def __init__(
+        self,
+        taskid: str,
+        awaitable: Future,
+        timeout: Optional[int] = None,
+        on_result: Optional[Callable[[Any], Any]] = None,
+    ):
+        """
+        :param on_result: applied once to the result of the future
+        before returning it.
+        """
         super().__init__(taskid, awaitable)
-        self.coro = coro
+        self._status = types.ExecStatus.waiting
+        self._timeout = timeout
+        self._on_result = on_result
 
     def cancel(self) -> bool:
         cancelled = self.obj.cancel()
-        if not cancelled:
-            try:
-                self.obj.result(0.1)
-            except TimeoutError:
-                cancelled = True
-        if cancelled and not self.obj.running():
+        if cancelled:
             self._status = types.ExecStatus.cancelled
-            return cancelled
-        return False
+        return cancelled
+
+    def cancelled(self) -> bool:
+        return self.obj.cancelled()
 
     def running(self) -> bool:
-        return self.obj.is_alive()
+        return self.obj.running()
 
     def done(self) -> bool:
-        return True
-
-    def _next(self):
-        try:
-            next(self.coro)
-        except StopIteration:
-            pass
-        except CancelledError:
-            pass
-        except TimeoutError:
-            pass
+        return self.obj.done()
 
     def result(self, timeout=None) -> Any:
-        if not self._result:
+        """
+        :param timeout: seconds to wait for the result, if it's not provided
+        the default timeout of the executor is used.
+        """
+        if self._status != types.ExecStatus.done:
             try:
-                self._result = self.obj.result(timeout)
+                with tracing.span("FutureTask.result", task=self.id):
+                    self._result = self.obj.result(timeout or self._timeout)
+                    if self._on_result is not None:
+                        self._result = self._on_result(self._result)
                 self._status = types.ExecStatus.done
-                self._next()
             except TimeoutError as e:
                 self._status = types.ExecStatus.failed
                 raise errors.TaskTimeoutError(self.id) from e
+            except CancelledError as e:
+                self._status = types.ExecStatus.cancelled
+                raise errors.CancelledError(self.id) from e
         return self._result
 
 
@@ -246,10 +341,11 @@ class AIOTask(AIOTaskBase[Awaitable]):
 
     async def result(self, timeout=None) -> Any:
         try:
-            if timeout and not self._result:
-                self._result = await asyncio.wait_for(self.obj, timeout=timeout)
-            elif not self._result:
-                self._result = await self.obj
+            with tracing.span("AIOTask.result", task=self.id):
+                if timeout and not self._result:
+                    self._result = await asyncio.wait_for(self.obj, timeout=timeout)
+                elif not self._result:
+                    self._result = await self.obj
 
         except asyncio.TimeoutError as e:
             raise errors.TaskTimeoutError(self.id) from e
@@ -257,6 +353,24 @@ class AIOTask(AIOTaskBase[Awaitable]):
         return self._result
 
 
+def wait_first(tasks: List[TaskBase]) -> List[TaskBase]:
+    """
+    Block until at least one of the tasks is done and return the finished ones.
+    Tasks without a real future behind them (like :class:`LocalTask`)
+    are resolved in order.
+    """
+    finished = [t for t in tasks if t.done()]
+    if finished:
+        return finished
+    futures = {t.obj: t for t in tasks if isinstance(t.obj, Future)}
+    if len(futures) == len(tasks):
+        done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+        return [futures[f] for f in done]
+    pending = next(t for t in tasks if not isinstance(t.obj, Future))
+    pending.result()
+    return [pending]
+
+
 class LocalDev(IExecutor):
     """The defaul executor"""
 
@@ -271,24 +385,251 @@ class LocalDev(IExecutor):
         to LocalTask.result()
         """
 
-        taskid = utils.secure_random_str()
-        coro = self._call_wrapper(fn, *args, **kwargs)
+        taskid = utils.ulid()
+        with tracing.span("LocalDev.submit", task=taskid):
+            coro = self._call_wrapper(fn, *args, **kwargs)
         return LocalTask(taskid, coro)
 
 
-class LocalProcess(IExecutor):
-    def __init__(self, method="fork"):
-        self._ctx = get_context(method)
+def _run_chunk(fn: Callable, chunk: List[tuple]) -> List[Tuple[bool, Any]]:
+    results = []
+    for args in chunk:
+        try:
+            results.append((True, fn(*args)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def _chunk_tasks(
+    chunk: Future,
+    timeout: Optional[int],
+    on_result: Optional[Callable[[Any], Any]] = None,
+) -> Iterator[FutureTask]:
+    for ok, value in chunk.result():
+        future: Future = Future()
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+        yield FutureTask(utils.ulid(), future, timeout=timeout, on_result=on_result)
+
+
+class PoolExecutor(IExecutor):
+    """
+    Base for executors backed by a :class:`concurrent.futures.Executor`.
+    The pool is started on the first submit and it lives until
+    :meth:`shutdown` is called, so workers are shared between submissions.
+    """
+
+    def __init__(self, timeout: Optional[int] = None):
+        self._timeout = timeout
+        self._pool: Optional[Executor] = None
+        self._futures: "weakref.WeakSet[Future]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_pool(self) -> Executor:
+        raise NotImplementedError()
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._new_pool()
+            return self._pool
+
+    def _submit_future(self, fn: Callable, *args, **kwargs) -> Future:
+        with tracing.span(f"{type(self).__name__}.submit"):
+            pool = self._get_pool()
+            future = pool.submit(tracing.propagate(fn), *args, **kwargs)
+        self._futures.add(future)
+        return future
 
     def submit(self, fn: Callable, *args, **kwargs) -> FutureTask:
-        coro = _process_wrapper(fn, self._ctx, *args, **kwargs)
-        future = next(coro)
-        taskid = utils.secure_random_str()
-        return FutureTask(taskid, future, coro)
+        future = self._submit_future(fn, *args, **kwargs)
+        taskid = utils.ulid()
+        return FutureTask(taskid, future, timeout=self._timeout)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """
+        :param wait: wait for the pending futures to finish
+        :param cancel_futures: cancel futures that didn't start yet
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if cancel_futures:
+            for future in list(self._futures):
+                future.cancel()
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+class LocalProcess(PoolExecutor):
+    """Executes each task in a pool of worker processes configured by MPConfig"""
+
+    def __init__(
+        self,
+        conf: Union[MPConfig, str, None] = None,
+        *,
+        method: Optional[str] = None,
+    ):
+        """
+        :param conf: a start method as first argument is still accepted,
+        like ``LocalProcess("spawn")``.
+        :param method: start method of the workers, it overrides the one
+        of ``conf``.
+        """
+        if isinstance(conf, str):
+            conf, method = None, method or conf
+        self.conf = conf or MPConfig()
+        if method is not None:
+            self.conf = self.conf.copy(update={"method": method})
+        super().__init__(timeout=self.conf.timeout)
+
+    def _new_pool(self) -> Executor:
+        # multiprocessing is imported by the first pool, not with the module
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        if self.conf.shared_memory:
+            from multiprocessing import resource_tracker
+
+            # forked workers must share the tracker of this process, with
+            # their own one the segments they create are seen as leaked
+            resource_tracker.ensure_running()
+        return ProcessPoolExecutor(
+            max_workers=self.conf.pool_size,
+            mp_context=get_context(self.conf.method),
+        )
+
+    def submit(self, fn: Callable, *args, **kwargs) -> FutureTask:
+        """
+        With ``shared_memory`` enabled, the payloads of the assets given and
+        returned are moved through shared memory segments. Segments of the
+        inputs are removed when the future is done, segments of the outputs
+        when the result is read from the task or when the task is discarded.
+        """
+        if not self.conf.shared_memory:
+            return super().submit(fn, *args, **kwargs)
+        from dataexec import shm
+
+        min_size = self.conf.shm_min_size
+        args, kwargs, segments = shm.share_args(args, kwargs, min_size)
+        try:
+            future = self._submit_future(shm.call, fn, args, kwargs, min_size)
+        except BaseException:
+            shm.close_segments(segments)
+            raise
+        future.add_done_callback(lambda _: shm.close_segments(segments))
+        task = FutureTask(
+            utils.ulid(),
+            future,
+            timeout=self._timeout,
+            on_result=shm.release_result,
+        )
+        weakref.finalize(task, shm.discard_result, future)
+        return task
+
+    def map(
+        self, fn: Callable, *iterables, chunksize: int = 1, ordered=False
+    ) -> Iterator[FutureTask]:
+        """
+        Items are sent to the workers in chunks of ``chunksize`` to reduce
+        the cost of the communication with the pool, but one task
+        is yielded for each item. With ``shared_memory`` enabled, payloads
+        are moved like in :meth:`submit`.
+        """
+        items = zip(*iterables)
+        chunks = []
+        while True:
+            chunk = list(itertools.islice(items, chunksize))
+            if not chunk:
+                break
+            chunks.append(self._submit_chunk(fn, chunk))
+        if ordered:
+            finished: Iterable[Future] = chunks
+        else:
+            finished = as_completed(chunks)
+        pending = set(chunks)
+        try:
+            for future in finished:
+                pending.discard(future)
+                yield from self._chunk_tasks(future)
+        finally:
+            if self.conf.shared_memory:
+                from dataexec import shm
+
+                # outputs of the chunks not yielded won't be read
+                for future in pending:
+                    shm.discard_result(future)
+
+    def _submit_chunk(self, fn: Callable, chunk: List[tuple]) -> Future:
+        if not self.conf.shared_memory:
+            return self._submit_future(_run_chunk, fn, chunk)
+        from dataexec import shm
+
+        min_size = self.conf.shm_min_size
+        shared, _, segments = shm.share_args(tuple(chunk), {}, min_size)
+        try:
+            future = self._submit_future(shm.call_chunk, fn, list(shared), min_size)
+        except BaseException:
+            shm.close_segments(segments)
+            raise
+        future.add_done_callback(lambda _: shm.close_segments(segments))
+        return future
+
+    def _chunk_tasks(self, chunk: Future) -> Iterator[FutureTask]:
+        if not self.conf.shared_memory:
+            yield from _chunk_tasks(chunk, self.conf.timeout)
+            return
+        from dataexec import shm
+
+        # all the tasks are created so the ones never yielded are released
+        tasks = list(_chunk_tasks(chunk, self.conf.timeout, shm.release_result))
+        for task in tasks:
+            weakref.finalize(task, shm.discard_result, task.obj)
+        yield from tasks
+
+
+class LocalThreads(PoolExecutor):
+    """
+    Executes each task in a pool of threads, useful for steps that spend
+    their time in I/O. When ``max_in_flight`` tasks are pending,
+    :meth:`submit` blocks until one of them finishes.
+    """
+
+    def __init__(self, conf: Optional[ThreadsConfig] = None):
+        self.conf = conf or ThreadsConfig()
+        super().__init__(timeout=self.conf.timeout)
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        if self.conf.max_in_flight:
+            self._slots = threading.BoundedSemaphore(self.conf.max_in_flight)
+
+    def _new_pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=self.conf.pool_size, thread_name_prefix="dataexec"
+        )
+
+    def _release(self, _: Future):
+        if self._slots is not None:
+            self._slots.release()
+
+    def _submit_future(self, fn: Callable, *args, **kwargs) -> Future:
+        if self._slots is None:
+            return super()._submit_future(fn, *args, **kwargs)
+        with tracing.span("LocalThreads.wait_slot"):
+            self._slots.acquire()
+        try:
+            future = super()._submit_future(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
 
 
 class AsyncLocal(AIOExecutor):
     async def submit(self, fn: Callable, *args, **kwargs) -> AIOTask:
         awaitable = asyncio.create_task(fn(*args, **kwargs))
-        taskid = utils.secure_random_str()
+        taskid = utils.ulid()
         return AIOTask(taskid, awaitable)
@@ -1,17 +1,46 @@
+import codecs
+import functools
 import json
 import logging
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import docker
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from dataexec import defaults, errors, utils
+from dataexec.executors import PoolExecutor
 
 logger = logging.getLogger("docker")
 
 
 class DockerBuildLowLog(BaseModel):
+    # the last lines, all of them are in log_file if it was given
     logs: str
     error: bool
+    lines: int = 0
+    log_file: Optional[str] = None
 
 
 class DockerPushLog(BaseModel):
@@ -37,16 +66,128 @@ class DockerVolume(BaseModel):
 
 
 class DockerRunResult(BaseModel):
+    # the last lines of the logs, all of them are in log_file if it was given
     msg: str
     status: int
+    lines: int = 0
+    log_file: Optional[str] = None
+
+
+_NEWLINE = re.compile(r"\r\n|\r|\n")
+
+
+def _pieces(line: str, size: int) -> Iterator[str]:
+    for i in range(0, max(len(line), 1), size):
+        yield line[i : i + size]
 
 
-def docker_low_build(path, dockerfile, tag, rm=False) -> DockerBuildLowLog:
+def iter_lines(
+    chunks: Iterable[bytes], max_line: int = defaults.DOCKER_LOG_LINE_SIZE
+) -> Iterator[str]:
+    """
+    Lines of a stream of logs, chunks can split lines anywhere.
+    A ``\\r`` alone ends a line too, like the updates of a progress bar,
+    and lines longer than ``max_line`` characters are given in pieces,
+    so the memory used doesn't depend on the length of the lines.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending: List[str] = []
+    size = 0
+    # pieces of the current line were given already
+    split = False
+    # a \r at the end of a chunk could be followed by \n in the next one
+    after_cr = False
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if not text:
+            continue
+        if after_cr and text[0] == "\n":
+            text = text[1:]
+        after_cr = text.endswith("\r")
+        *lines, rest = _NEWLINE.split(text)
+        for line in lines:
+            pending.append(line)
+            line = "".join(pending)
+            if line or not split:
+                yield from _pieces(line, max_line)
+            pending, size, split = [], 0, False
+        pending.append(rest)
+        size += len(rest)
+        if size >= max_line:
+            # only the last piece, shorter than max_line, is kept
+            line = "".join(pending)
+            full = size - size % max_line
+            yield from _pieces(line[:full], max_line)
+            pending, size, split = [line[full:]], size - full, True
+    rest = "".join(pending) + decoder.decode(b"", final=True)
+    if rest:
+        yield from _pieces(rest, max_line)
+
+
+class LogTail:
+    """
+    Consumer of logs that keeps only the last ``size`` lines in memory.
+    Each line is given to ``on_line`` and, with ``log_file``, all of
+    them are written to that file. Lines added once it's closed are not
+    written to the file.
+    """
+
+    def __init__(
+        self,
+        size: int = defaults.DOCKER_LOG_TAIL,
+        on_line: Optional[Callable[[str], None]] = None,
+        log_file: Optional[str] = None,
+    ):
+        self.tail: Deque[str] = deque(maxlen=size)
+        self.on_line = on_line
+        self.log_file = log_file
+        self.lines = 0
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+        if log_file:
+            self._file = open(log_file, "w", encoding="utf-8")
+
+    def add(self, line: str):
+        with self._lock:
+            self.lines += 1
+            self.tail.append(line)
+            if self._file is not None:
+                self._file.write(line + "\n")
+        if self.on_line is not None:
+            self.on_line(line)
+
+    def consume(self, chunks: Iterable[bytes]):
+        for line in iter_lines(chunks):
+            self.add(line)
+
+    def text(self) -> str:
+        return "\n".join(self.tail)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def docker_low_build(
+    path,
+    dockerfile,
+    tag,
+    rm=False,
+    *,
+    on_line: Optional[Callable[[str], None]] = None,
+    tail: int = defaults.DOCKER_LOG_TAIL,
+    log_file: Optional[str] = None,
+) -> DockerBuildLowLog:
     """It uses the low API of python sdk.
     :param path: path to the Dockerfile
     :param dockerfile: name of the Dockerfile
     :param tag: fullname of the dokcer image to build
     :param rm: remove intermediate build images
+    :param on_line: called with each line of the build
+    :param tail: lines of the build kept in the result
+    :param log_file: where all the lines of the build are written
     """
 
     # obj = _open_dockerfile(dockerfile)
@@ -54,31 +195,33 @@ def docker_low_build(path, dockerfile, tag, rm=False) -> DockerBuildLowLog:
     _client = docker.APIClient(base_url="unix://var/run/docker.sock")
     generator = _client.build(path=path, dockerfile=dockerfile, tag=tag, rm=rm)
     error = False
-    log_messages = ""
-    while True:
-        try:
-            output = generator.__next__()
+    logs = LogTail(tail, on_line=on_line, log_file=log_file)
+    try:
+        for output in generator:
             output = output.decode().strip("\r\n")
-            json_output = json.loads(output)
+            try:
+                json_output = json.loads(output)
+            except ValueError:
+                logger.info("Error parsing output from docker image build: %s" % output)
+                logs.add(f"Error parsing output from docker image build:{output}")
+                error = True
+                continue
             if "stream" in json_output:
                 logger.info(json_output["stream"].strip("\n"))
-                log_messages += json_output["stream"]
+                for line in json_output["stream"].rstrip("\n").split("\n"):
+                    logs.add(line)
             elif "errorDetail" in json_output:
                 logger.error(json_output["error"])
-                log_messages += json_output["error"]
+                logs.add(json_output["error"])
                 error = True
+        logger.info("Docker image build complete")
+        logs.add("Docker image build complete.")
+    finally:
+        logs.close()
 
-        except StopIteration:
-            logger.info("Docker image build complete")
-            log_messages += "Docker image build complete.\n"
-            break
-        except ValueError:
-            logger.info("Error parsing output from docker image build: %s" % output)
-            log_messages += "Error parsing output from docker image build:{output}\n"
-            # raise ValueError(log)
-            error = True
-
-    return DockerBuildLowLog(error=error, logs=log_messages)
+    return DockerBuildLowLog(
+        error=error, logs=logs.text(), lines=logs.lines, log_file=log_file
+    )
 
 
 class DockerCommand:
@@ -114,7 +257,18 @@ class DockerCommand:
         ports=None,
         resources=DockerResources(),
         volumes: List[DockerVolume] = [],
+        on_line: Optional[Callable[[str], None]] = None,
+        tail: int = defaults.DOCKER_LOG_TAIL,
+        log_file: Optional[str] = None,
     ) -> DockerRunResult:
+        """
+        Run a command in a new container. The logs are read line by line
+        while the container runs, only the last ``tail`` lines are kept.
+
+        :param on_line: called with each line of the logs, by default
+        they are logged with debug level.
+        :param log_file: where all the lines of the logs are written.
+        """
         # runtime = None
         device_requests = []
         if require_gpu:
@@ -123,8 +277,9 @@ class DockerCommand:
                 docker.types.DeviceRequest(count=gpu_count, capabilities=[["gpu"]])
             ]
 
-        logs = ""
         status_code = -1
+        logs = LogTail(tail, on_line=on_line or logger.debug, log_file=log_file)
+        reader: Optional[threading.Thread] = None
         try:
             vols = [self._vol2dict(v) for v in volumes]
             logger.debug(f"image: {image}, cmd: {cmd}, gpu: {require_gpu}")
@@ -140,26 +295,38 @@ class DockerCommand:
                 ports=ports,
                 **resources.dict(),
             )
+            # the stream ends when the container stops
+            reader = threading.Thread(
+                target=logs.consume,
+                args=(container.logs(stream=True, follow=True),),
+                daemon=True,
+            )
+            reader.start()
             result = self._wait_result(container, timeout)
             if not result:
                 container.kill()
             else:
                 status_code = result["StatusCode"]
-            logs = container.logs().decode("utf-8")
             if remove:
                 container.remove()
         except docker.errors.ContainerError as e:
             logger.error(str(e))
-            logs = str(e)
+            logs.add(str(e))
             status_code = -2
         except docker.errors.APIError as e:
-            logs = str(e)
+            logs.add(str(e))
             logger.error(str(e))
             status_code = -3
+        finally:
+            # the last lines are read before the logs are closed, on success
+            # and on failure
+            if reader is not None:
+                reader.join(defaults.DOCKER_LOG_JOIN_TIMEOUT)
+            logs.close()
 
-        for line in logs:
-            logger.debug(line)
-        return DockerRunResult(msg=logs, status=status_code)
+        return DockerRunResult(
+            msg=logs.text(), status=status_code, lines=logs.lines, log_file=log_file
+        )
 
     def build(
         self, path: str, dockerfile: str, tag: str, version: str, rm=False, push=False
@@ -225,3 +392,262 @@ class DockerCommand:
         """
 
         self.docker.images.pull(repository, tag=tag)
+
+
+class DockerStepConfig(BaseModel):
+    """Container of a step, what's not given is taken from DockerExecConfig"""
+
+    image: Optional[str] = None
+    resources: Optional[DockerResources] = None
+    volumes: List[DockerVolume] = Field(default_factory=list)
+    env: Dict[str, str] = Field(default_factory=dict)
+
+
+class DockerExecConfig(BaseModel):
+    """
+    :param image: image of the steps without their own one, it needs
+    python and the code of the steps (and dataexec) importable.
+    :param pool_size: calls running at the same time.
+    :param containers_per_image: warm containers of each image (and
+    resources and volumes), they are started on demand.
+    :param shared_dir: directory of the host mounted in ``mount`` where
+    the calls and their results are exchanged, a temporary one by default.
+    :param steps: config of each step by its alias, fan-out steps by the
+    name of their function.
+    """
+
+    image: str
+    pool_size: int = 4
+    containers_per_image: int = 2
+    shared_dir: Optional[str] = None
+    mount: str = "/dataexec"
+    python: str = "python"
+    workdir: Optional[str] = None
+    keepalive_cmd: str = "sleep infinity"
+    network_mode: str = "bridge"
+    timeout: Optional[int] = None
+    resources: DockerResources = DockerResources()
+    volumes: List[DockerVolume] = Field(default_factory=list)
+    env: Dict[str, str] = Field(default_factory=dict)
+    steps: Dict[str, DockerStepConfig] = Field(default_factory=dict)
+
+
+# runs a pickled call inside the container, exceptions are results too.
+# With a timeout, the default action of SIGALRM ends the call when it expires
+_RUNNER = """
+import pickle, signal, sys
+if len(sys.argv) > 3 and hasattr(signal, "alarm"):
+    signal.alarm(int(sys.argv[3]))
+with open(sys.argv[1], "rb") as f:
+    fn, args, kwargs = pickle.load(f)
+try:
+    result = (True, fn(*args, **kwargs))
+except Exception as e:
+    result = (False, e)
+try:
+    data = pickle.dumps(result)
+except Exception as e:
+    data = pickle.dumps((False, RuntimeError(f"{result[1]!r} can't be pickled: {e}")))
+with open(sys.argv[2], "wb") as f:
+    f.write(data)
+"""
+
+
+def _step_name(fn: Callable) -> Optional[str]:
+    """Alias of a Step, or name of the function of a fan-out step"""
+    if isinstance(fn, functools.partial) and fn.args and callable(fn.args[0]):
+        fn = fn.args[0]
+    return getattr(fn, "alias", None) or getattr(fn, "__name__", None)
+
+
+class ContainerSpec(BaseModel):
+    image: str
+    resources: DockerResources
+    volumes: List[DockerVolume]
+    env: Dict[str, str]
+
+    @property
+    def key(self) -> str:
+        return self.json()
+
+
+class ContainerPool:
+    """
+    Long-lived containers kept running with ``keepalive_cmd``, up to
+    ``containers_per_image`` for each spec. A call takes an idle container,
+    or starts a new one, and gives it back when it finishes.
+    """
+
+    def __init__(self, client, conf: DockerExecConfig, shared_dir: str):
+        self.client = client
+        self.conf = conf
+        self.shared_dir = shared_dir
+        self._idle: Dict[str, List[Any]] = {}
+        self._started: Dict[str, int] = {}
+        self._all: List[Any] = []
+        self._cond = threading.Condition()
+
+    def _start(self, spec: ContainerSpec):
+        shared = DockerVolume(orig=self.shared_dir, dst=self.conf.mount)
+        volumes: Dict[str, Any] = {}
+        for v in [shared, *spec.volumes]:
+            volumes[v.orig] = {"bind": v.dst, "mode": v.mode}
+        logger.debug(f"starting a container of {spec.image}")
+        return self.client.containers.run(
+            spec.image,
+            self.conf.keepalive_cmd,
+            detach=True,
+            environment=spec.env,
+            network_mode=self.conf.network_mode,
+            volumes=volumes,
+            **spec.resources.dict(),
+        )
+
+    def acquire(self, spec: ContainerSpec):
+        key = spec.key
+        with self._cond:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                if idle:
+                    return idle.pop()
+                if self._started.get(key, 0) < self.conf.containers_per_image:
+                    self._started[key] = self._started.get(key, 0) + 1
+                    break
+                self._cond.wait()
+        try:
+            container = self._start(spec)
+        except BaseException:
+            with self._cond:
+                self._started[key] -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._all.append(container)
+        return container
+
+    def release(self, spec: ContainerSpec, container):
+        with self._cond:
+            self._idle.setdefault(spec.key, []).append(container)
+            self._cond.notify_all()
+
+    def discard(self, spec: ContainerSpec, container):
+        """Remove a broken container, a new one takes its place"""
+        with self._cond:
+            self._started[spec.key] -= 1
+            if container in self._all:
+                self._all.remove(container)
+            self._cond.notify_all()
+        _remove(container)
+
+    def close(self):
+        with self._cond:
+            containers, self._all = self._all, []
+            self._idle.clear()
+            self._started.clear()
+        for container in containers:
+            _remove(container)
+
+
+def _remove(container):
+    try:
+        container.remove(force=True)
+    except docker.errors.APIError as e:
+        logger.error(str(e))
+
+
+class DockerExecutor(PoolExecutor):
+    """
+    Executes each task in a warm container, the call is pickled to a
+    directory shared with the containers and run with ``exec_run``,
+    so containers are started once and not for each step. The image
+    and the resources and volumes of each step are set in
+    :attr:`DockerExecConfig.steps`. Assets are passed by their location,
+    it should be mounted at the same path inside the containers.
+    """
+
+    def __init__(self, conf: DockerExecConfig, docker_client=None):
+        self.conf = conf
+        super().__init__(timeout=conf.timeout)
+        self.client = docker_client or docker.from_env()
+        self._own_dir = conf.shared_dir is None
+        self.shared_dir = conf.shared_dir or tempfile.mkdtemp(prefix="dataexec-")
+        self.containers = ContainerPool(self.client, conf, self.shared_dir)
+
+    def _new_pool(self) -> Executor:
+        return ThreadPoolExecutor(
+            max_workers=self.conf.pool_size, thread_name_prefix="dataexec-docker"
+        )
+
+    def spec(self, fn: Callable) -> ContainerSpec:
+        step = self.conf.steps.get(_step_name(fn) or "", DockerStepConfig())
+        return ContainerSpec(
+            image=step.image or self.conf.image,
+            resources=step.resources or self.conf.resources,
+            volumes=[*self.conf.volumes, *step.volumes],
+            env={**self.conf.env, **step.env},
+        )
+
+    def _exec(self, container, fn: Callable, args, kwargs) -> Tuple[bool, Any]:
+        name = utils.ulid()
+        inputs = os.path.join(self.shared_dir, f"{name}.in")
+        outputs = os.path.join(self.shared_dir, f"{name}.out")
+        try:
+            with open(inputs, "wb") as f:
+                pickle.dump((fn, args, kwargs), f)
+            mount = self.conf.mount
+            cmd = [
+                self.conf.python,
+                "-c",
+                _RUNNER,
+                f"{mount}/{name}.in",
+                f"{mount}/{name}.out",
+            ]
+            if self.conf.timeout:
+                cmd.append(str(self.conf.timeout))
+            exit_code, output = container.exec_run(cmd, workdir=self.conf.workdir)
+            if exit_code != 0 or not os.path.exists(outputs):
+                output = (output or b"").decode("utf-8", errors="replace")
+                raise errors.ContainerExecError(container.id, exit_code, output)
+            with open(outputs, "rb") as f:
+                return pickle.load(f)
+        finally:
+            for path in (inputs, outputs):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def _call(self, spec: ContainerSpec, fn: Callable, *args, **kwargs):
+        """
+        With a ``timeout``, the call is ended inside the container when it
+        expires, so the container is not kept busy by a task whose result
+        nobody waits for.
+        """
+        container = self.containers.acquire(spec)
+        started = time.monotonic()
+        try:
+            ok, value = self._exec(container, fn, args, kwargs)
+        except errors.ContainerExecError as e:
+            # the runner itself failed, the container could be broken
+            self.containers.discard(spec, container)
+            timeout = self.conf.timeout
+            if timeout and time.monotonic() - started >= timeout:
+                raise errors.TaskTimeoutError(container.id) from e
+            raise
+        except BaseException:
+            self.containers.release(spec, container)
+            raise
+        self.containers.release(spec, container)
+        if not ok:
+            raise value
+        return value
+
+    def _submit_future(self, fn: Callable, *args, **kwargs):
+        spec = self.spec(fn)
+        call = functools.partial(self._call, spec, fn)
+        return super()._submit_future(call, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """Stop the pool and remove its containers"""
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+        self.containers.close()
+        if self._own_dir:
+            shutil.rmtree(self.shared_dir, ignore_errors=True)
@@ -0,0 +1,78 @@
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Set
+
+from dataexec.types import AssetMetadata
+
+
+class LineageIndex:
+    """
+    Adjacency maps of the assets of a registry built from
+    ``derived_from`` and ``build_by_task``.
+    Queries only walk the edges of the assets involved.
+    """
+
+    def __init__(self):
+        self._parent: Dict[str, str] = {}
+        self._children: Dict[str, Set[str]] = defaultdict(set)
+        self._task: Dict[str, str] = {}
+        self._by_task: Dict[str, Set[str]] = defaultdict(set)
+
+    def _unlink(self, id_: str):
+        parent = self._parent.pop(id_, None)
+        if parent is not None:
+            self._children[parent].discard(id_)
+        task = self._task.pop(id_, None)
+        if task is not None:
+            self._by_task[task].discard(id_)
+
+    def add(self, meta: AssetMetadata):
+        """Add or update the edges of an asset"""
+        self._unlink(meta.id)
+        if meta.derived_from:
+            self._parent[meta.id] = meta.derived_from
+            self._children[meta.derived_from].add(meta.id)
+        if meta.build_by_task:
+            self._task[meta.id] = meta.build_by_task
+            self._by_task[meta.build_by_task].add(meta.id)
+
+    def remove(self, id_: str):
+        """
+        Remove the edges of the asset with its parent and its task,
+        the assets derived from it are not reachable from its ancestors anymore.
+        """
+        self._unlink(id_)
+        children = self._children.get(id_)
+        if not children:
+            self._children.pop(id_, None)
+
+    def ancestors(self, id_: str, depth: Optional[int] = None) -> List[str]:
+        """Ids of the assets from which the asset was derived, nearest first"""
+        found: List[str] = []
+        seen = {id_}
+        current = self._parent.get(id_)
+        while current is not None and current not in seen:
+            if depth is not None and len(found) >= depth:
+                break
+            seen.add(current)
+            found.append(current)
+            current = self._parent.get(current)
+        return found
+
+    def descendants(self, id_: str, depth: Optional[int] = None) -> List[str]:
+        """Ids of the assets derived from the asset in breadth first order"""
+        found: List[str] = []
+        seen = {id_}
+        queue = deque([(id_, 0)])
+        while queue:
+            current, level = queue.popleft()
+            if depth is not None and level >= depth:
+                continue
+            for child in self._children.get(current, ()):
+                if child not in seen:
+                    seen.add(child)
+                    found.append(child)
+                    queue.append((child, level + 1))
+        return found
+
+    def produced_by(self, task_id: str) -> List[str]:
+        return list(self._by_task.get(task_id, ()))
@@ -0,0 +1,140 @@
+import json
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from dataexec import types
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Percentile by linear interpolation between the closest ranks.
+
+    :param q: between 0 and 1.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q
+    low, high = math.floor(rank), math.ceil(rank)
+    if low == high:
+        return float(ordered[low])
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class Summary(BaseModel):
+    """Distribution of a measure, in seconds"""
+
+    p50: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+    sum: float = 0.0
+
+    @classmethod
+    def from_ns(cls, values: List[int]) -> "Summary":
+        seconds = [v / 1e9 for v in values]
+        p50, p95, p99 = (percentile(seconds, q) for q in QUANTILES)
+        return cls(p50=p50, p95=p95, p99=p99, sum=sum(seconds))
+
+
+class StepMetrics(BaseModel):
+    step_name: str
+    count: int = 0
+    failed: int = 0
+    cached: int = 0
+    wall: Summary = Summary()
+    cpu: Summary = Summary()
+    queue_wait: Summary = Summary()
+    input_bytes: int = 0
+    output_bytes: int = 0
+
+    @classmethod
+    def from_logs(cls, name: str, logs: List[types.ExecLog]) -> "StepMetrics":
+        return cls(
+            step_name=name,
+            count=len(logs),
+            failed=sum(1 for log in logs if log.status == types.ExecStatus.failed),
+            cached=sum(1 for log in logs if log.cached),
+            wall=Summary.from_ns([log.wall_ns for log in logs]),
+            cpu=Summary.from_ns([log.cpu_ns for log in logs]),
+            queue_wait=Summary.from_ns([log.queue_wait_ns for log in logs]),
+            input_bytes=sum(log.input_bytes for log in logs),
+            output_bytes=sum(log.output_bytes for log in logs),
+        )
+
+
+def collect(logs: Iterable[types.ExecLog]) -> List[StepMetrics]:
+    """
+    Metrics of each step, in the order the steps were first executed.
+    Skipped executions are not counted because nothing was executed.
+    """
+    by_step: Dict[str, List[types.ExecLog]] = OrderedDict()
+    for log in logs:
+        if not log.skipped:
+            by_step.setdefault(log.step_name, []).append(log)
+    return [StepMetrics.from_logs(name, group) for name, group in by_step.items()]
+
+
+def to_json(metrics: List[StepMetrics], indent: Optional[int] = None) -> str:
+    return json.dumps([m.dict() for m in metrics], indent=indent)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+_SUMMARIES = (
+    ("wall", "step_wall_seconds", "Wall time of the step executions"),
+    ("cpu", "step_cpu_seconds", "CPU time of the step executions"),
+    ("queue_wait", "step_queue_wait_seconds", "Time from submit to start"),
+)
+
+_COUNTERS = (
+    ("failed", "step_failures_total", "Failed step executions"),
+    ("cached", "step_cached_total", "Step executions taken from the cache"),
+    ("input_bytes", "step_input_bytes_total", "Bytes of the input assets"),
+    ("output_bytes", "step_output_bytes_total", "Bytes of the output assets"),
+)
+
+
+def to_prometheus(
+    metrics: List[StepMetrics],
+    prefix="dataexec",
+    labels: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Metrics in the text format of Prometheus, the measures are summaries
+    with a ``step`` label.
+
+    :param labels: added to every sample, like the name of the workflow.
+    """
+    labels = labels or {}
+    lines: List[str] = []
+    for attr, name, help_ in _SUMMARIES:
+        name = f"{prefix}_{name}"
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} summary")
+        for m in metrics:
+            summary: Summary = getattr(m, attr)
+            step = {**labels, "step": m.step_name}
+            for q in QUANTILES:
+                value = getattr(summary, f"p{int(q * 100)}")
+                lines.append(f"{name}{_labels({**step, 'quantile': str(q)})} {value}")
+            lines.append(f"{name}_sum{_labels(step)} {summary.sum}")
+            lines.append(f"{name}_count{_labels(step)} {m.count}")
+    for attr, name, help_ in _COUNTERS:
+        name = f"{prefix}_{name}"
+        lines.append(f"# HELP {name} {help_}")
+        lines.append(f"# TYPE {name} counter")
+        for m in metrics:
+            step = {**labels, "step": m.step_name}
+            lines.append(f"{name}{_labels(step)} {getattr(m, attr)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,184 @@
+"""
+Transport of asset payloads between processes using shared memory segments.
+Instead of pickling the payload of an asset through the pipe of the pool,
+it's copied into a segment and only the name of the segment travels.
+It's not zero-copy: the receiving side copies the payload out of the
+segment (and decodes it for str) before the segment is removed, so each
+payload is copied once on each side instead of being pickled and sent.
+It requires python >= 3.8.
+"""
+import copy
+from concurrent.futures import Future
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+from dataexec import types
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # the workers share the resource tracker of the parent, where segments
+    # are registered once no matter how many times they are attached
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedPayload:
+    """Reference to a payload stored in a shared memory segment"""
+
+    __slots__ = ("name", "size", "text", "synced")
+
+    def __init__(self, name: str, size: int, text: bool, synced: bool = False):
+        self.name = name
+        self.size = size
+        self.text = text
+        self.synced = synced
+
+    @classmethod
+    def put(
+        cls, payload: Union[str, bytes], synced=False
+    ) -> Tuple["SharedPayload", shared_memory.SharedMemory]:
+        text = isinstance(payload, str)
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[: len(data)] = data
+        return cls(shm.name, len(data), text, synced), shm
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """Map the segment and yield the payload as a memoryview"""
+        shm = _attach(self.name)
+        buf = shm.buf[: self.size]
+        try:
+            yield buf
+        finally:
+            buf.release()
+            shm.close()
+
+    def load(self) -> Union[str, bytes]:
+        with self.view() as buf:
+            if self.text:
+                return str(buf, "utf-8")
+            return bytes(buf)
+
+    def unlink(self):
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+def _walk(obj: Any, fn: Callable[[types.Asset], types.Asset]) -> Any:
+    """Apply fn to the assets found in obj, containers are rebuilt"""
+    if isinstance(obj, types.Asset):
+        return fn(obj)
+    if isinstance(obj, types.Output):
+        obj.assets = [_walk(a, fn) for a in obj.assets]
+        return obj
+    if isinstance(obj, list):
+        return [_walk(o, fn) for o in obj]
+    if isinstance(obj, tuple):
+        return tuple(_walk(o, fn) for o in obj)
+    if isinstance(obj, dict):
+        return {k: _walk(v, fn) for k, v in obj.items()}
+    return obj
+
+
+def _share(
+    min_size: int, segments: List[shared_memory.SharedMemory], clone: bool
+) -> Callable[[types.Asset], types.Asset]:
+    def share(asset: types.Asset) -> types.Asset:
+        raw = asset._raw
+        if not isinstance(raw, (str, bytes)) or len(raw) < min_size:
+            return asset
+        payload, shm = SharedPayload.put(raw, synced=asset.is_synced)
+        segments.append(shm)
+        shared = copy.copy(asset) if clone else asset
+        shared._raw = payload
+        shared._synced = None
+        return shared
+
+    return share
+
+
+def _materialize(unlink: bool) -> Callable[[types.Asset], types.Asset]:
+    def materialize(asset: types.Asset) -> types.Asset:
+        payload = asset._raw
+        if isinstance(payload, SharedPayload):
+            asset._raw = payload.load()
+            asset._synced = asset._raw if payload.synced else None
+            if unlink:
+                payload.unlink()
+        return asset
+
+    return materialize
+
+
+def share_args(
+    args: Tuple[Any, ...], kwargs: Dict[str, Any], min_size: int
+) -> Tuple[Tuple[Any, ...], Dict[str, Any], List[shared_memory.SharedMemory]]:
+    """
+    Replace the payloads of the assets given with shared segments,
+    assets are copied so the originals are not modified.
+    The caller owns the segments returned and must unlink them.
+    """
+    segments: List[shared_memory.SharedMemory] = []
+    share = _share(min_size, segments, clone=True)
+    return _walk(args, share), _walk(kwargs, share), segments
+
+
+def release_result(result: Any) -> Any:
+    """Load the payloads shared by the worker and remove their segments"""
+    return _walk(result, _materialize(unlink=True))
+
+
+def call(fn: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any], min_size: int):
+    """Executed in the worker: load the shared payloads, call fn and share
+    the payloads of its result, the parent removes those segments."""
+    materialize = _materialize(unlink=False)
+    result = fn(*_walk(args, materialize), **_walk(kwargs, materialize))
+    segments: List[shared_memory.SharedMemory] = []
+    result = _walk(result, _share(min_size, segments, clone=False))
+    for shm in segments:
+        shm.close()
+    return result
+
+
+def call_chunk(
+    fn: Callable, chunk: List[Tuple[Any, ...]], min_size: int
+) -> List[Tuple[bool, Any]]:
+    """Version of :func:`call` for a chunk of argument tuples, the errors
+    are returned with the results like ``executors._run_chunk`` does."""
+    results: List[Tuple[bool, Any]] = []
+    for args in chunk:
+        try:
+            results.append((True, call(fn, args, {}, min_size)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def _unlink_payload(asset: types.Asset) -> types.Asset:
+    if isinstance(asset._raw, SharedPayload):
+        asset._raw.unlink()
+    return asset
+
+
+def discard_result(future: Future):
+    """Remove the segments of a result that won't be read"""
+    if not future.done():
+        future.add_done_callback(discard_result)
+        return
+    if future.cancelled() or future.exception() is not None:
+        return
+    _walk(future.result(), _unlink_payload)
+
+
+def close_segments(segments: List[shared_memory.SharedMemory]):
+    for shm in segments:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
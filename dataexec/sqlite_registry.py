@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from dataexec import defaults, tracing, utils
+from dataexec.base import RegistrySpec, _init_asset_class
+from dataexec.types import Asset, AssetChange, AssetMetadata
+
+# protects recursive queries against cycles in derived_from
+_MAX_DEPTH = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    location TEXT NOT NULL,
+    derived_from TEXT,
+    build_by_task TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_kind_idx ON assets (kind);
+CREATE INDEX IF NOT EXISTS assets_derived_from_idx ON assets (derived_from);
+CREATE INDEX IF NOT EXISTS assets_build_by_task_idx ON assets (build_by_task);
+CREATE INDEX IF NOT EXISTS assets_created_at_idx ON assets (created_at);
+
+CREATE TABLE IF NOT EXISTS changes (
+    asset_id TEXT NOT NULL,
+    commit_hash TEXT NOT NULL,
+    msg TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_asset_id_idx ON changes (asset_id, created_at);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+class RegistrySQLite(RegistrySpec):
+    """
+    Registry persisted in a SQLite database using the WAL journal, so it can
+    be read by many processes while one of them writes.
+    Each thread (and each process) uses its own connection, for that reason
+    in-memory databases are not supported.
+    """
+
+    def __init__(self, path: str = defaults.SQLITE_REGISTRY_PATH, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        if self._local.depth > 0:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        self._local.depth = 1
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    @contextmanager
+    def batch(self) -> Iterator["RegistrySQLite"]:
+        """
+        Group many operations in one transaction
+
+        >>> with registry.batch():
+        ...     for asset in assets:
+        ...         registry.create_asset(asset, "first")
+        """
+        with self._transaction():
+            yield self
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _insert_change(self, conn: sqlite3.Connection, asset: Asset, msg: str):
+        change = AssetChange(commit=asset.get_hash(), msg=msg)
+        conn.execute(
+            "INSERT INTO changes (asset_id, commit_hash, msg, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (asset.id, change.commit, change.msg, change.created_at.isoformat()),
+        )
+
+    def _upsert_meta(self, conn: sqlite3.Connection, meta: AssetMetadata):
+        conn.execute(
+            "INSERT OR REPLACE INTO assets "
+            "(id, kind, location, derived_from, build_by_task, "
+            "created_at, updated_at, meta) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                meta.id,
+                meta.kind,
+                meta.location,
+                meta.derived_from,
+                meta.build_by_task,
+                meta.created_at.isoformat(),
+                meta.updated_at.isoformat(),
+                meta.json(),
+            ),
+        )
+
+    @tracing.traced()
+    def get_asset(self, id_: str) -> Asset:
+        row = self._conn().execute("SELECT meta FROM assets WHERE id = ?", (id_,))
+        found = row.fetchone()
+        if found is None:
+            raise KeyError(id_)
+        meta = AssetMetadata.parse_raw(found[0])
+        return _init_asset_class(self.kind_mapper[meta.kind], meta, lazy=True)
+
+    @tracing.traced()
+    def create_asset(self, asset: Asset, msg: str, write: bool = True):
+        if write:
+            asset.write()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM changes WHERE asset_id = ?", (asset.id,))
+            self._upsert_meta(conn, asset.meta)
+            self._insert_change(conn, asset, msg)
+
+    @tracing.traced()
+    def commit_asset(self, asset: Asset, msg: str, write: bool = True):
+        if write:
+            asset.write()
+        with self._transaction() as conn:
+            self._upsert_meta(conn, asset.meta)
+            self._insert_change(conn, asset, msg)
+
+    @tracing.traced()
+    def commit_assets(self, assets: Iterable[Asset], msg: str, write: bool = True):
+        """Commit many assets in one transaction"""
+        with self._transaction():
+            for asset in assets:
+                self.commit_asset(asset, msg, write=write)
+
+    @tracing.traced()
+    def delete_asset(self, id: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM assets WHERE id = ?", (id,))
+            conn.execute("DELETE FROM changes WHERE asset_id = ?", (id,))
+        return cursor.rowcount > 0
+
+    @tracing.traced()
+    def list_assets(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[AssetMetadata]:
+        # a range scan of the created_at index
+        since_ = utils.naive_utc(since).isoformat() if since else ""
+        query = "SELECT meta FROM assets WHERE created_at >= ?"
+        params = [since_]
+        if until:
+            query += " AND created_at < ?"
+            params.append(utils.naive_utc(until).isoformat())
+        rows = self._conn().execute(query + " ORDER BY created_at", params)
+        return [AssetMetadata.parse_raw(r[0]) for r in rows]
+
+    @tracing.traced()
+    def list_changes(self, asset_id: str) -> List[AssetChange]:
+        rows = self._conn().execute(
+            "SELECT commit_hash, msg, created_at FROM changes "
+            "WHERE asset_id = ? ORDER BY created_at, rowid",
+            (asset_id,),
+        )
+        return [
+            AssetChange(commit=c, msg=m, created_at=datetime.fromisoformat(d))
+            for c, m, d in rows
+        ]
+
+    @tracing.traced()
+    def create_task(self, task_id: str):
+        now = datetime.utcnow().isoformat()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO tasks (id, created_at, updated_at) VALUES (?, ?, ?)",
+                (task_id, now, now),
+            )
+
+    @tracing.traced()
+    def register_task(self, task_id: str):
+        """Record the task, if it already exists only its updated_at changes"""
+        now = datetime.utcnow().isoformat()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO tasks (id, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at",
+                (task_id, now, now),
+            )
+
+    @tracing.traced()
+    def ancestors(self, id_: str, depth: Optional[int] = None) -> List[AssetMetadata]:
+        rows = self._conn().execute(
+            """
+            WITH RECURSIVE lineage (id, depth) AS (
+                SELECT derived_from, 1 FROM assets WHERE id = :id
+                UNION ALL
+                SELECT a.derived_from, l.depth + 1 FROM assets a
+                JOIN lineage l ON a.id = l.id
+                WHERE a.derived_from IS NOT NULL
+                AND (:depth IS NULL OR l.depth < :depth)
+                AND l.depth < :max_depth
+            )
+            SELECT a.meta FROM lineage l JOIN assets a ON a.id = l.id
+            ORDER BY l.depth
+            """,
+            {"id": id_, "depth": depth, "max_depth": _MAX_DEPTH},
+        )
+        return [AssetMetadata.parse_raw(r[0]) for r in rows]
+
+    @tracing.traced()
+    def descendants(self, id_: str, depth: Optional[int] = None) -> List[AssetMetadata]:
+        rows = self._conn().execute(
+            """
+            WITH RECURSIVE lineage (id, depth) AS (
+                SELECT id, 1 FROM assets WHERE derived_from = :id
+                UNION ALL
+                SELECT a.id, l.depth + 1 FROM assets a
+                JOIN lineage l ON a.derived_from = l.id
+                WHERE (:depth IS NULL OR l.depth < :depth)
+                AND l.depth < :max_depth
+            )
+            SELECT a.meta FROM lineage l JOIN assets a ON a.id = l.id
+            ORDER BY l.depth
+            """,
+            {"id": id_, "depth": depth, "max_depth": _MAX_DEPTH},
+        )
+        return [AssetMetadata.parse_raw(r[0]) for r in rows]
+
+    @tracing.traced()
+    def produced_by(self, task_id: str) -> List[AssetMetadata]:
+        rows = self._conn().execute(
+            "SELECT meta FROM assets WHERE build_by_task = ? ORDER BY created_at",
+            (task_id,),
+        )
+        return [AssetMetadata.parse_raw(r[0]) for r in rows]
+
+    @tracing.traced()
+    def list_tasks(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        :param since: with ``until``, filter the tasks by the time in their
+        ids, it's a range scan of the primary key that only works with the
+        ULIDs of :func:`dataexec.utils.ulid`, like the ids of the executors.
+        """
+        if since is None and until is None:
+            rows = self._conn().execute("SELECT id FROM tasks ORDER BY created_at")
+        else:
+            rows = self._conn().execute(
+                "SELECT id FROM tasks WHERE id >= ? AND id < ? ORDER BY id",
+                utils.ulid_range(since, until),
+            )
+        return [r[0] for r in rows]
@@ -1,7 +1,166 @@
+import functools
+import inspect
+import threading
 import time
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, get_type_hints
 
-from dataexec import errors, types, utils
+from dataexec import errors, tracing, types, utils
+from dataexec.cache import DiskCache, StepCache, cache_key
+
+
+def _apply(func: Callable, param: str, kwargs: Dict[str, Any], asset: types.Asset):
+    result = func(**{param: asset}, **kwargs)
+    if inspect.isgenerator(result):
+        # generators can't be sent back from other processes
+        result = list(result)
+    return result
+
+
+async def _apply_async(
+    func: Callable, param: str, kwargs: Dict[str, Any], asset: types.Asset
+):
+    if inspect.iscoroutinefunction(func):
+        return await func(**{param: asset}, **kwargs)
+    return await utils.from_async2sync(func, **{param: asset}, **kwargs)
+
+
+def _asset_type(hint: Any) -> Tuple[Optional[type], bool]:
+    """
+    :return: the asset class of a type hint and if it's a list of them,
+    (None, False) if the hint is not an asset.
+    """
+    many = False
+    if getattr(hint, "__origin__", None) in (list, List):
+        args = getattr(hint, "__args__", ())
+        hint = args[0] if args else None
+        many = True
+    if isinstance(hint, type) and issubclass(hint, types.Asset):
+        return hint, many
+    return None, False
+
+
+def _traced(method: Callable) -> Callable:
+    """Run the execution of a step in a span named by the step"""
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(self: "Step", *args, **kwargs):
+            with tracing.span(f"step {self.alias}"):
+                return await method(self, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self: "Step", *args, **kwargs):
+        with tracing.span(f"step {self.alias}"):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class Timer:
+    """
+    Wall time (``perf_counter_ns``) and CPU time of the current thread
+    since the timer was created, until :meth:`stop` is called.
+    """
+
+    def __init__(self):
+        self.started_ns = time.time_ns()
+        self._wall = time.perf_counter_ns()
+        self._cpu = time.thread_time_ns()
+        self.wall_ns = 0
+        self.cpu_ns = 0
+
+    def stop(self) -> "Timer":
+        self.wall_ns = time.perf_counter_ns() - self._wall
+        self.cpu_ns = time.thread_time_ns() - self._cpu
+        return self
+
+    def fields(self) -> Dict[str, Any]:
+        """Fields of :class:`types.Output` filled by the timer"""
+        return dict(
+            elapsed=self.wall_ns / 1e9,
+            wall_ns=self.wall_ns,
+            cpu_ns=self.cpu_ns,
+            started_ns=self.started_ns,
+        )
+
+
+class InjectionPlan:
+    """
+    Params of a function resolved once from its signature: which params
+    receive assets (by type), which ones are required and what it returns.
+    The asset class of each param is looked up by the MRO of the assets
+    and memoized, so the injection of each run is a dict lookup per asset.
+    """
+
+    def __init__(self, func: Callable, name: str):
+        self.name = name
+        try:
+            hints = get_type_hints(func)
+        except Exception:
+            hints = dict(getattr(func, "__annotations__", {}))
+        self.assets: Dict[type, Tuple[str, bool]] = {}
+        self.required_assets: Dict[str, type] = {}
+        self.required: List[str] = []
+        self.params: List[str] = []
+        self.var_kwargs = False
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            signature = None
+        params = signature.parameters.values() if signature else []
+        for p in params:
+            if p.kind == p.VAR_KEYWORD:
+                self.var_kwargs = True
+                continue
+            if p.kind == p.VAR_POSITIONAL:
+                continue
+            self.params.append(p.name)
+            cls, many = _asset_type(hints.get(p.name))
+            if cls is not None:
+                if cls in self.assets:
+                    other = self.assets[cls][0]
+                    raise errors.StepInputMismatch(
+                        name,
+                        f"params {other} and {p.name} are both annotated as "
+                        f"{cls.__name__}, assets are injected by type",
+                    )
+                self.assets[cls] = (p.name, many)
+                if p.default is p.empty:
+                    self.required_assets[p.name] = cls
+            elif p.default is p.empty:
+                self.required.append(p.name)
+        self.returns, self.returns_many = _asset_type(hints.get("return"))
+        self._lookup: Dict[type, Optional[Tuple[str, bool]]] = {}
+
+    def lookup(self, asset_type: type) -> Optional[Tuple[str, bool]]:
+        if asset_type not in self._lookup:
+            target = None
+            for cls in asset_type.__mro__:
+                if cls in self.assets:
+                    target = self.assets[cls]
+                    break
+            self._lookup[asset_type] = target
+        return self._lookup[asset_type]
+
+    def inject(self, assets: List[types.Asset]) -> Dict[str, Any]:
+        to_inject: Dict[str, Any] = {}
+        for asset in assets:
+            target = self.lookup(type(asset))
+            if target is None:
+                continue
+            param, many = target
+            if many:
+                to_inject.setdefault(param, []).append(asset)
+            elif param in to_inject:
+                raise errors.StepInputMismatch(
+                    self.name,
+                    f"more than one asset for {param}, annotate it as a List",
+                )
+            else:
+                to_inject[param] = asset
+        return to_inject
 
 
 class Step:
@@ -12,41 +171,107 @@ class Step:
         params: Dict[str, Any] = {},
         step_id=None,
         is_async=False,
-        from_step=None,
+        from_step: Union[str, List[str], None] = None,
         raise_on_error=True,
+        timeout: Optional[float] = None,
+        cache: Union[StepCache, str, None] = None,
+        fan_out=False,
+        chunksize=1,
     ):
+        """
+        :param fan_out: the function is applied to each asset of the
+        upstream output in parallel using the executor of the workflow,
+        the results are gathered in one output.
+        :param chunksize: assets sent together to a worker in fan-out mode.
+        """
         self.alias = alias or func.__name__
         self.func = func
-        self.id = step_id or utils.secure_random_str()
+        self.id = step_id or utils.ulid()
         self.params = params
         self.execid: str = ""
-        self._elapsed = 0
+        self._elapsed = 0.0
         self.is_async = is_async
         self._from_step = from_step
         self._raise = raise_on_error
+        self.timeout = timeout
+        self.cache = DiskCache(cache) if isinstance(cache, str) else cache
+        self.fan_out = fan_out
+        self.chunksize = chunksize
+        self.plan = InjectionPlan(func, self.alias)
         self._call_count = 0
+        self._lock = threading.Lock()
         self._output: types.Output = self._generate_output(
             [], status=types.ExecStatus.created
         )
 
     @property
-    def previous(self) -> Optional["Step"]:
+    def is_generator(self) -> bool:
+        return inspect.isgeneratorfunction(self.func)
+
+    def __getstate__(self):
+        # the last output is not needed to run the step in another process
+        state = self.__dict__.copy()
+        state["_output"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _start(self) -> str:
+        """
+        Count a new execution and return its id. Many runs of a workflow
+        can execute the step at the same time, each one keeps its id in
+        the output, :attr:`execid` is only the last one.
+        """
+        execid = utils.ulid()
+        with self._lock:
+            self._call_count += 1
+            self.execid = execid
+        return execid
+
+    @property
+    def previous(self) -> Union[str, List[str], None]:
         return self._from_step
 
+    @property
+    def upstream(self) -> List[str]:
+        """Names of the steps which this step depends on"""
+        if not self._from_step:
+            return []
+        if isinstance(self._from_step, str):
+            return [self._from_step]
+        return list(self._from_step)
+
     def result(self) -> types.Output:
         return self._output
 
-    def set_previous(self, step_id: str):
+    def set_previous(self, step_id: Union[str, List[str], None]):
         self._from_step = step_id
 
-    def _call_exception(self, e: Exception) -> types.Output:
+    def _call_exception(
+        self, e: Exception, execid=None, timer: Optional[Timer] = None
+    ) -> types.Output:
         if self._raise:
             raise errors.StepExecutionError(self.alias) from e
-        return self._generate_output([], status=types.ExecStatus.failed, e=e)
+        return self._generate_output(
+            [], status=types.ExecStatus.failed, e=e, execid=execid, timer=timer
+        )
 
     def _generate_output(
-        self, result: Any, status=types.ExecStatus.done, e=None
+        self,
+        result: Any,
+        status=types.ExecStatus.done,
+        e=None,
+        execid=None,
+        timer: Optional[Timer] = None,
     ) -> types.Output:
+        """
+        :param execid: id of the execution, the step can be executed by many
+        runs of a workflow at the same time so :attr:`execid` is only the last one.
+        :param timer: stopped timer of the execution.
+        """
         _assets = []
         if result:
             if isinstance(result, list):
@@ -57,63 +282,170 @@ class Step:
                 if isinstance(result, types.Asset):
                     _assets.append(result)
 
+        timing: Dict[str, Any] = {"elapsed": self._elapsed}
+        if timer is not None:
+            timing = timer.fields()
+            self._elapsed = timer.wall_ns / 1e9
         self._output = types.Output(
             status=status,
             current_step_id=self.id,
             current_step_name=self.alias,
-            elapsed=self._elapsed,
+            **timing,
             from_step=self._from_step,
+            execid=execid or self.execid,
             assets=_assets,
             error=e,
         )
         return self._output
 
+    def _from_cache(self, args, kwargs) -> Tuple[Optional[str], Optional[types.Output]]:
+        """
+        :return: the key of the call if the step has a cache,
+        and the output stored for that key if any.
+        """
+        if self.cache is None:
+            return None, None
+        key = cache_key(self.func, args, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            cached = cached.copy(update={"cached": True})
+        return key, cached
+
+    def _to_cache(self, key: Optional[str], output: types.Output):
+        if self.cache is not None and key is not None:
+            if output.status == types.ExecStatus.done:
+                self.cache.set(key, output)
+
+    def _asset_param(self) -> str:
+        for param, many in self.plan.assets.values():
+            if not many:
+                return param
+        raise errors.StepInputMismatch(self.alias, "no param annotated as Asset")
+
+    def _gather(self, results: List[Any]) -> List[Any]:
+        gathered: List[Any] = []
+        for r in results:
+            if inspect.isgenerator(r):
+                r = list(r)
+            gathered.extend(r if isinstance(r, list) else [r])
+        return gathered
+
+    @_traced
+    def map(self, executor, assets: List[types.Asset], **kwargs) -> types.Output:
+        """
+        Fan-out: apply the function to each asset using ``executor.map``
+        and gather the results in one output.
+        """
+        execid = None
+        timer = Timer()
+        try:
+            execid = self._start()
+            fn = functools.partial(
+                _apply, self.func, self._asset_param(), {**self.params, **kwargs}
+            )
+            tasks = executor.map(fn, assets, chunksize=self.chunksize, ordered=True)
+            result = self._gather([t.result() for t in tasks])
+            output = self._generate_output(result, execid=execid, timer=timer.stop())
+        except Exception as e:
+            output = self._call_exception(e, execid, timer.stop())
+
+        self._output = output
+        return output
+
+    @_traced
+    async def map_async(
+        self, executor, assets: List[types.Asset], **kwargs
+    ) -> types.Output:
+        """Same as :meth:`map` but using an :class:`AIOExecutor`"""
+        execid = None
+        timer = Timer()
+        try:
+            execid = self._start()
+            fn = functools.partial(
+                _apply_async, self.func, self._asset_param(), {**self.params, **kwargs}
+            )
+            results = []
+            async for task in executor.map(fn, assets, ordered=True):
+                results.append(await task.result(self.timeout))
+            output = self._generate_output(
+                self._gather(results), execid=execid, timer=timer.stop()
+            )
+        except Exception as e:
+            output = self._call_exception(e, execid, timer.stop())
+
+        self._output = output
+        return output
+
+    async def _call_async(self, *args, **kwargs):
+        if inspect.iscoroutinefunction(self.func):
+            return await self.func(*args, **kwargs)
+        return await utils.from_async2sync(self.func, *args, **kwargs)
+
+    @_traced
     async def run_async(self, *args, **kwargs):
+        """
+        Coroutine functions are awaited, regular functions are executed in
+        the default executor of the running loop. The CPU time of the output
+        is the one of the loop's thread, so it includes other tasks of the loop.
+        """
+        key, execid = None, None
+        timer = Timer()
         try:
-            _started = time.time()
-            self._call_count += 1
-            self.execid = utils.secure_random_str()
+            execid = self._start()
             if not kwargs and self.params:
-                result = await self.func(*args, **self.params)
-            else:
-                result = await self.func(*args, **kwargs)
-            self._elapsed = int(_started - time.time())
+                kwargs = self.params
+            key, cached = self._from_cache(args, kwargs)
+            if cached is not None:
+                timing = timer.stop().fields()
+                output = cached.copy(update={"execid": execid, **timing})
+                self._output = output
+                return output
+            result = await self._call_async(*args, **kwargs)
+            if inspect.isgenerator(result):
+                result = list(result)
+            timer.stop()
             if not isinstance(result, list):
-                output = self._generate_output([result])
-            else:
-                output = self._generate_output(result)
+                result = [result]
+            output = self._generate_output(result, execid=execid, timer=timer)
 
             if not output.assets:
                 raise errors.StepWithoutResult(self.id, self.alias)
         except Exception as e:
-            self._elapsed = int(_started - time.time())
-            output = self._call_exception(e)
+            output = self._call_exception(e, execid, timer.stop())
 
         self._output = output
+        self._to_cache(key, output)
 
-        return result
+        return output
 
+    @_traced
     def __call__(self, *args, **kwargs):
+        key, execid = None, None
+        timer = Timer()
         try:
-            _started = time.time()
-            self._call_count += 1
-            self.execid = utils.secure_random_str()
+            execid = self._start()
             if not kwargs and self.params:
-                result = self.func(*args, **self.params)
-            else:
-                result = self.func(*args, **kwargs)
-            self._elapsed = int(_started - time.time())
+                kwargs = self.params
+            key, cached = self._from_cache(args, kwargs)
+            if cached is not None:
+                timing = timer.stop().fields()
+                output = cached.copy(update={"execid": execid, **timing})
+                self._output = output
+                return output
+            result = self.func(*args, **kwargs)
+            if inspect.isgenerator(result):
+                result = list(result)
+            timer.stop()
             if not isinstance(result, list):
-                output = self._generate_output([result])
-            else:
-                output = self._generate_output(result)
+                result = [result]
+            output = self._generate_output(result, execid=execid, timer=timer)
 
             # if not output.assets:
             #    raise errors.StepWithoutResult(self.id, self.alias)
         except Exception as e:
-            self._elapsed = int(_started - time.time())
-            output = self._call_exception(e)
+            output = self._call_exception(e, execid, timer.stop())
 
         self._output = output
+        self._to_cache(key, output)
 
-        return result
+        return output
@@ -0,0 +1,360 @@
+"""
+Spans of the executions of workflows, steps, executors, assets and
+registries. Nothing is recorded until an exporter is added::
+
+    exporter = ChromeTraceExporter("trace.json")
+    tracing.add_exporter(exporter)
+
+The current span is kept in a context variable, so spans are nested by
+thread and by asyncio task. Functions submitted to a pool executor carry
+the span that submitted them, the spans of the workers are linked to it.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# get_native_id is available since python 3.8
+_thread_id = getattr(threading, "get_native_id", threading.get_ident)
+
+
+class SpanContext:
+    """Identity of a span, it's what is sent to other processes"""
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "_perf",
+        "pid",
+        "tid",
+        "attrs",
+        "linked_from",
+        "links_out",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional[SpanContext] = None,
+        attrs: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.parent_id = parent.span_id if parent else None
+        # epoch, to compare spans of different processes
+        self.start_ns = time.time_ns()
+        self._perf = time.perf_counter_ns()
+        self.end_ns = self.start_ns
+        self.pid = os.getpid()
+        self.tid = _thread_id()
+        self.attrs = attrs or {}
+        # span of another thread or process which submitted this one
+        self.linked_from: Optional[str] = None
+        self.links_out = False
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self):
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._perf
+
+
+class SpanExporter(ABC):
+    # it can be sent to worker processes, spans are exported from there
+    process_safe = False
+
+    @abstractmethod
+    def export(self, span: Span):
+        pass
+
+    def close(self):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Spans of the current process kept in a list, useful for tests"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def find(self, name: str) -> List[Span]:
+        with self._lock:
+            return [s for s in self.spans if s.name == name]
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class ChromeTraceExporter(SpanExporter):
+    """
+    Spans written as complete events of the Chrome trace-event format,
+    it can be loaded in chrome://tracing or Perfetto.
+
+    The file is a JSON array left open (the format allows it): each span
+    is appended in a single write with ``O_APPEND``, so worker processes
+    can write to the same file without locks. Spans submitted to another
+    thread or process are linked with flow events.
+    """
+
+    process_safe = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._threads: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return
+        try:
+            os.write(fd, b"[\n")
+        finally:
+            os.close(fd)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._fd = None
+        self._pid = None
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def _get_fd(self) -> int:
+        # forked workers open their own descriptor
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            self._pid = os.getpid()
+            self._threads = set()
+        return self._fd
+
+    def _events(self, span: Span) -> List[Dict[str, Any]]:
+        base = {"pid": span.pid, "tid": span.tid, "cat": "dataexec"}
+        ts = span.start_ns / 1000
+        args = {"span_id": span.span_id, "trace_id": span.trace_id}
+        if span.parent_id:
+            args["parent_id"] = span.parent_id
+        args.update({k: str(v) for k, v in span.attrs.items()})
+        events = [
+            {
+                **base,
+                "name": span.name,
+                "ph": "X",
+                "ts": ts,
+                "dur": span.duration_ns / 1000,
+                "args": args,
+            }
+        ]
+        if span.links_out:
+            events.append(
+                {**base, "name": "task", "ph": "s", "id": span.span_id, "ts": ts}
+            )
+        if span.linked_from:
+            events.append(
+                {
+                    **base,
+                    "name": "task",
+                    "ph": "f",
+                    "bp": "e",
+                    "id": span.linked_from,
+                    "ts": ts,
+                }
+            )
+        return events
+
+    def export(self, span: Span):
+        events = self._events(span)
+        with self._lock:
+            fd = self._get_fd()
+            if (span.pid, span.tid) not in self._threads:
+                self._threads.add((span.pid, span.tid))
+                events.insert(
+                    0,
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": span.pid,
+                        "tid": span.tid,
+                        "args": {"name": threading.current_thread().name},
+                    },
+                )
+            data = "".join(json.dumps(e) + ",\n" for e in events)
+            os.write(fd, data.encode())
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
+
+    @staticmethod
+    def read(path: str) -> List[Dict[str, Any]]:
+        """Events of a trace file written by the exporter"""
+        with open(path) as f:
+            content = f.read().rstrip().rstrip(",")
+        if not content.endswith("]"):
+            content += "]"
+        return json.loads(content)
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "dataexec_span", default=None
+)
+_exporters: List[SpanExporter] = []
+
+
+def add_exporter(exporter: SpanExporter):
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter: SpanExporter):
+    if exporter in _exporters:
+        _exporters.remove(exporter)
+    exporter.close()
+
+
+def enabled() -> bool:
+    return bool(_exporters)
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attrs):
+    """Add attributes to the current span if any"""
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def _export(span: Span):
+    for exporter in list(_exporters):
+        exporter.export(span)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    A child of the current span, it's None when tracing is disabled.
+    """
+    if not _exporters:
+        yield None
+        return
+    parent = _current.get()
+    s = Span(name, parent.context() if parent else None, attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+        _export(s)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator to run a function in a span named as the function
+    if ``name`` is not provided.
+    """
+
+    def decorator(func: Callable):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _exporters:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _Propagated:
+    """
+    Function submitted to a pool with the span that submitted it,
+    it runs in a span linked to that one in the thread or process
+    of the worker.
+    """
+
+    def __init__(self, fn: Callable, parent: SpanContext):
+        self.fn = fn
+        self.parent = parent
+        self.exporters = [e for e in _exporters if e.process_safe]
+
+    def __call__(self, *args, **kwargs):
+        if not _exporters:
+            # a process started without the exporters of its parent
+            _exporters.extend(self.exporters)
+        name = getattr(self.fn, "__qualname__", type(self.fn).__name__)
+        s = Span(f"run {name}", self.parent)
+        s.linked_from = self.parent.span_id
+        token = _current.set(s)
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            s.end()
+            _export(s)
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Wrap a function before sending it to another thread or process,
+    so its spans are linked to the current one.
+    """
+    parent = _current.get()
+    if not _exporters or parent is None:
+        return fn
+    parent.links_out = True
+    return _Propagated(fn, parent.context())
@@ -1,9 +1,25 @@
+import copy
+import os
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Generic, List, Optional, TypeVar, NewType, Union
+from typing import (
+    IO,
+    Any,
+    ContextManager,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    NewType,
+    Union,
+)
 
 from pydantic import BaseModel, Field
 
+from dataexec import defaults
+
 AssetT = TypeVar("AssetT")
 
 
@@ -28,15 +44,24 @@ class AssetMetadata(BaseModel):
 
 class Asset(Generic[AssetT]):
     kind: str
+    hash_algorithm: str = defaults.HASH_ALGORITHM
 
     def __init__(
         self,
         *,
-        raw: AssetT,
+        raw: Optional[AssetT] = None,
         meta: AssetMetadata,
     ):
+        """
+        :param raw: payload of the asset, if it's None it will be read
+        from the location of the asset on the first access to :attr:`raw`
+        """
         self.meta = meta
         self._raw = raw
+        # payload known to be equal to the content of the location
+        self._synced: Optional[AssetT] = None
+        # asset from which the payload is loaded, shared by its copies
+        self._origin: Optional["Asset"] = None
 
     @property
     def id(self) -> str:
@@ -47,28 +72,97 @@ class Asset(Generic[AssetT]):
         return self.meta.location
 
     @classmethod
-    def from_meta(cls, meta: AssetMetadata) -> "Asset":
-        raw = cls.open(meta.location)
+    def from_meta(cls, meta: AssetMetadata, lazy=False) -> "Asset":
+        raw = None if lazy else cls.open(meta.location)
         obj = cls(raw=raw, meta=meta)
+        obj._synced = raw
         return obj
 
     @classmethod
     def from_location(
-        cls, location, id_=None, author=None, derived_from=None
+        cls, location, id_=None, author=None, derived_from=None, lazy=False
     ) -> "Asset":
         raise NotImplementedError()
 
-    def copy(self, location, new_id=None) -> str:
+    def copy(
+        self, location: str, new_id=None, strategy: str = defaults.COPY_STRATEGY
+    ) -> str:
         raise NotImplementedError()
 
     @property
     def raw(self) -> AssetT:
+        if self._raw is None:
+            origin = self._origin
+            if origin is not None and origin.is_synced:
+                self._raw = origin.raw
+            else:
+                self._raw = self.open(self.location)
+            self._synced = self._raw
         return self._raw
 
+    @raw.setter
+    def raw(self, value: AssetT):
+        self._raw = value
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._raw is not None
+
+    @property
+    def is_synced(self) -> bool:
+        """
+        True if the payload wasn't replaced since it was read or written,
+        in that case the content of the location can be used instead of it.
+        """
+        return self._raw is None or self._raw is self._synced
+
+    def size(self) -> int:
+        """
+        Bytes of the asset, taken from its location when the payload
+        wasn't replaced, 0 if they can't be known.
+        """
+        if self.is_synced and os.path.isfile(self.location):
+            return os.path.getsize(self.location)
+        if isinstance(self._raw, bytes):
+            return len(self._raw)
+        if isinstance(self._raw, str):
+            return len(self._raw.encode())
+        return 0
+
+    def unload(self):
+        """Drop the payload from memory, it will be read again on demand"""
+        self._raw = None
+        self._synced = None
+
+    def detached(self) -> "Asset":
+        """
+        A copy with its own metadata that can be modified without
+        affecting this asset. The payload is loaded once, by this asset,
+        and shared while neither of them replaces it.
+        """
+        obj = copy.copy(self)
+        obj.meta = self.meta.copy(deep=True)
+        obj._origin = self
+        return obj
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_origin"] = None
+        return state
+
     @staticmethod
     def open(location: str) -> AssetT:
         raise NotImplementedError()
 
+    def iter_chunks(self, size: int = defaults.CHUNK_SIZE) -> Iterator[AssetT]:
+        raise NotImplementedError()
+
+    def iter_lines(self) -> Iterator[AssetT]:
+        raise NotImplementedError()
+
+    def writer(self) -> ContextManager[IO]:
+        raise NotImplementedError()
+
     def write(self) -> bool:
         raise NotImplementedError()
 
@@ -100,10 +194,20 @@ class Output(BaseModel):
     status: str
     current_step_id: str
     current_step_name: str
-    elapsed: int
-    from_step: Optional[str] = None
+    # seconds
+    elapsed: float
+    wall_ns: int = 0
+    cpu_ns: int = 0
+    # epoch of the start in ns, comparable between processes
+    started_ns: int = 0
+    from_step: Union[str, List[str], None] = None
+    execid: Optional[str] = None
     assets: List[Asset] = Field(default_factory=list)
     error: Optional[Exception] = None
+    cached: bool = False
+    skipped: bool = False
+    # execid of the output reused by a skipped step
+    source_execid: Optional[str] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -149,12 +253,45 @@ class ExecStatus(str, Enum):
     done = "DONE"
 
 
+class StepInputs(BaseModel):
+    """Inputs of a step execution, assets are identified by their hash"""
+
+    signature: str
+    assets: Dict[str, str] = Field(default_factory=dict)
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class OutputAsset(BaseModel):
+    """Asset of an output recorded in the exec log, to build it again"""
+
+    # full path of the class of the asset
+    cls: str
+    meta: AssetMetadata
+
+    @classmethod
+    def from_asset(cls, asset: Asset) -> "OutputAsset":
+        kind = type(asset)
+        return cls(cls=f"{kind.__module__}.{kind.__qualname__}", meta=asset.meta)
+
+
 class ExecLog(BaseModel):
     step_name: str
     step_execid: str
     wf_exec_id: Optional[str] = None
     status: str = ExecStatus.created
     error: Optional[Exception] = None
+    cached: bool = False
+    skipped: bool = False
+    source_execid: Optional[str] = None
+    inputs: Optional[StepInputs] = None
+    # assets of the output, recorded in incremental mode
+    output_assets: List[OutputAsset] = Field(default_factory=list)
+    wall_ns: int = 0
+    cpu_ns: int = 0
+    # from the submit of the step to the start of its execution
+    queue_wait_ns: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -164,9 +301,11 @@ class ExecLog(BaseModel):
 
 class WorkflowExecLog(BaseModel):
     wf_exec_id: Optional[str] = None
+    wf_id: Optional[str] = None
     status: str = ExecStatus.created
     error: Optional[Exception] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
 
     class Config:
         use_enum_values = True
@@ -1,10 +1,20 @@
-import asyncio
+import functools
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from importlib import import_module
 import hashlib
 import random
 import string
 import secrets
 import inspect
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from dataexec import defaults
 
 _letters = string.ascii_lowercase
 
@@ -13,15 +23,288 @@ def basic_random(lenght=10) -> str:
     return "".join(random.choice(_letters) for i in range(lenght))
 
 
-def basic_hash(txt: str) -> str:
-    _hash = hashlib.md5(txt.encode())
+def basic_hash(txt: str, algorithm: str = "md5") -> str:
+    _hash = hashlib.new(algorithm, txt.encode())
     return _hash.hexdigest()
 
 
+class HashMemo:
+    """
+    Bounded memo of file hashes, a file is identified by its path, size and
+    modification time so a change in any of them forces a new hash.
+    """
+
+    def __init__(self, maxsize: int = defaults.HASH_MEMO_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        location: str, algorithm: str, text: bool = False
+    ) -> Tuple[str, int, int, str, bool]:
+        stat = os.stat(location)
+        path = os.path.abspath(location)
+        return (path, stat.st_size, stat.st_mtime_ns, algorithm, text)
+
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            digest = self._data.get(key)
+            if digest is not None:
+                self._data.move_to_end(key)
+            return digest
+
+    def set(self, key: Tuple, digest: str):
+        with self._lock:
+            self._data[key] = digest
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+hash_memo = HashMemo()
+
+
+def file_hash(
+    location: str,
+    algorithm: str = defaults.HASH_ALGORITHM,
+    chunk_size: int = defaults.CHUNK_SIZE,
+    text: bool = False,
+) -> str:
+    """
+    Hash a file reading it in chunks, the result is memoized by
+    (location, size, mtime_ns) so unchanged files are not read again.
+
+    :param text: hash the text read with universal newlines and encoded
+    as utf-8, like ``basic_hash`` of the content read in text mode.
+    """
+    key = hash_memo.key(location, algorithm, text)
+    digest = hash_memo.get(key)
+    if digest is None:
+        _hash = hashlib.new(algorithm)
+        if text:
+            with open(location, "r", encoding="utf-8") as ft:
+                for txt in iter(functools.partial(ft.read, chunk_size), ""):
+                    _hash.update(txt.encode("utf-8"))
+        else:
+            with open(location, "rb") as f:
+                for chunk in iter(functools.partial(f.read, chunk_size), b""):
+                    _hash.update(chunk)
+        digest = _hash.hexdigest()
+        hash_memo.set(key, digest)
+    return digest
+
+
+_FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+
+def _copy_file_range(src: str, dst: str):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                # the source was truncated or the call isn't supported here
+                raise OSError(f"copy_file_range stopped with {remaining} bytes left")
+            remaining -= copied
+
+
+def _sendfile(src: str, dst: str):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        while remaining > 0:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, remaining)
+            if sent == 0:
+                raise OSError(f"sendfile stopped with {remaining} bytes left")
+            offset += sent
+            remaining -= sent
+
+
+def _buffered(src: str, dst: str):
+    shutil.copyfile(src, dst)
+
+
+_COPY_STRATEGIES: Dict[str, Callable[[str, str], None]] = {
+    "hardlink": os.link,
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _sendfile,
+    "buffered": _buffered,
+}
+_AUTO_STRATEGIES = ["reflink", "copy_file_range", "sendfile", "buffered"]
+
+
+def copy_file(src: str, dst: str, strategy: str = defaults.COPY_STRATEGY) -> str:
+    """
+    Copy a file trying the strategy given, if it's not supported by the
+    platform or the filesystem it fallbacks to a buffered copy.
+    The destination is replaced atomically.
+
+    :param strategy: one of hardlink, reflink, copy_file_range, sendfile,
+    buffered or auto. auto tries reflink, copy_file_range and sendfile
+    before the buffered copy. hardlink shares the data with the source
+    so it should be used only with assets written atomically.
+    :return: the strategy used
+    """
+    if strategy == "auto":
+        strategies = _AUTO_STRATEGIES
+    elif strategy in _COPY_STRATEGIES:
+        strategies = [strategy, "buffered"]
+    else:
+        raise ValueError(f"Unknown copy strategy {strategy}")
+
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    for name in strategies:
+        try:
+            _COPY_STRATEGIES[name](src, tmp)
+        except (OSError, AttributeError, ImportError):
+            # not supported: remove partial copies and try the next one
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            continue
+        os.replace(tmp, dst)
+        return name
+    raise OSError(f"{src} couldn't be copied to {dst}")
+
+
+@contextmanager
+def atomic_open(location: str, mode="w", encoding: Optional[str] = "utf-8"):
+    """
+    Open a temporary file next to location and replace location with it
+    when it's closed without errors. Other links to the old file
+    (hardlinked copies) are not modified.
+    """
+    tmp = f"{location}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp, location)
+    finally:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+
+
 def secure_random_str(size=12) -> str:
     return secrets.token_urlsafe(size)
 
 
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# two base32 chars for each 10 bits, it halves the loop of the encoding
+_PAIRS = [a + b for a in _CROCKFORD for b in _CROCKFORD]
+_ULID_RANDOM_BITS = 80
+
+
+def _base32(value: int, pairs: int) -> str:
+    chars = []
+    for _ in range(pairs):
+        chars.append(_PAIRS[value & 0x3FF])
+        value >>= 10
+    return "".join(reversed(chars))
+
+
+def encode_ulid(ms: int, randomness: int) -> str:
+    return _base32(ms, 5) + _base32(randomness, 8)
+
+
+class ULIDGenerator:
+    """
+    ULIDs: 26 chars of Crockford's base32 with the milliseconds since the
+    epoch in the first 48 bits and 80 random bits, so they sort by time of
+    creation. IDs of the same millisecond increment the random part of the
+    previous one to keep them monotonic. The random bytes are read from the
+    OS ``buffer_size`` IDs at a time.
+    """
+
+    def __init__(self, buffer_size: int = defaults.ULID_ENTROPY_BUFFER):
+        self.buffer_size = buffer_size
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # a forked child would repeat the entropy of its parent
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._entropy = b""
+        self._pos = 0
+        self._last_ms = -1
+        self._last_random = 0
+        self._prefix = ""
+
+    def _random(self) -> int:
+        if self._pos >= len(self._entropy):
+            self._entropy = os.urandom(10 * self.buffer_size)
+            self._pos = 0
+        chunk = self._entropy[self._pos : self._pos + 10]
+        self._pos += 10
+        return int.from_bytes(chunk, "big")
+
+    def __call__(self) -> str:
+        with self._lock:
+            ms = time.time_ns() // 1_000_000
+            if ms > self._last_ms:
+                randomness = self._random()
+            else:
+                # same millisecond or the clock went back
+                ms = self._last_ms
+                randomness = self._last_random + 1
+                if randomness >> _ULID_RANDOM_BITS:
+                    ms += 1
+                    randomness = self._random()
+            if ms != self._last_ms:
+                self._prefix = _base32(ms, 5)
+            self._last_ms, self._last_random = ms, randomness
+            return self._prefix + _base32(randomness, 8)
+
+
+ulid = ULIDGenerator()
+
+
+def naive_utc(dt: datetime) -> datetime:
+    """
+    Datetime comparable with the ones of the registries and the logs,
+    naive datetimes are already utc like the ones of ``datetime.utcnow``.
+    """
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _epoch_ms(dt: datetime) -> int:
+    return int(naive_utc(dt).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def ulid_time(id_: str) -> datetime:
+    """Creation time of a ULID, as a naive utc datetime"""
+    ms = 0
+    for char in id_[:10].upper():
+        ms = ms * 32 + _CROCKFORD.index(char)
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).replace(tzinfo=None)
+
+
+def ulid_range(
+    since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> Tuple[str, str]:
+    """
+    Bounds of the ULIDs created from ``since`` (included) to ``until``
+    (excluded), to compare them as strings.
+    """
+    low = encode_ulid(_epoch_ms(since), 0) if since else "0" * 26
+    high = encode_ulid(_epoch_ms(until), 0) if until else "Z" * 26
+    return low, high
+
+
 def get_class(fullclass_path):
     """get a class or object from a module. The fullclass_path should be passed as:
     package.my_module.MyClass
@@ -34,13 +317,17 @@ def get_class(fullclass_path):
 
 async def from_async2sync(func, *args, **kwargs):
     """Run sync functions from async code"""
+    import asyncio
+
     loop = asyncio.get_running_loop()
-    rsp = await loop.run_in_executor(None, func, *args, **kwargs)
+    rsp = await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
     return rsp
 
 
 def from_sync2async(func, *args, **kwargs):
     """run async functions from sync code"""
+    import asyncio
+
     loop = asyncio.get_event_loop()
     rsp = loop.run_until_complete(func(*args, **kwargs))
     return rsp
@@ -49,6 +336,8 @@ def from_sync2async(func, *args, **kwargs):
 def async_wrapper(func, *args, **kwargs):
     coro = inspect.iscoroutinefunction(func)
     if coro:
+        import asyncio
+
         loop = asyncio.get_event_loop()
         rsp = loop.run_until_complete(func(*args, **kwargs))
     else:
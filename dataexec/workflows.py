@@ -1,13 +1,46 @@
+import asyncio
+import contextvars
+import queue
+import threading
+import time
 from abc import ABC, abstractmethod
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional, cast
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
 
-from tqdm.auto import trange
-
-from dataexec import errors, types, utils
-from dataexec.steps import Step
-from dataexec.executors import IExecutor, LocalDev, TaskBase
+from dataexec import defaults, errors, tracing, types, utils
+from dataexec.base import RegistrySpec, _init_asset_class
+from dataexec.cache import cache_key
+from dataexec.execlog import ExecLogStore, RingBufferStore
+from dataexec.metrics import StepMetrics, collect
+from dataexec.steps import Step, Timer
+from dataexec.executors import (
+    AIOExecutor,
+    AIOTask,
+    AIOTaskBase,
+    AsyncLocal,
+    IExecutor,
+    LocalDev,
+    LocalTask,
+    LocalThreads,
+    TaskBase,
+    ThreadsConfig,
+    wait_first,
+)
 
 
 class IWorkflow(ABC):
@@ -21,7 +54,41 @@ class LocalExecutor:
         return wf.run()
 
 
-class WorkflowBase(IWorkflow):
+class _NoProgress:
+    """Stands for tqdm when the progress bar is disabled"""
+
+    def __enter__(self) -> "_NoProgress":
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def update(self, n: int = 1):
+        pass
+
+
+class RunContext:
+    """
+    State of one execution of a workflow. The steps are shared by all the
+    executions, what belongs to a single one is kept here so many
+    executions can run at the same time.
+    """
+
+    def __init__(self):
+        self.wf_exec_id = utils.ulid()
+        # inputs of the steps submitted and not registered yet
+        self.pending_inputs: Dict[str, types.StepInputs] = {}
+        # time of the submit and bytes of the input assets of each step
+        self.submits: Dict[str, Tuple[int, int]] = {}
+        self.outputs: Dict[str, types.Output] = {}
+
+
+class _WorkflowCore(IWorkflow):
+    """
+    Steps, exec log and incremental state shared by the workflows which
+    submit their steps to an :class:`IExecutor` and the async ones.
+    """
+
     def __init__(
         self,
         registry={},
@@ -29,8 +96,18 @@ class WorkflowBase(IWorkflow):
         disable_tqdm=False,
         wf_id=None,
         wf_alias="sequence",
-        executor: IExecutor = LocalDev(),
+        incremental=False,
+        log_store: Optional[ExecLogStore] = None,
     ):
+        """
+        :param incremental: record the inputs of each step in the exec log and
+        skip the steps whose input assets and params didn't change since
+        their last successful execution, reusing their last output. The
+        last execution is read from the exec log, so with a persistent
+        ``log_store`` it survives restarts and new instances.
+        :param log_store: where the executions of the steps and of the
+        workflow are recorded, by default a :class:`RingBufferStore`.
+        """
         self.registry = registry
         self.wf_id = wf_id or utils.basic_random()
         self.wf_alias = wf_alias
@@ -38,13 +115,22 @@ class WorkflowBase(IWorkflow):
         if steps:
             for s in steps:
                 self.steps[s.alias] = s
+            self.compile()
         # self.errors = []
         # self.assets = []
-        self.exec_log: List[types.ExecLog] = []
-        self._current_wf_id = utils.secure_random_str()
-        self.wf_executions: List[str] = []
+        self.exec_log: ExecLogStore = (
+            log_store if log_store is not None else RingBufferStore()
+        )
+        # used by the steps called outside of run, like the ones of step()
+        self._default_run = RunContext()
+        self._current_wf_id = self._default_run.wf_exec_id
+        # ids of the last runs
+        self.wf_executions: Deque[str] = deque(maxlen=defaults.WF_EXECUTIONS_SIZE)
         self._disable_tqdm = disable_tqdm
-        self.executor = executor
+        self.incremental = incremental
+        # last successful inputs and output of each step, read from the
+        # exec log the first time they are needed
+        self._last_inputs: Dict[str, Tuple[types.StepInputs, types.Output]] = {}
 
     def _get_step(self, name: str) -> Step:
         return self.steps[name]
@@ -52,32 +138,395 @@ class WorkflowBase(IWorkflow):
     def _last_step(self) -> str:
         return next(reversed(self.steps))
 
-    def _run_step(
+    def _progress(self, total: int):
+        """Progress bar of a run, tqdm is imported only to show it"""
+        if self._disable_tqdm:
+            return _NoProgress()
+        from tqdm.auto import tqdm
+
+        return tqdm(total=total, desc=f"{self.wf_alias}'s iteration")
+
+    def _new_run(self) -> RunContext:
+        run = RunContext()
+        self._current_wf_id = run.wf_exec_id
+        self.wf_executions.append(run.wf_exec_id)
+        return run
+
+    @contextmanager
+    def _recording(self, run: RunContext) -> Iterator[types.WorkflowExecLog]:
+        """Record the run in the exec log when it finishes"""
+        record = types.WorkflowExecLog(
+            wf_exec_id=run.wf_exec_id, wf_id=self.wf_id, status=types.ExecStatus.running
+        )
+        try:
+            yield record
+            failed = any(
+                o.status == types.ExecStatus.failed for o in run.outputs.values()
+            )
+            record.status = types.ExecStatus.failed if failed else types.ExecStatus.done
+        except GeneratorExit:
+            # a stream closed before its end
+            record.status = types.ExecStatus.cancelled
+            raise
+        except Exception as e:
+            record.status = types.ExecStatus.failed
+            record.error = e
+            raise
+        finally:
+            record.finished_at = datetime.utcnow()
+            self.exec_log.append_workflow(record)
+            # the run is readable from the store once it returns
+            self.exec_log.flush()
+
+    def _call_run(self, inputs: Any):
+        if isinstance(inputs, dict):
+            return self.run(**inputs)
+        if isinstance(inputs, tuple):
+            return self.run(*inputs)
+        return self.run(inputs)
+
+    def _record_submit(self, run: RunContext, name: str, values: Iterable[Any]):
+        size = 0
+        for v in values:
+            for item in v if isinstance(v, list) else [v]:
+                if isinstance(item, types.Asset):
+                    size += item.size()
+        run.submits[name] = (time.time_ns(), size)
+
+    def _fan_out_params(self, step: Step, result: types.Output) -> Dict[str, Any]:
+        params = dict(step.params)
+        params["assets"] = result.assets
+        return params
+
+    def _unchanged_output(
+        self, run: RunContext, name: str, step: Step, to_inject: Dict[str, Any]
+    ) -> Optional[types.Output]:
+        """
+        In incremental mode, it returns the last output of the step if
+        its inputs didn't change. Steps without assets as input
+        always run because what they read lives outside of the workflow.
+        """
+        if not self.incremental:
+            return None
+        assets = {}
+        for k, v in to_inject.items():
+            if isinstance(v, types.Asset):
+                assets[k] = v.get_hash()
+            elif isinstance(v, list):
+                for i, item in enumerate(v):
+                    if isinstance(item, types.Asset):
+                        assets[f"{k}.{i}"] = item.get_hash()
+        if not assets:
+            return None
+        params = {
+            k: v
+            for k, v in to_inject.items()
+            if k not in assets and f"{k}.0" not in assets
+        }
+        inputs = types.StepInputs(
+            signature=cache_key(step.func, (), {**params, **assets}),
+            assets=assets,
+            params=params,
+        )
+        run.pending_inputs[name] = inputs
+        last = self._last_done(name)
+        if last and last[0].signature == inputs.signature:
+            # nothing was executed
+            timing = dict(elapsed=0.0, wall_ns=0, cpu_ns=0, started_ns=0)
+            reused = dict(execid=utils.ulid(), source_execid=last[1].execid)
+            return last[1].copy(update={"skipped": True, **timing, **reused})
+        return None
+
+    def _load_asset(self, ref: types.OutputAsset) -> Optional[types.Asset]:
+        asset: Optional[types.Asset] = None
+        if isinstance(self.registry, RegistrySpec):
+            try:
+                asset = self.registry.get_asset(ref.meta.id)
+            except KeyError:
+                pass
+        if asset is None:
+            asset = _init_asset_class(ref.cls, ref.meta, lazy=True)
+        try:
+            exists = asset.it_exist()
+        except NotImplementedError:
+            exists = True
+        return asset if exists else None
+
+    def _last_done(self, name: str) -> Optional[Tuple[types.StepInputs, types.Output]]:
+        """
+        Inputs and output of the last successful execution of a step.
+        They are looked up in the exec log when this instance didn't run
+        the step yet, assets are taken from the registry by their ids
+        or built from the metadata recorded.
+        """
+        if name in self._last_inputs:
+            return self._last_inputs[name]
+        done = self.exec_log.query(step_name=name, status=types.ExecStatus.done)
+        log = done[-1] if done else None
+        if log is None or log.inputs is None:
+            return None
+        assets = [self._load_asset(ref) for ref in log.output_assets]
+        if any(a is None for a in assets):
+            # the output was removed, the step runs again
+            return None
+        output = types.Output(
+            status=types.ExecStatus.done,
+            current_step_id=self._get_step(name).id,
+            current_step_name=name,
+            elapsed=0.0,
+            execid=log.step_execid,
+            assets=assets,
+        )
+        self._last_inputs[name] = (log.inputs, output)
+        return self._last_inputs[name]
+
+    def _register_output(
+        self, run: RunContext, name: str, result: types.Output
+    ) -> types.Output:
+        # the step keeps the last output of any run, the output of each
+        # run is only in its context
+        self._get_step(name)._output = result
+        run.outputs[name] = result
+
+        log = types.ExecLog(step_name=name, step_execid=result.execid or "")
+        log.status = result.status
+        log.error = result.error
+        log.cached = result.cached
+        log.skipped = result.skipped
+        log.source_execid = result.source_execid
+        log.wf_exec_id = run.wf_exec_id
+        log.wall_ns = result.wall_ns
+        log.cpu_ns = result.cpu_ns
+        submitted_ns, log.input_bytes = run.submits.pop(name, (0, 0))
+        if submitted_ns and result.started_ns:
+            log.queue_wait_ns = max(0, result.started_ns - submitted_ns)
+        log.output_bytes = sum(a.size() for a in result.assets)
+        inputs = run.pending_inputs.pop(name, None)
+        if inputs is not None:
+            log.inputs = inputs
+            log.output_assets = [types.OutputAsset.from_asset(a) for a in result.assets]
+            if result.status == types.ExecStatus.done:
+                self._last_inputs[name] = (inputs, result)
+        self.exec_log.append(log)
+        return result
+
+    def add_step(
+        self, name: str, func: Callable, is_async, from_task, raise_on_error, cache=None
+    ) -> Step:
+        step = Step(
+            func,
+            name,
+            is_async=is_async,
+            from_step=from_task,
+            raise_on_error=raise_on_error,
+            cache=cache,
+        )
+        self.steps[name] = step
+        self.compile()
+        return step
+
+    def metrics(self, wf_exec_id: Optional[str] = None) -> List[StepMetrics]:
+        """
+        Metrics of each step aggregated from :attr:`exec_log`, see
+        :mod:`dataexec.metrics` to export them.
+
+        :param wf_exec_id: only the executions of one run of the workflow.
+        """
+        if wf_exec_id is not None:
+            return collect(self.exec_log.query(wf_exec_id=wf_exec_id))
+        return collect(self.exec_log)
+
+    def _graph(self) -> Dict[str, List[str]]:
+        graph = {name: self._get_step(name).upstream for name in self.steps}
+        for name, upstream in graph.items():
+            for u in upstream:
+                if u not in graph:
+                    raise KeyError(f"Step {name} depends on unknown step {u}")
+        return graph
+
+    def _leaves(self, graph: Dict[str, List[str]]) -> List[str]:
+        used = {u for upstream in graph.values() for u in upstream}
+        return [name for name in graph if name not in used]
+
+    def _merge_outputs(self, name: str, outputs: List[types.Output]) -> types.Output:
+        assets = [a for o in outputs for a in o.assets]
+        return types.Output(
+            status=types.ExecStatus.done,
+            current_step_id=",".join(o.current_step_id for o in outputs),
+            current_step_name=name,
+            elapsed=0,
+            assets=assets,
+        )
+
+    def _inject_params(self, next_step: Step, result: types.Output) -> Dict[str, Any]:
+        to_inject = next_step.plan.inject(result.assets)
+        if next_step.params:
+            to_inject.update(next_step.params)
+        return to_inject
+
+    def _upstream_of(self, name: str) -> List[str]:
+        """Steps whose outputs are injected in the step, the previous one here"""
+        names = list(self.steps)
+        i = names.index(name)
+        return [names[i - 1]] if i > 0 else []
+
+    def compile(self):
+        """
+        Check that the inputs of every step can be provided before running
+        anything, it's called each time steps are added.
+
+        :raises errors.StepInputMismatch: when the params of a step are
+        unknown or missing, or when its required assets are not produced
+        by any upstream step (only checked if the upstream steps annotate
+        what they return).
+        """
+        for name, step in self.steps.items():
+            self._check_step(name, step)
+
+    def _check_step(self, name: str, step: Step):
+        plan = step.plan
+        unknown = set(step.params) - set(plan.params)
+        if unknown and not plan.var_kwargs:
+            raise errors.StepInputMismatch(name, f"unknown params {sorted(unknown)}")
+        upstream = [self.steps[u] for u in self._upstream_of(name) if u in self.steps]
+        if not upstream:
+            # roots receive the args of run
+            return
+        missing = [p for p in plan.required if p not in step.params]
+        if missing:
+            raise errors.StepInputMismatch(name, f"params {missing} are not provided")
+        if step.fan_out or any(u.plan.returns is None for u in upstream):
+            return
+        for param, cls in plan.required_assets.items():
+            producers = [
+                u
+                for u in upstream
+                if u.plan.returns and issubclass(u.plan.returns, cls)
+            ]
+            if not producers:
+                raise errors.StepInputMismatch(
+                    name, f"no upstream step produces {cls.__name__} for {param}"
+                )
+            _, many = plan.assets[cls]
+            if not many and len(producers) > 1:
+                raise errors.StepInputMismatch(
+                    name,
+                    f"{param} receives assets from {[u.alias for u in producers]}, "
+                    "annotate it as a List",
+                )
+
+
+class WorkflowBase(_WorkflowCore):
+    def __init__(
+        self,
+        registry={},
+        steps: List[Step] = [],
+        disable_tqdm=False,
+        wf_id=None,
+        wf_alias="sequence",
+        executor: IExecutor = LocalDev(),
+        incremental=False,
+        log_store: Optional[ExecLogStore] = None,
+    ):
+        """
+        :param executor: where the steps are submitted, see
+        :class:`_WorkflowCore` for the rest of the params.
+        """
+        super().__init__(
+            registry, steps, disable_tqdm, wf_id, wf_alias, incremental, log_store
+        )
+        self.executor = executor
+
+    def _run_input(self, i: int, inputs: Any) -> Tuple[int, Any]:
+        return i, self._call_run(inputs)
+
+    def run_many(
+        self,
+        inputs: Iterable[Any],
+        max_concurrency: int = defaults.RUN_CONCURRENCY,
+        ordered=True,
+    ) -> Iterator[Tuple[int, Any]]:
+        """
+        Run the workflow once per input, up to ``max_concurrency`` runs at
+        the same time. Runs are orchestrated in threads and their steps are
+        submitted to :attr:`executor` as in :meth:`run`.
+
+        :param inputs: the args of each run, a dict is passed as kwargs,
+        a tuple as args and anything else as the only arg.
+        :param ordered: yield the results in the order of the inputs
+        instead of the order in which the runs finish.
+        :return: pairs of the index of the input and the result of its run.
+        """
+        inputs = list(inputs)
+        pool = LocalThreads(ThreadsConfig(pool_size=max_concurrency, timeout=None))
+        try:
+            tasks = pool.map(
+                self._run_input, range(len(inputs)), inputs, ordered=ordered
+            )
+            for task in tasks:
+                yield task.result()
+        finally:
+            # runs not started yet are dropped if a run fails or the caller stops
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit_step(
         self,
+        run: RunContext,
         name: str,
         result: Optional[types.Output],
         prev_step,
         *args,
         **kwargs,
-    ) -> types.Output:
+    ) -> TaskBase:
         step = self._get_step(name)
-        step.set_previous(prev_step)
         if not prev_step:
+            self._record_submit(run, name, [*args, *kwargs.values()])
             future = self.executor.submit(step, *args, **kwargs)
         elif result:
-            to_inject = self._inject_params(step, result)
-            future = self.executor.submit(step, **to_inject)
-        future.result()
-        result = step.result()
+            if step.fan_out:
+                to_inject = self._fan_out_params(step, result)
+            else:
+                to_inject = self._inject_params(step, result)
+            self._record_submit(run, name, to_inject.values())
+            unchanged = self._unchanged_output(run, name, step, to_inject)
+            if unchanged is not None:
+                return LocalTask.from_result(unchanged)
+            if step.fan_out:
+                # the step is resolved here using the executor for each asset
+                future = LocalDev().submit(step.map, self.executor, **to_inject)
+            else:
+                future = self.executor.submit(step, **to_inject)
+        return future
 
-        log = types.ExecLog(step_name=name, step_execid=step.execid)
-        log.status = result.status
-        log.error = result.error
-        log.wf_exec_id = self._current_wf_id
-        self.exec_log.append(log)
-        return result
+    def _step_done(self, run: RunContext, name: str, future: TaskBase) -> types.Output:
+        """
+        The output is taken from the task because the step could
+        be executed in another process.
+        """
+        result: types.Output = future.result()
+        return self._register_output(run, name, result)
+
+    def _run_step(
+        self,
+        run: RunContext,
+        name: str,
+        result: Optional[types.Output],
+        prev_step,
+        *args,
+        **kwargs,
+    ) -> types.Output:
+        with tracing.span("WorkflowBase._run_step", step=name):
+            step = self._get_step(name)
+            step.set_previous(prev_step)
+            future = self._submit_step(run, name, result, prev_step, *args, **kwargs)
+            return self._step_done(run, name, future)
 
     def step(self, name: str, cache=None, repeat=None, raise_on_error=True):
+        """
+        :param cache: a :class:`dataexec.cache.StepCache` or a path for a
+        :class:`dataexec.cache.DiskCache` where the outputs of the step are stored.
+        """
+
         def decorator(f):
             @wraps(f)
             def decorated_function(*args, **kwargs):
@@ -88,47 +537,440 @@ class WorkflowBase(IWorkflow):
                         is_async=False,
                         from_task=None,
                         raise_on_error=raise_on_error,
+                        cache=cache,
                     )
 
-                result = self._run_step(name, None, None, *args, **kwargs)
+                result = self._run_step(
+                    self._default_run, name, None, None, *args, **kwargs
+                )
                 return result
 
             return decorated_function
 
         return decorator
 
-    def add_step(
-        self, name: str, func: Callable, is_async, from_task, raise_on_error
-    ) -> Step:
-        step = Step(func, name, is_async, from_task, raise_on_error)
-        self.steps[name] = step
 
-    def _inject_params(self, next_step: Step, result: types.Output) -> Dict[str, Any]:
-        to_inject = {}
-        for n, type_ in next_step.func.__annotations__.items():
-            for asset in result.assets:
-                if isinstance(asset, type_):
-                    to_inject[n] = asset
-        if next_step.params:
-            to_inject.update(next_step.params)
-        return to_inject
+class _StreamError:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+_STREAM_END = object()
 
 
 class Sequence(WorkflowBase):
+    def __init__(self, *args, queue_size: int = defaults.STREAM_QUEUE_SIZE, **kwargs):
+        """
+        :param queue_size: max number of assets waiting between two steps
+        when the sequence runs as a stream.
+        """
+        super().__init__(*args, **kwargs)
+        self.queue_size = queue_size
+
+    def _per_asset(self, step: Step) -> bool:
+        """The step can be called once per asset: it receives single assets"""
+        assets = step.plan.assets.values()
+        return bool(assets) and not step.fan_out and not any(m for _, m in assets)
+
+    def _stream_steps(self) -> List[str]:
+        """
+        Steps run as a stream: a first step which is a generator and the
+        per-asset steps right after it. Incremental runs and a cached first
+        step use the normal path because they need all the inputs at once.
+        """
+        names = list(self.steps)
+        first = self._get_step(names[0]) if names else None
+        if first is None or not first.is_generator:
+            return []
+        if self.incremental or first.cache is not None:
+            return []
+        streamed = names[:1]
+        for name in names[1:]:
+            if not self._per_asset(self._get_step(name)):
+                break
+            streamed.append(name)
+        return streamed
+
+    def _put(self, sink: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                sink.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue, stop: threading.Event) -> Any:
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STREAM_END
+
+    def _emit(self, result: Any, sink: queue.Queue, stop: threading.Event) -> bool:
+        if isinstance(result, types.Asset):
+            result = [result]
+        elif result is None:
+            result = []
+        for item in result:
+            if isinstance(item, types.Asset) and not self._put(sink, item, stop):
+                return False
+        return True
+
+    def _stage(
+        self,
+        run: RunContext,
+        name: str,
+        source: Optional[queue.Queue],
+        sink: queue.Queue,
+        stop: threading.Event,
+        args,
+        kwargs,
+    ):
+        """
+        Run one step of the stream. The first step is iterated in this
+        thread, the next ones are submitted to the executor once per asset.
+        """
+        with tracing.span(f"stage {name}"):
+            step = self._get_step(name)
+            timer = Timer()
+            execid = utils.ulid()
+            error: Optional[Exception] = None
+            try:
+                if source is None:
+                    execid = step._start()
+                    self._emit(step.func(*args, **(kwargs or step.params)), sink, stop)
+                while source is not None:
+                    item = self._get(source, stop)
+                    if item is _STREAM_END:
+                        break
+                    if isinstance(item, _StreamError):
+                        self._put(sink, item, stop)
+                        return
+                    to_inject = step.plan.inject([item])
+                    to_inject.update(step.params)
+                    output = self.executor.submit(step, **to_inject).result()
+                    if output.status == types.ExecStatus.failed:
+                        error = output.error
+                    elif not self._emit(output.assets, sink, stop):
+                        break
+            except Exception as e:
+                error = e
+                if step._raise:
+                    if not isinstance(e, errors.StepExecutionError):
+                        e = errors.StepExecutionError(step.alias)
+                        e.__cause__ = error
+                    self._put(sink, _StreamError(e), stop)
+            timer.stop()
+            if error is None:
+                output = step._generate_output([], execid=execid, timer=timer)
+            else:
+                output = step._generate_output(
+                    [],
+                    status=types.ExecStatus.failed,
+                    e=error,
+                    execid=execid,
+                    timer=timer,
+                )
+            self._register_output(run, name, output)
+            self._put(sink, _STREAM_END, stop)
+
+    def stream(self, *args, **kwargs) -> Iterator[types.Asset]:
+        """
+        Run the steps as a pipeline: each step runs in its own thread and
+        every asset produced (generator steps yield them one by one) is
+        sent to the next step through a bounded queue, so the steps overlap
+        and at most ``queue_size`` assets wait between two steps.
+        The steps after the first one are called once per asset received,
+        each call is submitted to :attr:`executor`. The assets of the last
+        step are yielded as they are produced, the outputs registered for
+        each step don't keep them.
+
+        :raises errors.StepInputMismatch: if a step after the first one
+        doesn't receive single assets, like a step taking a List of them.
+        """
+        names = list(self.steps)
+        for name in names[1:]:
+            if not self._per_asset(self._get_step(name)):
+                raise errors.StepInputMismatch(
+                    name, "it can't be streamed, it doesn't receive single assets"
+                )
+        return self._recorded_stream(self._new_run(), names, args, kwargs)
+
+    def _recorded_stream(
+        self, run: RunContext, names: List[str], args, kwargs
+    ) -> Iterator[types.Asset]:
+        with self._recording(run):
+            yield from self._stream(run, names, args, kwargs)
+
+    def _stream(
+        self, run: RunContext, names: List[str], args, kwargs
+    ) -> Iterator[types.Asset]:
+        stop = threading.Event()
+        queues: List[queue.Queue] = [queue.Queue(self.queue_size) for _ in names]
+        threads = []
+        for i, name in enumerate(names):
+            source = queues[i - 1] if i > 0 else None
+            # spans of the stages are children of the current one
+            t = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._stage, run, name, source, queues[i], stop, args, kwargs),
+                name=f"{self.wf_alias}-{name}",
+                daemon=True,
+            )
+            t.start()
+            threads.append(t)
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+
+    @tracing.traced()
     def run(self, *args, **kwargs) -> types.Output:
+        """
+        If the first step is a generator function, it runs as a stream
+        (see :meth:`stream`) together with the per-asset steps after it,
+        the assets of the last streamed step are gathered in its output
+        and the rest of the steps run as usual.
+        """
+        run = self._new_run()
+        tracing.annotate(workflow=self.wf_alias, wf_exec_id=run.wf_exec_id)
+        streamed = self._stream_steps()
         prev_step = None
         _result = None
-        steps = list(self.steps)
-        self._current_wf_id = utils.secure_random_str()
-        self.wf_executions.append(self._current_wf_id)
-        for i in trange(len(steps), desc=f"{self.wf_alias}'s iteration"):
-            name = steps[i]
-            _result = self._run_step(name, _result, prev_step, *args, **kwargs)
-            prev_step = _result.current_step_id
+        steps = list(self.steps)[len(streamed) :]
+        with self._recording(run):
+            if streamed:
+                assets = list(self._stream(run, streamed, args, kwargs))
+                _result = run.outputs[streamed[-1]].copy(update={"assets": assets})
+                run.outputs[streamed[-1]] = _result
+                prev_step = _result.current_step_id
+            with self._progress(len(steps)) as pbar:
+                for name in steps:
+                    _result = self._run_step(
+                        run, name, _result, prev_step, *args, **kwargs
+                    )
+                    prev_step = _result.current_step_id
+                    pbar.update(1)
+
+        return run.outputs[self._last_step()]
+
+
+class Parallel(WorkflowBase):
+    """
+    Steps are nodes of a graph, the edges are declared with the ``from_step``
+    param of each :class:`Step` (one name or a list of names of other steps).
+    Every step whose upstream steps are done is submitted to the executor
+    at the same time. Steps without upstream receive the args of :meth:`run`.
+    """
+
+    def _upstream_of(self, name: str) -> List[str]:
+        return self._get_step(name).upstream
+
+    @tracing.traced()
+    def run(self, *args, **kwargs) -> List[types.Output]:
+        """
+        :return: a list with the outputs of the steps that aren't used by
+        other steps, in the order they were added to the workflow.
+        """
+        graph = self._graph()
+        run = self._new_run()
+        tracing.annotate(workflow=self.wf_alias, wf_exec_id=run.wf_exec_id)
+        with self._recording(run):
+            waiting = OrderedDict((n, set(u)) for n, u in graph.items())
+            outputs = run.outputs
+            running: Dict[TaskBase, str] = {}
+            with self._progress(len(graph)) as pbar:
+                while waiting or running:
+                    ready = [n for n, deps in waiting.items() if not deps]
+                    if not ready and not running:
+                        raise ValueError(f"Cycle detected between {list(waiting)}")
+                    for name in ready:
+                        del waiting[name]
+                        upstream = graph[name]
+                        if upstream:
+                            merged = self._merge_outputs(
+                                name, [outputs[u] for u in upstream]
+                            )
+                            task = self._submit_step(run, name, merged, upstream)
+                        else:
+                            task = self._submit_step(
+                                run, name, None, None, *args, **kwargs
+                            )
+                        running[task] = name
+
+                    for task in wait_first(list(running)):
+                        name = running.pop(task)
+                        self._step_done(run, name, task)
+                        pbar.update(1)
+                        for deps in waiting.values():
+                            deps.discard(name)
+
+            return [outputs[n] for n in self._leaves(graph)]
+
+
+class AsyncWorkflowBase(_WorkflowCore):
+    """
+    Steps are awaited in the running loop through :meth:`Step.run_async`
+    and an :class:`AIOExecutor`, the ``timeout`` of each step is enforced
+    by :meth:`AIOTask.result`.
+    """
+
+    def __init__(self, *args, executor: Optional[AIOExecutor] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = executor or AsyncLocal()
+
+    async def run_many(
+        self,
+        inputs: Iterable[Any],
+        max_concurrency: int = defaults.RUN_CONCURRENCY,
+        ordered=True,
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """Same as :meth:`WorkflowBase.run_many`, the runs are tasks of the loop"""
+        slots = asyncio.Semaphore(max_concurrency)
+
+        async def run_input(i: int, inputs: Any) -> Tuple[int, Any]:
+            async with slots:
+                return i, await self._call_run(inputs)
+
+        tasks = [asyncio.ensure_future(run_input(i, x)) for i, x in enumerate(inputs)]
+        try:
+            for task in tasks if ordered else asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _submit_step_async(
+        self,
+        run: RunContext,
+        name: str,
+        result: Optional[types.Output],
+        prev_step,
+        *args,
+        **kwargs,
+    ) -> AIOTaskBase:
+        step = self._get_step(name)
+        if not prev_step:
+            self._record_submit(run, name, [*args, *kwargs.values()])
+            task = await self.executor.submit(step.run_async, *args, **kwargs)
+        elif result:
+            if step.fan_out:
+                to_inject = self._fan_out_params(step, result)
+            else:
+                to_inject = self._inject_params(step, result)
+            self._record_submit(run, name, to_inject.values())
+            unchanged = self._unchanged_output(run, name, step, to_inject)
+            if unchanged is not None:
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(unchanged)
+                return AIOTask(utils.ulid(), future)
+            if step.fan_out:
+                task = await self.executor.submit(
+                    step.map_async, self.executor, **to_inject
+                )
+            else:
+                task = await self.executor.submit(step.run_async, **to_inject)
+        return task
+
+    async def _step_done_async(
+        self, run: RunContext, name: str, task: AIOTaskBase
+    ) -> types.Output:
+        step = self._get_step(name)
+        try:
+            result = await task.result(step.timeout)
+        except errors.TaskTimeoutError as e:
+            result = step._call_exception(e)
+        return self._register_output(run, name, result)
+
+    async def _run_step_async(
+        self,
+        run: RunContext,
+        name: str,
+        result: Optional[types.Output],
+        prev_step,
+        *args,
+        **kwargs,
+    ) -> types.Output:
+        with tracing.span("WorkflowBase._run_step", step=name):
+            step = self._get_step(name)
+            step.set_previous(prev_step)
+            task = await self._submit_step_async(
+                run, name, result, prev_step, *args, **kwargs
+            )
+            return await self._step_done_async(run, name, task)
+
+
+class AsyncSequence(AsyncWorkflowBase):
+    @tracing.traced()
+    async def run(self, *args, **kwargs) -> types.Output:
+        prev_step = None
+        _result = None
+        run = self._new_run()
+        tracing.annotate(workflow=self.wf_alias, wf_exec_id=run.wf_exec_id)
+        with self._recording(run):
+            for name in self.steps:
+                _result = await self._run_step_async(
+                    run, name, _result, prev_step, *args, **kwargs
+                )
+                prev_step = _result.current_step_id
+
+            return run.outputs[self._last_step()]
+
+
+class AsyncParallel(AsyncWorkflowBase):
+    """Same as :class:`Parallel` but the steps are awaited in the running loop"""
+
+    def _upstream_of(self, name: str) -> List[str]:
+        return self._get_step(name).upstream
 
-        return self.steps[self._last_step()].result()
+    @tracing.traced()
+    async def run(self, *args, **kwargs) -> List[types.Output]:
+        graph = self._graph()
+        run = self._new_run()
+        tracing.annotate(workflow=self.wf_alias, wf_exec_id=run.wf_exec_id)
+        with self._recording(run):
+            waiting = OrderedDict((n, set(u)) for n, u in graph.items())
+            outputs = run.outputs
+            running: Dict[asyncio.Future, str] = {}
+            while waiting or running:
+                ready = [n for n, deps in waiting.items() if not deps]
+                if not ready and not running:
+                    raise ValueError(f"Cycle detected between {list(waiting)}")
+                for name in ready:
+                    del waiting[name]
+                    upstream = graph[name]
+                    if upstream:
+                        merged = self._merge_outputs(
+                            name, [outputs[u] for u in upstream]
+                        )
+                        task = await self._submit_step_async(
+                            run, name, merged, upstream
+                        )
+                    else:
+                        task = await self._submit_step_async(
+                            run, name, None, None, *args, **kwargs
+                        )
+                    # the timeout of the step is handled by AIOTask.result
+                    step_done = self._step_done_async(run, name, task)
+                    running[asyncio.ensure_future(step_done)] = name
 
+                finished, _ = await asyncio.wait(
+                    list(running), return_when=asyncio.FIRST_COMPLETED
+                )
+                for fut in finished:
+                    name = running.pop(fut)
+                    fut.result()
+                    for deps in waiting.values():
+                        deps.discard(name)
 
-# class Parallel(WorkflowBase):
-#    def run(self, *args, **kwargs) -> List[types.Output]:
-#        pass
+            return [outputs[n] for n in self._leaves(graph)]
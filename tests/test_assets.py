@@ -1,7 +1,12 @@
 from pathlib import Path
 import tempfile
+
+import pytest
+
 from dataexec.assets import TextAsset, copy_asset
+from dataexec import utils
 from dataexec.types import Asset
+from dataexec.utils import basic_hash, file_hash
 
 
 def test_assets_open():
@@ -20,3 +25,119 @@ def test_assets_copy():
     new_asset.write()
     assert id(asset) != id(new_asset)
     assert Path(tmp.name).is_file()
+
+
+def test_assets_lazy():
+    asset = TextAsset.from_location("tests/text_asset.txt", lazy=True)
+    assert not asset.is_loaded
+    assert list(asset.iter_lines()) == ["testing_asset\n"]
+    assert not asset.is_loaded
+    assert asset.raw.strip() == "testing_asset"
+    assert asset.is_loaded
+
+
+def test_assets_iter_chunks():
+    asset = TextAsset.from_location("tests/text_asset.txt", lazy=True)
+    chunks = list(asset.iter_chunks(size=4))
+    assert "".join(chunks) == "testing_asset\n"
+    assert all(len(c) <= 4 for c in chunks)
+    asset.raw
+    assert list(asset.iter_chunks(size=4)) == chunks
+
+
+def test_assets_writer(tmp_path):
+    location = tmp_path / "stream.txt"
+    location.write_text("old")
+    asset = TextAsset.from_location(str(location))
+    with asset.writer() as f:
+        for i in range(3):
+            f.write(f"line {i}\n")
+    assert not asset.is_loaded
+    assert asset.raw == "line 0\nline 1\nline 2\n"
+    assert list(asset.iter_lines())[-1] == "line 2\n"
+
+
+def test_assets_iter_lines_separators(tmp_path):
+    location = tmp_path / "separators.txt"
+    location.write_bytes("a\u2028b\x0cc\r\nd".encode("utf-8"))
+    asset = TextAsset.from_location(str(location), lazy=True)
+    from_file = list(asset.iter_lines())
+    assert from_file == ["a\u2028b\x0cc\n", "d"]
+    asset.raw = "a\u2028b\x0cc\r\nd"
+    assert list(asset.iter_lines()) == from_file
+
+
+def test_assets_hash(tmp_path):
+    location = tmp_path / "hash.txt"
+    location.write_text("testing_asset\n")
+    asset = TextAsset.from_location(str(location))
+    digest = asset.get_hash()
+    assert digest == basic_hash("testing_asset\n", asset.hash_algorithm)
+    assert utils.hash_memo.get(utils.hash_memo.key(str(location), "md5", text=True))
+
+    asset.raw = "changed"
+    assert asset.get_hash() == basic_hash("changed", asset.hash_algorithm)
+    asset.write()
+    assert asset.get_hash() == file_hash(str(location), text=True)
+    assert asset.get_hash() != digest
+
+
+def test_assets_hash_canonical(tmp_path):
+    location = tmp_path / "crlf.txt"
+    location.write_bytes(b"line 1\r\nline 2\r\n")
+    asset = TextAsset.from_location(str(location))
+    digest = asset.get_hash()
+    # an equal payload in a new object hashes the same
+    asset.raw = "".join(asset.raw)
+    assert not asset.is_synced
+    assert asset.get_hash() == digest == basic_hash("line 1\nline 2\n")
+
+
+def test_assets_hash_memo(tmp_path, monkeypatch):
+    location = tmp_path / "memo.txt"
+    location.write_text("memo")
+    first = file_hash(str(location))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file read again")
+
+    monkeypatch.setattr(utils.hashlib, "new", fail)
+    assert file_hash(str(location)) == first
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    ["auto", "hardlink", "reflink", "copy_file_range", "sendfile", "buffered"],
+)
+def test_assets_copy_strategies(tmp_path, strategy):
+    src = tmp_path / "src.txt"
+    src.write_text("testing_asset\n")
+    asset = TextAsset.from_location(str(src))
+    asset.get_hash()
+
+    dst = tmp_path / "dst.txt"
+    new_asset = copy_asset(asset, str(dst), strategy=strategy)
+    assert dst.read_text() == "testing_asset\n"
+    assert new_asset.raw is asset.raw
+    assert new_asset.meta.derived_from == asset.id
+    assert new_asset.get_hash() == asset.get_hash()
+
+    new_asset.raw = "modified"
+    new_asset.write()
+    assert src.read_text() == "testing_asset\n"
+    assert dst.read_text() == "modified"
+
+
+def test_assets_copy_unknown_strategy(tmp_path):
+    asset = TextAsset.from_location("tests/text_asset.txt")
+    with pytest.raises(ValueError):
+        asset.copy(str(tmp_path / "dst.txt"), strategy="teleport")
+
+
+def test_assets_copy_short_raises(tmp_path, monkeypatch):
+    # a copy that stops early raises so copy_file falls back to buffered
+    monkeypatch.setattr(utils.os, "sendfile", lambda *args: 0, raising=False)
+    src = tmp_path / "src.txt"
+    src.write_text("testing_asset\n")
+    with pytest.raises(OSError):
+        utils._sendfile(str(src), str(tmp_path / "dst.txt"))
@@ -0,0 +1,143 @@
+import os
+import time
+
+from dataexec import types
+from dataexec.assets import TextAsset
+from dataexec.cache import DiskCache, cache_key
+from dataexec.steps import Step
+from dataexec.workflows import Sequence
+
+CALLS = []
+
+
+def get_asset(txt: str):
+    CALLS.append(txt)
+    return TextAsset.from_location(txt)
+
+
+def upper_text(asset: TextAsset):
+    CALLS.append(asset.id)
+    asset._raw = asset.raw.upper()
+    return asset
+
+
+def _output(name="step") -> types.Output:
+    return types.Output(
+        status=types.ExecStatus.done,
+        current_step_id=name,
+        current_step_name=name,
+        elapsed=0,
+    )
+
+
+def test_cache_key():
+    asset = TextAsset.from_location("tests/text_asset.txt")
+    other = TextAsset.from_location("tests/text_asset.txt")
+    assert cache_key(upper_text, (), {"asset": asset}) == cache_key(
+        upper_text, (), {"asset": other}
+    )
+    other._raw = "changed"
+    assert cache_key(upper_text, (), {"asset": asset}) != cache_key(
+        upper_text, (), {"asset": other}
+    )
+    assert cache_key(upper_text, (), {"asset": asset}) != cache_key(
+        get_asset, (), {"asset": asset}
+    )
+
+
+def _versions(*sources: str):
+    funcs = []
+    for source in sources:
+        namespace: dict = {}
+        exec(source, namespace)
+        funcs.append(namespace["f"])
+    return funcs
+
+
+def _closure(value):
+    def f():
+        return value
+
+    return f
+
+
+def test_cache_key_function_changes():
+    keys = {
+        cache_key(f, (), {})
+        for f in _versions(
+            "def f(): return 'a'",
+            "def f(): return 'b'",
+            "def f(): return a",
+            "def f(x=1): return x",
+            "def f(x=2): return x",
+            "def f(): return lambda: 1",
+            "def f(): return lambda: 2",
+        )
+    }
+    assert len(keys) == 7
+    assert cache_key(_closure(1), (), {}) != cache_key(_closure(2), (), {})
+    assert cache_key(_closure(1), (), {}) == cache_key(_closure(1), (), {})
+
+
+def test_cache_workflow(tmp_path):
+    CALLS.clear()
+    txt = "tests/text_asset.txt"
+    cache = DiskCache(str(tmp_path))
+    w = Sequence(
+        steps=[
+            Step(get_asset, "get_asset", params={"txt": txt}, cache=cache),
+            Step(upper_text, "upper", cache=cache),
+        ],
+        disable_tqdm=True,
+    )
+    first = w.run()
+    second = w.run()
+    assert len(CALLS) == 2
+    assert second.cached
+    assert second.assets[0].raw == first.assets[0].raw == "TESTING_ASSET\n"
+    assert all(log.cached for log in w.exec_log[2:])
+
+
+def test_cache_eviction_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=0)
+    cache.set("aa1", _output())
+    assert cache.get("aa1") is None
+
+
+def test_cache_eviction_scans(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_size=10_000, max_age=None)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(1) or evict())
+    for i in range(5):
+        cache.set(f"aa{i}", _output())
+    # the size is tracked, the directory is not scanned on each write
+    assert not evictions
+    size = cache._size
+
+    cache.max_size = size - 1
+    cache.set("aa0", _output())
+    assert evictions and cache._size <= cache.max_size
+    assert cache.get("aa0") is not None
+
+
+def test_cache_eviction_age(tmp_path):
+    cache = DiskCache(str(tmp_path), max_age=60)
+    cache.set("aa1", _output())
+    assert cache.get("aa1") is not None
+    entry = cache._entry("aa1")
+    old = time.time() - 120
+    os.utime(entry, (old, old))
+    assert cache.get("aa1") is None
+    assert not entry.exists()
+
+
+def test_cache_evicted_while_read(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    cache.set("aa1", _output())
+
+    def utime(path, *args):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", utime)
+    assert cache.get("aa1") is None
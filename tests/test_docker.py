@@ -0,0 +1,246 @@
+import itertools
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+import pytest
+
+docker = pytest.importorskip("docker")
+
+from dataexec import errors
+from dataexec.assets import TextAsset
+from dataexec.ext.docker import (
+    DockerCommand,
+    DockerExecConfig,
+    DockerExecutor,
+    DockerResources,
+    DockerStepConfig,
+    LogTail,
+    iter_lines,
+)
+from dataexec.steps import Step
+from dataexec.workflows import Sequence
+
+ExecResult = namedtuple("ExecResult", "exit_code output")
+_ids = itertools.count()
+
+
+class FakeContainer:
+    """Runs the commands given to exec_run in a local process"""
+
+    def __init__(self, image, volumes, resources, broken=False):
+        self.id = f"fake{next(_ids)}"
+        self.image = image
+        self.volumes = volumes
+        self.resources = resources
+        self.execs = 0
+        self.removed = False
+        self.broken = broken
+
+    def _host_path(self, path: str) -> str:
+        for orig, vol in self.volumes.items():
+            if path.startswith(vol["bind"] + "/"):
+                return orig + path[len(vol["bind"]) :]
+        return path
+
+    def exec_run(self, cmd, workdir=None):
+        self.execs += 1
+        if self.broken:
+            return ExecResult(126, b"OCI runtime exec failed")
+        cmd = [sys.executable] + [self._host_path(c) for c in cmd[1:]]
+        p = subprocess.run(cmd, capture_output=True)
+        return ExecResult(p.returncode, p.stdout + p.stderr)
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeContainers:
+    def __init__(self, broken=False):
+        self.started = []
+        self.broken = broken
+
+    def run(self, image, command, detach, environment, network_mode, volumes, **kw):
+        container = FakeContainer(image, volumes, kw, broken=self.broken)
+        self.started.append(container)
+        return container
+
+
+class FakeClient:
+    def __init__(self, broken=False):
+        self.containers = FakeContainers(broken)
+
+
+def add(a, b):
+    return a + b
+
+
+def fail():
+    raise NameError("func failed")
+
+
+def slow(delay: float):
+    time.sleep(delay)
+    return delay
+
+
+def get_asset(txt: str):
+    return TextAsset.from_location(txt)
+
+
+def same_asset(asset: TextAsset):
+    return asset
+
+
+def test_docker_executor_warm_containers():
+    client = FakeClient()
+    conf = DockerExecConfig(image="python:3", pool_size=2, containers_per_image=1)
+    with DockerExecutor(conf, docker_client=client) as executor:
+        tasks = [executor.submit(add, i, 1) for i in range(4)]
+        assert [t.result() for t in tasks] == [1, 2, 3, 4]
+        with pytest.raises(NameError):
+            executor.submit(fail).result()
+        (container,) = client.containers.started
+        assert container.execs == 5
+    assert container.removed
+    assert not os.path.exists(executor.shared_dir)
+
+
+def test_docker_executor_broken_container():
+    client = FakeClient(broken=True)
+    conf = DockerExecConfig(image="python:3", containers_per_image=1)
+    with DockerExecutor(conf, docker_client=client) as executor:
+        for _ in range(2):
+            with pytest.raises(errors.ContainerExecError):
+                executor.submit(add, 1, 1).result()
+    # each failure replaces the container
+    assert len(client.containers.started) == 2
+    assert all(c.removed for c in client.containers.started)
+
+
+def test_docker_executor_timeout():
+    client = FakeClient()
+    conf = DockerExecConfig(image="python:3", containers_per_image=1, timeout=1)
+    with DockerExecutor(conf, docker_client=client) as executor:
+        started = time.monotonic()
+        with pytest.raises(errors.TaskTimeoutError):
+            executor.submit(slow, 30).result()
+        # the call is ended in the container, the next task doesn't wait for it
+        assert executor.submit(add, 1, 1).result() == 2
+        assert time.monotonic() - started < 10
+    first = client.containers.started[0]
+    assert first.removed
+
+
+def test_docker_executor_steps():
+    client = FakeClient()
+    conf = DockerExecConfig(
+        image="python:3",
+        steps={
+            "same": DockerStepConfig(
+                image="python:3-slim", resources=DockerResources(mem_limit=2**30)
+            )
+        },
+    )
+    with DockerExecutor(conf, docker_client=client) as executor:
+        w = Sequence(
+            steps=[
+                Step(get_asset, "get", params={"txt": "tests/text_asset.txt"}),
+                Step(same_asset, "same"),
+            ],
+            executor=executor,
+            disable_tqdm=True,
+        )
+        result = w.run()
+        w.run()
+    assert result.assets[0].raw.strip() == "testing_asset"
+    started = {c.image: c for c in client.containers.started}
+    assert len(client.containers.started) == 2
+    assert started["python:3-slim"].resources["mem_limit"] == 2**30
+    assert started["python:3"].execs == 2
+
+
+class LoggingContainer:
+    def __init__(self, lines: int):
+        self.lines = lines
+        self.removed = False
+
+    def logs(self, stream=False, follow=False):
+        assert stream and follow
+        data = b"".join(b"line %d\r\n" % i for i in range(self.lines))
+        # chunks that split the lines
+        return (data[i : i + 7] for i in range(0, len(data), 7))
+
+    def wait(self, timeout):
+        return {"StatusCode": 0}
+
+    def remove(self):
+        self.removed = True
+
+
+class LoggingContainers:
+    def run(self, image, cmd, **kwargs):
+        self.container = LoggingContainer(10_000)
+        return self.container
+
+
+def test_docker_iter_lines():
+    chunks = [b"fir", b"st\nsec", b"ond\r\n\nla", b"st"]
+    assert list(iter_lines(chunks)) == ["first", "second", "", "last"]
+    # progress bars end their lines with \r, \r\n can be split by a chunk
+    progress = [b"10%\r20%\r", b"\ndone\r", b"\xc3", b"\xa9"]
+    assert list(iter_lines(progress)) == ["10%", "20%", "done", "\u00e9"]
+    # long lines are given in pieces
+    long_line = [b"x" * 7] * 10_000 + [b"\nend"]
+    lines = list(iter_lines(long_line, max_line=1000))
+    assert lines[:-1] == ["x" * 1000] * 70 and lines[-1] == "end"
+    tail = LogTail(size=2)
+    tail.consume(chunks)
+    assert tail.text() == "\nlast" and tail.lines == 4
+
+
+def test_docker_command_streams_logs(tmp_path):
+    client = FakeClient()
+    client.containers = LoggingContainers()
+    seen = []
+    log_file = str(tmp_path / "run.log")
+    result = DockerCommand(client).run(
+        "cmd", "python:3", on_line=seen.append, tail=3, log_file=log_file
+    )
+    assert result.status == 0 and result.lines == 10_000
+    assert result.msg == "line 9997\nline 9998\nline 9999"
+    assert len(seen) == 10_000
+    with open(log_file) as f:
+        assert sum(1 for _ in f) == 10_000
+    assert client.containers.container.removed
+
+
+class FailingContainer(LoggingContainer):
+    def logs(self, stream=False, follow=False):
+        for i in range(20):
+            time.sleep(0.01)
+            yield b"line %d\n" % i
+
+    def wait(self, timeout):
+        raise docker.errors.APIError("wait failed")
+
+    def kill(self):
+        raise docker.errors.APIError("kill failed")
+
+
+class FailingContainers:
+    def run(self, image, cmd, **kwargs):
+        return FailingContainer(0)
+
+
+def test_docker_command_api_error(tmp_path):
+    client = FakeClient()
+    client.containers = FailingContainers()
+    log_file = str(tmp_path / "run.log")
+    result = DockerCommand(client).run("cmd", "python:3", log_file=log_file)
+    assert result.status == -3
+    # the reader finished before the file was closed
+    with open(log_file) as f:
+        assert sum(1 for _ in f) == result.lines == 21
@@ -0,0 +1,151 @@
+import gc
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dataexec import errors, types, utils
+from dataexec.assets import TextAsset
+from dataexec.execlog import JSONLStore, RingBufferStore
+from dataexec.steps import Step
+from dataexec.workflows import Sequence
+
+
+def get_asset(txt: str, error=False):
+    if error:
+        raise NameError("func failed")
+    return TextAsset.from_location(txt)
+
+
+def same_asset(asset: TextAsset):
+    return asset
+
+
+def make_log(i: int, status=types.ExecStatus.done) -> types.ExecLog:
+    return types.ExecLog(
+        step_name=f"step{i % 2}",
+        step_execid=str(i),
+        wf_exec_id=f"wf{i // 2}",
+        status=status,
+    )
+
+
+def test_execlog_ring_buffer():
+    store = RingBufferStore(capacity=3)
+    for i in range(5):
+        store.append(make_log(i))
+    assert len(store) == 3
+    assert store[0].step_execid == "2" and store[-1].step_execid == "4"
+    assert [log.step_execid for log in store.query(step_name="step0")] == ["2", "4"]
+    assert [log.step_execid for log in store.query(wf_exec_id="wf1")] == ["2", "3"]
+
+
+def test_execlog_jsonl(tmp_path):
+    store = JSONLStore(
+        str(tmp_path), segment_size=400, max_segments=2, flush_size=4, flush_interval=60
+    )
+    for i in range(3):
+        store.append(make_log(i))
+    # batched until flush_size
+    assert not store.segments()
+    store.append(make_log(3, status=types.ExecStatus.failed))
+    assert len(store.segments()) == 1
+
+    for i in range(4, 40):
+        store.append(make_log(i))
+    store.append_workflow(
+        types.WorkflowExecLog(
+            wf_exec_id="wf19", status=types.ExecStatus.failed, error=ValueError("x")
+        )
+    )
+    store.close()
+    assert len(store.segments()) == 2
+    logs = list(store)
+    assert 0 < len(logs) < 40
+    assert logs[-1].step_execid == "39"
+    assert store.query(wf_exec_id="wf19", step_name="step1")[0].step_execid == "39"
+    (wf,) = store.query_workflows(status=types.ExecStatus.failed)
+    assert "ValueError" in str(wf.error)
+
+    reopened = JSONLStore(str(tmp_path))
+    assert reopened[-1].step_execid == "39"
+
+
+def test_execlog_workflow(tmp_path):
+    txt = "tests/text_asset.txt"
+    store = JSONLStore(str(tmp_path))
+    w = Sequence(
+        steps=[
+            Step(get_asset, "get", raise_on_error=False),
+            Step(same_asset, "same"),
+        ],
+        disable_tqdm=True,
+        log_store=store,
+    )
+    w.run(txt=txt)
+    with pytest.raises(errors.StepExecutionError):
+        w.run(txt=txt, error=True)
+
+    assert len(w.exec_log) == 3
+    first, second = w.wf_executions
+    assert [log.step_name for log in store.query(wf_exec_id=first)] == ["get", "same"]
+    (failed,) = store.query(status=types.ExecStatus.failed)
+    assert failed.wf_exec_id == second
+    runs = store.query_workflows()
+    assert [r.status for r in runs] == [types.ExecStatus.done, types.ExecStatus.failed]
+    assert runs[0].wf_id == w.wf_id and runs[0].finished_at >= runs[0].created_at
+    assert w.metrics()[0].count == 2
+    assert [m.count for m in w.metrics(wf_exec_id=first)] == [1, 1]
+
+
+def test_execlog_jsonl_flush(tmp_path):
+    store = JSONLStore(str(tmp_path / "run"), flush_size=100, flush_interval=60)
+    w = Sequence(
+        steps=[Step(get_asset, "get"), Step(same_asset, "same")],
+        disable_tqdm=True,
+        log_store=store,
+    )
+    w.run(txt="tests/text_asset.txt")
+    # written at the end of the run, not at the next append
+    (segment,) = store.segments()
+    assert len(segment.read_text().splitlines()) == 3
+
+    # buffered records are written when the interpreter exits
+    code = (
+        "from dataexec.execlog import JSONLStore; "
+        "from dataexec.types import ExecLog; "
+        f"store = JSONLStore({str(tmp_path / 'exit')!r}, flush_size=100); "
+        "store.append(ExecLog(step_name='s', step_execid='1'))"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+    assert len(JSONLStore(str(tmp_path / "exit"))) == 1
+
+    # and when the store is collected
+    store = JSONLStore(str(tmp_path / "gc"), flush_size=100, flush_interval=60)
+    store.append(types.ExecLog(step_name="s", step_execid="1"))
+    del store
+    gc.collect()
+    assert len(JSONLStore(str(tmp_path / "gc"))) == 1
+
+
+def test_execlog_query_by_time(tmp_path):
+    start = datetime(2024, 5, 1)
+    ms = int(start.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    store = JSONLStore(str(tmp_path), segment_size=200, flush_size=1)
+    for minute in range(6):
+        execid = utils.encode_ulid(ms + minute * 60_000, 0)
+        store.append(types.ExecLog(step_name="s", step_execid=execid))
+        store.append_workflow(types.WorkflowExecLog(wf_exec_id=execid))
+    assert len(store.segments()) > 1
+    found = store.query(
+        since=start + timedelta(minutes=2), until=start + timedelta(minutes=4)
+    )
+    assert [utils.ulid_time(log.step_execid).minute for log in found] == [2, 3]
+    found = store.query_workflows(since=start + timedelta(minutes=5))
+    assert len(found) == 1
+
+    recent = RingBufferStore()
+    recent.append(types.ExecLog(step_name="s", step_execid=utils.ulid()))
+    assert recent.query(since=datetime.utcnow() - timedelta(hours=1))
+    assert not recent.query(until=datetime.utcnow() - timedelta(hours=1))
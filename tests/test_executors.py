@@ -0,0 +1,154 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from dataexec import errors, types
+from dataexec.executors import (
+    AsyncLocal,
+    LocalDev,
+    LocalProcess,
+    LocalThreads,
+    MPConfig,
+    ThreadsConfig,
+)
+
+
+def add(a, b):
+    return a + b
+
+
+def get_pid():
+    return os.getpid()
+
+
+def test_executors_local_dev():
+    executor = LocalDev()
+    task = executor.submit(add, 1, b=2)
+    assert task.result() == 3
+
+
+def test_executors_local_process():
+    with LocalProcess(MPConfig(pool_size=1)) as executor:
+        tasks = [executor.submit(add, i, 1) for i in range(5)]
+        assert [t.result() for t in tasks] == [1, 2, 3, 4, 5]
+        assert all(t.done() for t in tasks)
+
+
+def test_executors_local_process_reuse_workers():
+    with LocalProcess(MPConfig(pool_size=1)) as executor:
+        pids = {executor.submit(get_pid).result() for _ in range(4)}
+    assert len(pids) == 1
+    assert os.getpid() not in pids
+
+
+def test_executors_local_process_method():
+    with LocalProcess("spawn") as executor:
+        assert executor.conf.method == "spawn" and executor.conf.timeout is None
+        assert executor.submit(add, 1, 1).result() == 2
+    conf = MPConfig(pool_size=1)
+    assert LocalProcess(conf, method="forkserver").conf.method == "forkserver"
+    assert conf.method == "fork"
+
+
+def test_executors_local_process_shutdown():
+    executor = LocalProcess(MPConfig(pool_size=1))
+    task = executor.submit(add, 1, 1)
+    executor.shutdown(wait=True)
+    assert task.result() == 2
+    # a new pool is started after shutdown
+    assert executor.submit(add, 2, 2).result() == 4
+    executor.shutdown(cancel_futures=True)
+
+
+def test_executors_local_process_timeout():
+    with LocalProcess(MPConfig(pool_size=1, timeout=1)) as executor:
+        task = executor.submit(time.sleep, 0.5)
+        with pytest.raises(errors.TaskTimeoutError):
+            task.result(timeout=0.1)
+
+
+def fail_on_two(a):
+    if a == 2:
+        raise NameError("two")
+    return a
+
+
+def test_executors_map_local_dev():
+    executor = LocalDev()
+    results = [t.result() for t in executor.map(add, [1, 2, 3], [1, 1, 1])]
+    assert sorted(results) == [2, 3, 4]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 10])
+def test_executors_map_local_process(chunksize):
+    with LocalProcess(MPConfig(pool_size=2)) as executor:
+        tasks = executor.map(add, range(10), range(10), chunksize=chunksize)
+        assert sorted(t.result() for t in tasks) == [i * 2 for i in range(10)]
+        tasks = executor.map(fail_on_two, range(4), chunksize=chunksize, ordered=True)
+        tasks = list(tasks)
+        assert [t.result() for t in tasks[:2]] == [0, 1]
+        with pytest.raises(NameError):
+            tasks[2].result()
+
+
+async def aio_add(a, b):
+    await asyncio.sleep(0.01 * a)
+    return a + b
+
+
+@pytest.mark.asyncio
+async def test_executors_map_async():
+    executor = AsyncLocal()
+    results = [
+        await t.result() async for t in executor.map(aio_add, [3, 1, 2], [0, 0, 0])
+    ]
+    assert results == [1, 2, 3]
+    ordered = [
+        await t.result()
+        async for t in executor.map(aio_add, [3, 1, 2], [0, 0, 0], ordered=True)
+    ]
+    assert ordered == [3, 1, 2]
+
+
+def test_executors_local_threads():
+    with LocalThreads(ThreadsConfig(pool_size=4)) as executor:
+        started = time.time()
+        tasks = [executor.submit(time.sleep, 0.2) for _ in range(4)]
+        [t.result() for t in tasks]
+        assert time.time() - started < 0.5
+        assert all(t.done() and not t.running() for t in tasks)
+        assert sorted(t.result() for t in executor.map(add, [1, 2], [1, 1])) == [2, 3]
+
+
+def test_executors_local_threads_cancel():
+    with LocalThreads(ThreadsConfig(pool_size=1)) as executor:
+        first = executor.submit(time.sleep, 0.2)
+        second = executor.submit(time.sleep, 0.2)
+        assert second.cancel()
+        assert second.cancelled()
+        assert second.get_status() == types.ExecStatus.cancelled
+        with pytest.raises(errors.CancelledError):
+            second.result()
+        first.result()
+
+
+def test_executors_local_threads_max_in_flight():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    with LocalThreads(ThreadsConfig(pool_size=8, max_in_flight=2)) as executor:
+        tasks = [executor.submit(work) for _ in range(8)]
+        [t.result() for t in tasks]
+    assert max(peak) <= 2
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+
+import dataexec
+
+
+def _loaded(stmt: str, modules) -> str:
+    code = f"import sys; {stmt}; print([m for m in {modules!r} if m in sys.modules])"
+    return subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def test_imports_lazy_dependencies():
+    lazy = ("tqdm", "multiprocessing", "docker")
+    assert _loaded("import dataexec.workflows", lazy) == "[]"
+    assert _loaded("import dataexec.sqlite_registry", lazy + ("asyncio",)) == "[]"
+    assert _loaded("import dataexec", ("pydantic", "dataexec.types")) == "[]"
+
+
+def test_imports_lazy_attributes():
+    from dataexec.workflows import Sequence
+
+    assert dataexec.Sequence is Sequence
+    assert dataexec.tracing.enabled() is False
+    assert "RegistrySQLite" in dir(dataexec)
+    with pytest.raises(AttributeError):
+        dataexec.NotAClass
@@ -0,0 +1,75 @@
+import json
+import time
+
+from dataexec import metrics, types
+from dataexec.assets import TextAsset
+from dataexec.steps import Step
+from dataexec.workflows import Sequence
+
+
+def busy_asset(txt: str, delay=0.05):
+    time.sleep(delay)
+    started = time.thread_time()
+    while time.thread_time() - started < 0.02:
+        pass
+    return TextAsset.from_location(txt)
+
+
+def same_asset(asset: TextAsset):
+    return asset
+
+
+def test_metrics_percentile():
+    values = list(range(1, 101))
+    assert metrics.percentile(values, 0.5) == 50.5
+    assert metrics.percentile(values, 0.99) == 99.01
+    assert metrics.percentile([3], 0.95) == 3
+    assert metrics.percentile([], 0.5) == 0.0
+
+
+def test_metrics_workflow():
+    txt = "tests/text_asset.txt"
+    w = Sequence(
+        steps=[
+            Step(busy_asset, "busy", params={"txt": txt}),
+            Step(same_asset, "same"),
+        ],
+        disable_tqdm=True,
+    )
+    result = w.run()
+    w.run()
+    first = w.exec_log[0]
+    assert first.wall_ns >= 70_000_000
+    assert first.cpu_ns >= 20_000_000
+    assert first.output_bytes == len("testing_asset\n")
+    assert w.exec_log[1].input_bytes == first.output_bytes
+    assert result.elapsed > 0
+
+    busy, same = w.metrics()
+    assert busy.step_name == "busy" and busy.count == 2
+    assert 0.07 <= busy.wall.p50 <= busy.wall.p99
+    assert same.input_bytes == 2 * first.output_bytes
+    assert w.metrics(w.wf_executions[-1])[0].count == 1
+
+    data = json.loads(metrics.to_json(w.metrics()))
+    assert data[0]["wall"]["p95"] == busy.wall.p95
+
+    text = metrics.to_prometheus(w.metrics(), labels={"workflow": w.wf_alias})
+    assert "# TYPE dataexec_step_wall_seconds summary" in text
+    assert (
+        'dataexec_step_wall_seconds{workflow="sequence",step="busy",quantile="0.99"}'
+        in text
+    )
+    assert 'dataexec_step_wall_seconds_count{workflow="sequence",step="busy"} 2' in text
+    assert 'dataexec_step_failures_total{workflow="sequence",step="same"} 0' in text
+
+
+def test_metrics_failed_steps():
+    logs = [
+        types.ExecLog(step_name="a", step_execid="1", wall_ns=10**9),
+        types.ExecLog(step_name="a", step_execid="2", status=types.ExecStatus.failed),
+        types.ExecLog(step_name="b", step_execid="3", skipped=True),
+    ]
+    (a,) = metrics.collect(logs)
+    assert a.count == 2 and a.failed == 1
+    assert a.wall.sum == 1.0
@@ -0,0 +1,173 @@
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from dataexec import utils
+from dataexec.assets import TextAsset, copy_asset
+from dataexec.base import RegistryInMemory
+from dataexec.sqlite_registry import RegistrySQLite
+
+
+def _asset(tmp_path, name="asset.txt") -> TextAsset:
+    location = tmp_path / name
+    shutil.copy("tests/text_asset.txt", location)
+    return TextAsset.from_location(str(location))
+
+
+def test_registry_memory_create(tmp_path):
+    registry = RegistryInMemory()
+    asset = _asset(tmp_path)
+    registry.create_asset(asset, "first")
+    assert len(registry.list_changes(asset.id)) == 1
+    assert registry.list_assets() == [asset.meta]
+
+
+def test_registry_memory_get_lazy(tmp_path):
+    registry = RegistryInMemory()
+    asset = _asset(tmp_path)
+    registry.create_asset(asset, "first")
+
+    got = registry.get_asset(asset.id)
+    assert not got.is_loaded
+    assert got.raw.strip() == "testing_asset"
+    # a new object with the payload read once
+    other = registry.get_asset(asset.id)
+    assert other is not got and other.raw is got.raw
+
+    got.raw = "edited"
+    got.meta.description = "edited"
+    other = registry.get_asset(asset.id)
+    assert other.raw.strip() == "testing_asset"
+    assert other.meta.description is None
+
+
+def test_registry_memory_commit_invalidates(tmp_path):
+    registry = RegistryInMemory()
+    asset = _asset(tmp_path)
+    registry.create_asset(asset, "first")
+    got = registry.get_asset(asset.id)
+
+    asset.raw = "changed"
+    registry.commit_asset(asset, "second")
+    new = registry.get_asset(asset.id)
+    assert new is not got
+    assert new.raw == "changed"
+    assert len(registry.list_changes(asset.id)) == 2
+
+
+def test_registry_memory_lru(tmp_path):
+    registry = RegistryInMemory(cache_size=1)
+    first = _asset(tmp_path, "first.txt")
+    second = _asset(tmp_path, "second.txt")
+    registry.create_asset(first, "first")
+    registry.create_asset(second, "second")
+    got = registry.get_asset(first.id)
+    registry.get_asset(second.id)
+    assert registry.get_asset(first.id)._origin is not got._origin
+
+
+def test_registry_sqlite(tmp_path):
+    registry = RegistrySQLite(str(tmp_path / "registry.db"))
+    asset = _asset(tmp_path)
+    registry.create_asset(asset, "first")
+    asset.raw = "changed"
+    registry.commit_asset(asset, "second")
+
+    changes = registry.list_changes(asset.id)
+    assert [c.msg for c in changes] == ["first", "second"]
+    assert changes[0].commit != changes[1].commit
+    assert [m.id for m in registry.list_assets()] == [asset.id]
+    assert registry.get_asset(asset.id).raw == "changed"
+
+    # state is kept by a new instance
+    registry.close()
+    other = RegistrySQLite(str(tmp_path / "registry.db"))
+    assert other.list_assets()[0] == asset.meta
+    assert other.delete_asset(asset.id)
+    assert not other.delete_asset(asset.id)
+    assert other.list_assets() == []
+
+
+def test_registry_sqlite_batch(tmp_path):
+    registry = RegistrySQLite(str(tmp_path / "registry.db"))
+    assets = [_asset(tmp_path, f"asset_{i}.txt") for i in range(10)]
+    with registry.batch():
+        for asset in assets:
+            registry.create_asset(asset, "first")
+    registry.commit_assets(assets, "second")
+    assert len(registry.list_assets()) == 10
+    assert all(len(registry.list_changes(a.id)) == 2 for a in assets)
+
+    with pytest.raises(NameError):
+        with registry.batch():
+            registry.delete_asset(assets[0].id)
+            raise NameError("rollback")
+    assert len(registry.list_assets()) == 10
+
+
+def test_registry_sqlite_tasks(tmp_path):
+    registry = RegistrySQLite(str(tmp_path / "registry.db"))
+    registry.create_task("task1")
+    registry.register_task("task1")
+    registry.register_task("task2")
+    assert registry.list_tasks() == ["task1", "task2"]
+    with pytest.raises(sqlite3.IntegrityError):
+        registry.create_task("task1")
+
+
+def test_registry_sqlite_time_ranges(tmp_path):
+    registry = RegistrySQLite(str(tmp_path / "registry.db"))
+    hour_ago = datetime.utcnow() - timedelta(hours=1)
+    old = utils.encode_ulid(0, 0)
+    recent = utils.ulid()
+    registry.register_task(old)
+    registry.register_task(recent)
+    assert registry.list_tasks(since=hour_ago) == [recent]
+    assert registry.list_tasks(until=hour_ago) == [old]
+
+    asset = _asset(tmp_path)
+    registry.create_asset(asset, "first")
+    assert [m.id for m in registry.list_assets(since=hour_ago)] == [asset.id]
+    assert registry.list_assets(until=hour_ago) == []
+    memory = RegistryInMemory()
+    memory.create_asset(asset, "first")
+    assert memory.list_assets(since=hour_ago) == [asset.meta]
+    assert memory.list_assets(until=hour_ago) == []
+
+
+def _lineage(tmp_path, registry):
+    """root -> child -> grandchild, root -> sibling"""
+    root = _asset(tmp_path, "root.txt")
+    registry.create_asset(root, "root")
+    child = copy_asset(root, str(tmp_path / "child.txt"))
+    child.meta.build_by_task = "task1"
+    registry.create_asset(child, "child")
+    grandchild = copy_asset(child, str(tmp_path / "grandchild.txt"))
+    grandchild.meta.build_by_task = "task1"
+    registry.create_asset(grandchild, "grandchild")
+    sibling = copy_asset(root, str(tmp_path / "sibling.txt"))
+    registry.create_asset(sibling, "sibling")
+    return root, child, grandchild, sibling
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_registry_lineage(tmp_path, kind):
+    if kind == "memory":
+        registry = RegistryInMemory()
+    else:
+        registry = RegistrySQLite(str(tmp_path / "registry.db"))
+    root, child, grandchild, sibling = _lineage(tmp_path, registry)
+
+    assert [m.id for m in registry.ancestors(grandchild.id)] == [child.id, root.id]
+    assert [m.id for m in registry.ancestors(grandchild.id, depth=1)] == [child.id]
+    descendants = [m.id for m in registry.descendants(root.id)]
+    assert set(descendants[:2]) == {child.id, sibling.id}
+    assert descendants[2] == grandchild.id
+    assert len(registry.descendants(root.id, depth=1)) == 2
+    assert {m.id for m in registry.produced_by("task1")} == {child.id, grandchild.id}
+
+    registry.delete_asset(child.id)
+    assert [m.id for m in registry.descendants(root.id)] == [sibling.id]
+    assert {m.id for m in registry.produced_by("task1")} == {grandchild.id}
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+from dataexec.assets import TextAsset
+from dataexec.executors import LocalProcess, MPConfig
+from dataexec.steps import Step
+from dataexec.workflows import Sequence
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 8) or not os.path.isdir("/dev/shm"),
+    reason="shared memory segments not available",
+)
+
+
+def _segments():
+    return {f for f in os.listdir("/dev/shm") if f.startswith("psm_")}
+
+
+def get_asset(txt: str):
+    return TextAsset.from_location(txt)
+
+
+def upper_text(asset: TextAsset):
+    assert asset.raw.startswith("testing_asset")
+    asset.raw = asset.raw.upper()
+    return asset
+
+
+def test_shm_executor():
+    before = _segments()
+    asset = TextAsset.from_location("tests/text_asset.txt")
+    conf = MPConfig(pool_size=1, shared_memory=True, shm_min_size=1)
+    with LocalProcess(conf) as executor:
+        result = executor.submit(upper_text, asset).result()
+        assert result.raw == "TESTING_ASSET\n"
+        assert not result.is_synced
+        # the original asset is not modified
+        assert asset.raw == "testing_asset\n"
+        # results never read are released too
+        executor.submit(upper_text, asset)
+    assert _segments() == before
+
+
+def test_shm_workflow():
+    before = _segments()
+    conf = MPConfig(pool_size=1, shared_memory=True, shm_min_size=1)
+    with LocalProcess(conf) as executor:
+        w = Sequence(
+            steps=[
+                Step(get_asset, "get_asset", params={"txt": "tests/text_asset.txt"}),
+                Step(upper_text, "upper"),
+            ],
+            executor=executor,
+            disable_tqdm=True,
+        )
+        result = w.run()
+    assert result.assets[0].raw == "TESTING_ASSET\n"
+    assert _segments() == before
+
+
+def test_shm_map():
+    before = _segments()
+    assets = [TextAsset.from_location("tests/text_asset.txt") for _ in range(5)]
+    conf = MPConfig(pool_size=2, shared_memory=True, shm_min_size=1)
+    with LocalProcess(conf) as executor:
+        tasks = executor.map(upper_text, assets, chunksize=2, ordered=True)
+        assert [t.result().raw for t in tasks] == ["TESTING_ASSET\n"] * 5
+        # results never read are released too
+        list(executor.map(upper_text, assets, chunksize=2))
+        # as well as the chunks never yielded
+        tasks = executor.map(upper_text, assets, chunksize=2)
+        next(tasks)
+        tasks.close()
+    assert [a.raw for a in assets] == ["testing_asset\n"] * 5
+    assert _segments() == before
@@ -50,3 +50,12 @@ async def test_steps_async():
         assert isinstance(result, types.Output)
 
     assert result.status == types.ExecStatus.completed
+
+
+def merge_text(first: TextAsset, second: TextAsset):
+    return first
+
+
+def test_steps_same_asset_type():
+    with pytest.raises(errors.StepInputMismatch, match="first and second"):
+        Step(merge_text, "merge")
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from dataexec import tracing
+from dataexec.assets import TextAsset
+from dataexec.executors import LocalProcess, LocalThreads, MPConfig
+from dataexec.steps import Step
+from dataexec.workflows import Sequence
+
+
+def get_asset(txt: str):
+    return TextAsset.from_location(txt)
+
+
+def same_asset(asset: TextAsset):
+    asset.get_hash()
+    return asset
+
+
+@pytest.fixture
+def memory():
+    exporter = tracing.InMemoryExporter()
+    tracing.add_exporter(exporter)
+    yield exporter
+    tracing.remove_exporter(exporter)
+
+
+def test_tracing_disabled():
+    with tracing.span("nothing") as s:
+        assert s is None
+    assert not tracing.enabled()
+
+
+def test_tracing_sequence(memory):
+    w = Sequence(
+        steps=[
+            Step(get_asset, "get", params={"txt": "tests/text_asset.txt"}),
+            Step(same_asset, "same"),
+        ],
+        disable_tqdm=True,
+    )
+    w.run()
+    by_id = {s.span_id: s for s in memory.spans}
+    (run,) = memory.find("Sequence.run")
+    assert run.attrs["wf_exec_id"] == w.wf_executions[-1]
+    assert len(memory.find("WorkflowBase._run_step")) == 2
+
+    (step,) = memory.find("step same")
+    parents = []
+    span = step
+    while span.parent_id:
+        span = by_id[span.parent_id]
+        parents.append(span.name)
+    assert parents == ["LocalTask.result", "WorkflowBase._run_step", "Sequence.run"]
+    (open_,) = memory.find("TextAsset.open")
+    assert open_.parent_id == memory.find("step get")[0].span_id
+    assert memory.find("TextAsset.get_hash")
+    assert all(s.trace_id == run.trace_id for s in memory.spans)
+    assert all(s.duration_ns >= 0 for s in memory.spans)
+
+
+def test_tracing_threads(memory):
+    with LocalThreads() as executor:
+        with tracing.span("parent") as parent:
+            executor.submit(get_asset, "tests/text_asset.txt").result()
+    (task,) = memory.find("run get_asset")
+    (submit,) = memory.find("LocalThreads.submit")
+    assert task.linked_from == submit.span_id
+    assert task.tid != parent.tid
+    assert submit.parent_id == parent.span_id
+
+
+def test_tracing_chrome_processes(tmp_path):
+    path = str(tmp_path / "trace.json")
+    exporter = tracing.ChromeTraceExporter(path)
+    tracing.add_exporter(exporter)
+    try:
+        w = Sequence(
+            steps=[
+                Step(get_asset, "get", params={"txt": "tests/text_asset.txt"}),
+                Step(same_asset, "same"),
+            ],
+            executor=LocalProcess(MPConfig(pool_size=1)),
+            disable_tqdm=True,
+        )
+        with w.executor:
+            w.run()
+    finally:
+        tracing.remove_exporter(exporter)
+
+    events = tracing.ChromeTraceExporter.read(path)
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    assert spans["Sequence.run"]["pid"] == os.getpid()
+    assert spans["step same"]["pid"] != os.getpid()
+    assert spans["TextAsset.open"]["pid"] != os.getpid()
+    starts = {e["id"] for e in events if e["ph"] == "s"}
+    ends = {e["id"] for e in events if e["ph"] == "f"}
+    assert len(ends) == 2 and ends <= starts
+    assert any(e["ph"] == "M" for e in events)
@@ -0,0 +1,41 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from dataexec import utils
+
+
+def test_utils_ulid_monotonic():
+    gen = utils.ULIDGenerator(buffer_size=4)
+    ids = [gen() for _ in range(1000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 1000
+    assert all(len(i) == 26 for i in ids)
+    created = utils.ulid_time(ids[0])
+    assert abs(created - datetime.utcnow()) < timedelta(seconds=5)
+
+
+def test_utils_ulid_range():
+    at = datetime(2024, 5, 1, 12, 0, 0)
+    ms = int(at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    id_ = utils.encode_ulid(ms, 7)
+    assert utils.ulid_time(id_) == at
+    low, high = utils.ulid_range(at - timedelta(hours=1), at)
+    assert not low <= id_ < high
+    aware = (at + timedelta(hours=2)).replace(tzinfo=timezone(timedelta(hours=2)))
+    low, high = utils.ulid_range(aware, at + timedelta(seconds=1))
+    assert low <= id_ < high
+
+
+def test_utils_ulid_fork():
+    if not hasattr(os, "fork"):
+        return
+    utils.ulid()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, utils.ulid().encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    child = os.read(read, 26).decode()
+    # the child doesn't continue the sequence of its parent
+    assert child[10:] != utils.ulid()[10:]
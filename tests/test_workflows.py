@@ -1,5 +1,17 @@
+import asyncio
+import os
 import tempfile
-from dataexec.workflows import Sequence
+import time
+from typing import List
+from dataexec.execlog import JSONLStore
+from dataexec.executors import (
+    LocalDev,
+    LocalProcess,
+    LocalThreads,
+    MPConfig,
+    ThreadsConfig,
+)
+from dataexec.workflows import AsyncParallel, AsyncSequence, Parallel, Sequence
 import pytest
 from dataexec.assets import TextAsset, copy_asset
 from dataexec.steps import Step
@@ -65,3 +77,532 @@ def test_workflow_run_error():
     )
     with pytest.raises(errors.StepExecutionError):
         w.run(txt=txt, error=True)
+
+
+def test_workflow_sequence():
+    txt = "tests/text_asset.txt"
+    w = Sequence(
+        steps=[
+            Step(get_asset, "get_asset", params={"txt": txt}),
+            Step(process_text, "transform"),
+        ],
+        disable_tqdm=True,
+    )
+    result = w.run()
+    assert len(w.exec_log) == 2
+    assert result.assets[0].raw == "modified asset"
+    assert result.from_step == w.steps["get_asset"].id
+
+
+def slow_asset(txt: str):
+    time.sleep(0.5)
+    return TextAsset.from_location(txt)
+
+
+def test_workflow_parallel():
+    txt = "tests/text_asset.txt"
+    w = Parallel(
+        steps=[
+            Step(get_asset, "first", params={"txt": txt}),
+            Step(process_text, "second", from_step="first"),
+            Step(process_text, "third", from_step="first"),
+        ]
+    )
+    results = w.run()
+    assert len(results) == 2
+    assert len(w.exec_log) == 3
+    assert all(r.assets[0].raw == "modified asset" for r in results)
+
+
+def join_texts(assets: List[TextAsset]) -> TextAsset:
+    tmp = tempfile.NamedTemporaryFile()
+    new_asset = copy_asset(assets[0], tmp.name)
+    new_asset.raw = "".join(a.raw for a in assets)
+    return new_asset
+
+
+def test_workflow_parallel_concurrent():
+    txt = "tests/text_asset.txt"
+    with LocalProcess(MPConfig(pool_size=2)) as executor:
+        w = Parallel(
+            steps=[
+                Step(slow_asset, "a", params={"txt": txt}),
+                Step(slow_asset, "b", params={"txt": txt}),
+                Step(join_texts, "c", from_step=["a", "b"]),
+            ],
+            executor=executor,
+        )
+        started = time.time()
+        results = w.run()
+        elapsed = time.time() - started
+    assert len(results) == 1
+    assert results[0].assets[0].raw == "testing_asset\n" * 2
+    assert elapsed < 1.0
+
+
+def test_workflow_parallel_cycle():
+    w = Parallel(
+        steps=[
+            Step(process_text, "a", from_step="b"),
+            Step(process_text, "b", from_step="a"),
+        ]
+    )
+    with pytest.raises(ValueError):
+        w.run()
+
+
+async def aio_get_asset(txt: str, delay=0.0):
+    await asyncio.sleep(delay)
+    return TextAsset.from_location(txt)
+
+
+@pytest.mark.asyncio
+async def test_workflow_async_sequence():
+    txt = "tests/text_asset.txt"
+    w = AsyncSequence(
+        steps=[
+            Step(aio_get_asset, "get_asset", params={"txt": txt}),
+            Step(process_text, "transform"),
+        ]
+    )
+    result = await w.run()
+    assert len(w.exec_log) == 2
+    assert result.assets[0].raw == "modified asset"
+
+
+@pytest.mark.asyncio
+async def test_workflow_async_many():
+    txt = "tests/text_asset.txt"
+    workflows = [
+        AsyncSequence(
+            steps=[Step(aio_get_asset, "a", params={"txt": txt, "delay": 0.2})]
+        )
+        for _ in range(50)
+    ]
+    started = time.time()
+    results = await asyncio.gather(*[w.run() for w in workflows])
+    assert time.time() - started < 1.0
+    assert all(r.status == types.ExecStatus.done for r in results)
+
+
+@pytest.mark.asyncio
+async def test_workflow_async_timeout():
+    txt = "tests/text_asset.txt"
+    w = AsyncSequence(
+        steps=[
+            Step(
+                aio_get_asset,
+                "get_asset",
+                params={"txt": txt, "delay": 1},
+                timeout=0.1,
+                raise_on_error=False,
+            ),
+        ]
+    )
+    result = await w.run()
+    assert result.status == types.ExecStatus.failed
+    assert isinstance(result.error, errors.TaskTimeoutError)
+
+
+@pytest.mark.asyncio
+async def test_workflow_async_parallel():
+    txt = "tests/text_asset.txt"
+    w = AsyncParallel(
+        steps=[
+            Step(aio_get_asset, "a", params={"txt": txt, "delay": 0.3}),
+            Step(aio_get_asset, "b", params={"txt": txt, "delay": 0.3}),
+            Step(join_texts, "c", from_step=["a", "b"]),
+        ]
+    )
+    started = time.time()
+    results = await w.run()
+    assert time.time() - started < 0.6
+    assert results[0].assets[0].raw == "testing_asset\n" * 2
+
+
+def test_workflow_incremental(tmp_path):
+    src = tmp_path / "source.txt"
+    src.write_text("first")
+    w = Sequence(
+        steps=[
+            Step(get_asset, "get_asset", params={"txt": str(src)}),
+            Step(process_text, "transform"),
+        ],
+        disable_tqdm=True,
+        incremental=True,
+    )
+    w.run()
+    transform = w.steps["transform"]
+    w.run()
+    assert transform._call_count == 1
+    assert w.exec_log[-1].skipped
+    assert w.exec_log[-1].inputs.signature == w.exec_log[1].inputs.signature
+
+    src.write_text("second")
+    w.run()
+    assert transform._call_count == 2
+    assert not w.exec_log[-1].skipped
+    assert w.exec_log[-1].inputs.signature != w.exec_log[1].inputs.signature
+
+
+def test_workflow_incremental_execid(tmp_path):
+    src = tmp_path / "source.txt"
+    src.write_text("first")
+    w = Sequence(
+        steps=[
+            Step(get_asset, "get_asset", params={"txt": str(src)}),
+            Step(process_text, "transform"),
+        ],
+        disable_tqdm=True,
+        incremental=True,
+    )
+    w.run()
+    w.run()
+    done, skipped = w.exec_log.query(step_name="transform")
+    assert skipped.skipped
+    assert skipped.step_execid != done.step_execid
+    assert skipped.source_execid == done.step_execid
+
+
+def upper_copy(asset: TextAsset, dst: str):
+    new_asset = copy_asset(asset, dst)
+    new_asset.raw = asset.raw.upper()
+    new_asset.write()
+    return new_asset
+
+
+def test_workflow_incremental_from_exec_log(tmp_path):
+    src = tmp_path / "source.txt"
+    src.write_text("first")
+
+    def sequence():
+        return Sequence(
+            steps=[
+                Step(get_asset, "get_asset", params={"txt": str(src)}),
+                Step(upper_copy, "upper", params={"dst": str(tmp_path / "up.txt")}),
+            ],
+            disable_tqdm=True,
+            incremental=True,
+            log_store=JSONLStore(str(tmp_path / "log")),
+        )
+
+    first = sequence()
+    assert first.run().assets[0].raw == "FIRST"
+    first.exec_log.close()
+
+    # a new instance, like after a restart, reuses the output in the log
+    second = sequence()
+    result = second.run()
+    assert second.steps["upper"]._call_count == 0
+    assert result.skipped and result.assets[0].raw == "FIRST"
+
+    (tmp_path / "up.txt").unlink()
+    third = sequence()
+    third.run()
+    assert third.steps["upper"]._call_count == 1
+
+
+def get_asset_list(txt: str):
+    return [TextAsset.from_location(txt), TextAsset.from_location(txt)]
+
+
+def list_assets(txt: str):
+    return [TextAsset.from_location(txt) for _ in range(4)]
+
+
+def tag_text(asset: TextAsset, tag="tagged"):
+    tmp = tempfile.NamedTemporaryFile()
+    new_asset = copy_asset(asset, tmp.name)
+    new_asset.raw = f"{tag} {os.getpid()}"
+    return new_asset
+
+
+def test_workflow_fan_out():
+    txt = "tests/text_asset.txt"
+    with LocalProcess(MPConfig(pool_size=2)) as executor:
+        w = Sequence(
+            steps=[
+                Step(list_assets, "list", params={"txt": txt}),
+                Step(tag_text, "tag", fan_out=True, params={"tag": "fan"}),
+            ],
+            executor=executor,
+            disable_tqdm=True,
+        )
+        result = w.run()
+    assert len(result.assets) == 4
+    assert all(a.raw.startswith("fan ") for a in result.assets)
+    assert os.getpid() not in {int(a.raw.split()[1]) for a in result.assets}
+
+
+@pytest.mark.asyncio
+async def test_workflow_async_fan_out():
+    txt = "tests/text_asset.txt"
+    w = AsyncSequence(
+        steps=[
+            Step(list_assets, "list", params={"txt": txt}),
+            Step(tag_text, "tag", fan_out=True),
+        ],
+    )
+    result = await w.run()
+    assert len(result.assets) == 4
+    assert all(a.raw.startswith("tagged") for a in result.assets)
+
+
+def annotated_asset(txt: str) -> TextAsset:
+    return TextAsset.from_location(txt)
+
+
+def annotated_process(asset: TextAsset, suffix: str) -> TextAsset:
+    return asset
+
+
+def test_workflow_compile_errors():
+    with pytest.raises(errors.StepInputMismatch):
+        Sequence(steps=[Step(get_asset, "a", params={"unknown": 1})])
+    with pytest.raises(errors.StepInputMismatch):
+        # suffix is not provided
+        Sequence(steps=[Step(annotated_asset), Step(annotated_process)])
+    with pytest.raises(errors.StepInputMismatch):
+        Parallel(
+            steps=[
+                Step(annotated_asset, "a"),
+                Step(annotated_asset, "b"),
+                Step(process_text, "c", from_step=["a", "b"]),
+            ]
+        )
+    Sequence(
+        steps=[
+            Step(annotated_asset),
+            Step(annotated_process, params={"suffix": "_"}),
+        ]
+    )
+
+
+def test_workflow_inject_many_assets():
+    txt = "tests/text_asset.txt"
+    w = Sequence(
+        steps=[
+            Step(get_asset_list, "list", params={"txt": txt}),
+            Step(process_text, "transform"),
+        ],
+        disable_tqdm=True,
+    )
+    with pytest.raises(errors.StepInputMismatch):
+        w.run()
+
+
+def gen_assets(txt: str, total=20):
+    for i in range(total):
+        asset = TextAsset.from_location(txt)
+        asset.raw = f"{i}"
+        yield asset
+
+
+def double_text(asset: TextAsset):
+    new_asset = TextAsset.from_location(asset.location)
+    new_asset.raw = asset.raw * 2
+    yield new_asset
+
+
+def test_workflow_stream():
+    txt = "tests/text_asset.txt"
+    w = Sequence(
+        steps=[
+            Step(gen_assets, "gen", params={"txt": txt}),
+            Step(double_text, "double"),
+            Step(process_text, "transform"),
+        ],
+        queue_size=2,
+        disable_tqdm=True,
+    )
+    result = w.run()
+    assert len(result.assets) == 20
+    assert all(a.raw == "modified asset" for a in result.assets)
+    assert len(w.exec_log) == 3
+
+    w = Sequence(
+        steps=[
+            Step(gen_assets, "gen", params={"txt": txt}),
+            Step(double_text, "double"),
+        ],
+        queue_size=1,
+    )
+    doubled = [a.raw for a in w.stream()]
+    assert doubled == [f"{i}{i}" for i in range(20)]
+
+
+def test_workflow_stream_early_stop():
+    txt = "tests/text_asset.txt"
+    w = Sequence(
+        steps=[
+            Step(gen_assets, "gen", params={"txt": txt, "total": 1000}),
+            Step(double_text, "double"),
+        ],
+        queue_size=1,
+    )
+    stream = w.stream()
+    assert next(stream).raw == "00"
+    stream.close()
+    assert w.steps["gen"].result().status == types.ExecStatus.done
+
+
+def test_workflow_stream_error():
+    txt = "tests/text_asset.txt"
+    w = Sequence(
+        steps=[
+            Step(gen_assets, "gen", params={"txt": txt}),
+            Step(process_text, "transform", params={"error": True}),
+        ],
+    )
+    with pytest.raises(errors.StepExecutionError):
+        w.run()
+
+
+def repeat_asset(asset: TextAsset, times=2):
+    for _ in range(times):
+        yield asset
+
+
+def test_workflow_stream_first_generator_only():
+    txt = "tests/text_asset.txt"
+    # the generator isn't the first step: everything runs as usual
+    w = Sequence(
+        steps=[
+            Step(get_asset_list, "two", params={"txt": txt}),
+            Step(join_texts, "join"),
+            Step(repeat_asset, "repeat"),
+        ],
+        disable_tqdm=True,
+    )
+    result = w.run()
+    assert w.steps["join"]._call_count == 1
+    assert [a.raw for a in result.assets] == ["testing_asset\n" * 2] * 2
+
+    # the steps after the stream receive all the assets at once
+    w = Sequence(
+        steps=[
+            Step(gen_assets, "gen", params={"txt": txt, "total": 5}),
+            Step(double_text, "double"),
+            Step(join_texts, "join"),
+        ],
+        queue_size=1,
+        disable_tqdm=True,
+    )
+    result = w.run()
+    assert w.steps["join"]._call_count == 1
+    assert [a.raw for a in result.assets] == ["0011223344"]
+    assert len(w.exec_log) == 3
+    assert len(list(w.exec_log.workflows())) == 1
+    with pytest.raises(errors.StepInputMismatch):
+        w.stream()
+
+
+class CountingExecutor(LocalDev):
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+_doubled: List[str] = []
+
+
+def counted_double(asset: TextAsset):
+    _doubled.append(asset.raw)
+    return next(double_text(asset))
+
+
+def test_workflow_stream_executor(tmp_path):
+    txt = "tests/text_asset.txt"
+    executor = CountingExecutor()
+    _doubled.clear()
+    w = Sequence(
+        steps=[
+            Step(gen_assets, "gen", params={"txt": txt, "total": 5}),
+            Step(counted_double, "double", cache=str(tmp_path)),
+        ],
+        executor=executor,
+        disable_tqdm=True,
+    )
+    first = [a.raw for a in w.stream()]
+    assert first == ["00", "11", "22", "33", "44"]
+    assert executor.submitted == 5
+    # the calls go through the executor and the cache of the step
+    assert [a.raw for a in w.stream()] == first
+    assert executor.submitted == 10
+    assert len(_doubled) == 5
+
+
+def slow_text(txt: str, delay=0.2):
+    time.sleep(delay)
+    asset = TextAsset.from_location(txt)
+    asset.raw = txt
+    return asset
+
+
+def test_workflow_run_many(tmp_path):
+    for i in range(8):
+        (tmp_path / f"{i}.txt").write_text(f"{i}")
+    w = Sequence(
+        steps=[
+            Step(slow_text, "slow"),
+            Step(double_text, "double"),
+        ],
+        disable_tqdm=True,
+    )
+    inputs = [{"txt": str(tmp_path / f"{i}.txt")} for i in range(8)]
+    started = time.time()
+    results = list(w.run_many(inputs, max_concurrency=8))
+    assert time.time() - started < 0.8
+    assert [i for i, _ in results] == list(range(8))
+    assert [r.assets[0].raw for _, r in results] == [
+        str(tmp_path / f"{i}.txt") * 2 for i in range(8)
+    ]
+    assert len(w.exec_log) == 16
+    assert len(set(w.wf_executions)) == 8
+    assert len({log.step_execid for log in w.exec_log}) == 16
+
+    txt = inputs[0]["txt"]
+    unordered = list(w.run_many([(txt, 0.3), (txt, 0.0)], ordered=False))
+    assert [i for i, _ in unordered] == [1, 0]
+
+
+def shout_text(asset: TextAsset) -> TextAsset:
+    new_asset = TextAsset.from_location(asset.location)
+    new_asset.raw = asset.raw.upper()
+    return new_asset
+
+
+def test_workflow_run_many_threads(tmp_path):
+    for i in range(16):
+        (tmp_path / f"{i}.txt").write_text(f"{i}")
+    inputs = [(str(tmp_path / f"{i}.txt"), 0.05) for i in range(16)]
+    with LocalThreads(ThreadsConfig(pool_size=8)) as executor:
+        w = Sequence(
+            steps=[Step(slow_text, "slow"), Step(shout_text, "shout")],
+            executor=executor,
+            disable_tqdm=True,
+        )
+        results = list(w.run_many(inputs, max_concurrency=8))
+    assert [r.assets[0].raw for _, r in results] == [txt.upper() for txt, _ in inputs]
+    assert w.steps["slow"]._call_count == w.steps["shout"]._call_count == 16
+    # each run registers the executions of its own steps
+    logs = {log.step_execid: log for log in w.exec_log}
+    assert len(logs) == 32
+    runs = {logs[r.execid].wf_exec_id for _, r in results}
+    assert runs == set(w.wf_executions)
+
+
+@pytest.mark.asyncio
+async def test_workflow_async_run_many():
+    w = AsyncSequence(
+        steps=[Step(aio_get_asset, "a")],
+    )
+    inputs = [("tests/text_asset.txt", 0.2) for _ in range(10)]
+    started = time.time()
+    results = [r async for r in w.run_many(inputs, max_concurrency=5)]
+    assert 0.4 <= time.time() - started < 0.8
+    assert len(results) == 10
+    assert len(set(w.wf_executions)) == 10